@@ -1,4 +1,5 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import gradio as gr
 import pandas as pd
 from pathlib import Path
@@ -6,38 +7,71 @@ from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
 
-from gensurv.generate_headings import classify_papers_batch
-from gensurv.retrievers.semantic_scholar import SemanticScholarRetriever
+from gensurv.generate_headings import classify_papers_with_scores
+from gensurv.retrieve_papers import get_retriever
 
-retriever = SemanticScholarRetriever(output_dir=Path("../data/semantic_scholar"), sleep_time=5)
+# Papers are fetched in chunks so that the first results can be shown before the whole file is fetched
+FETCH_CHUNK_SIZE = 50
+FETCH_WORKERS = 4
+# Uploads processed at the same time; further users wait in the queue and share the retriever below
+CONCURRENCY_LIMIT = 4
+
+# One retriever for all sessions: its paper store, HTTP session and rate limiter stay warm across uploads
+retriever = get_retriever(Path("../data/semantic_scholar"))
 
 
 def classify(file_path: Path):
     df = pd.read_csv(file_path, delimiter="\t")
     valid_data = df[df["headlines_section_title"].notna() & df["paper_id"].notna()]
-    headings = valid_data["headlines_section_title"].tolist()
-    paper_ids = valid_data["paper_id"].tolist()
+    headings = list(dict.fromkeys(valid_data["headlines_section_title"].tolist()))
+    paper_ids = list(dict.fromkeys(valid_data["paper_id"].tolist()))
+
+    structured_papers = {heading: [] for heading in headings}
+    processed = 0
+    # IDs that Semantic Scholar does not know, and papers it returned without an abstract
+    not_found = 0
+    without_abstract = 0
 
-    papers_with_abstracts = []
-    valid_headings = []
-    for pid, heading in zip(paper_ids, headings):
-        paper = retriever.retrieve_paper(pid)
-        if paper.abstract is not None:
-            papers_with_abstracts.append(paper)
-            valid_headings.append(heading)
+    def results():
+        simple_structured = {heading: [p.title for p in papers] for heading, papers in structured_papers.items() if papers}
+        progress = f"{processed}/{len(paper_ids)} 件の論文を処理しました"
+        excluded = []
+        if not_found:
+            excluded.append(f"Semantic Scholar に見つからなかった {not_found} 件")
+        if without_abstract:
+            excluded.append(f"アブストラクトが取得できなかった {without_abstract} 件")
+        if excluded:
+            progress += f"（{'、'.join(excluded)}を除く）"
+        return simple_structured, progress
 
-    structured_papers = classify_papers_batch(papers_with_abstracts, valid_headings)
-    simple_structured = {heading: [p.title for p in papers] for heading, papers in structured_papers.items()}
-    return simple_structured
+    yield results()
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        futures = {
+            executor.submit(retriever.retrieve_papers_bulk, paper_ids[start:start + FETCH_CHUNK_SIZE]):
+                len(paper_ids[start:start + FETCH_CHUNK_SIZE])
+            for start in range(0, len(paper_ids), FETCH_CHUNK_SIZE)
+        }
+        for future in as_completed(futures):
+            fetched = list(future.result().values())
+            papers_with_abstracts = [paper for paper in fetched if paper.abstract is not None]
+            if papers_with_abstracts:
+                classification, _ = classify_papers_with_scores(papers_with_abstracts, headings)
+                for heading, papers in classification.items():
+                    structured_papers[heading].extend(papers)
+            processed += futures[future]
+            not_found += futures[future] - len(fetched)
+            without_abstract += len(fetched) - len(papers_with_abstracts)
+            yield results()
 
 
 iface = gr.Interface(
     fn=classify,
     inputs=gr.File(label="TSVファイルをアップロード"),
-    outputs=gr.JSON(label="構造化Papers"),
+    outputs=[gr.JSON(label="構造化Papers"), gr.Textbox(label="進捗")],
     title="論文を見出しに割り当て",
     description="TSVファイルをアップロードすると、各見出しに対して割り当てられるべきPaper.titleを表示します。"
 )
+iface.queue(default_concurrency_limit=CONCURRENCY_LIMIT)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+import time
+import traceback
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+from gensurv.embeddings import DEFAULT_PROVIDER_SPEC, configure_embedding_provider
+from gensurv.pipeline import MANIFEST_FILENAME, load_json
+from gensurv.tracing import get_tracer
+from main import build_parser, run_pipeline
+
+load_dotenv()
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs_path", type=Path, required=True,
+                        help="JSONL file with one survey per line, e.g. "
+                             '{"title": "Laboratory automation", "retrieve_papers": true, "generate_headings": true}. '
+                             "Keys are the options of main.py")
+    parser.add_argument("--output_path", type=Path, required=True, help="Output directory path")
+    parser.add_argument("--embedding_provider", type=str,
+                        help="Embedding provider of all surveys (see main.py); it is shared by the whole process")
+    parser.add_argument("--max_workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Number of surveys generated at the same time (default: {DEFAULT_MAX_WORKERS})")
+    return parser.parse_args()
+
+
+def load_jobs(jobs_path: Path) -> List[Dict[str, Any]]:
+    with open(jobs_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def job_args(job: Dict[str, Any], output_path: Path, embedding_provider: str | None = None):
+    """
+    Turn a job into the arguments of main.py. All jobs share output_path, and with it the paper store,
+    and the embedding provider, which is configured for the whole process.
+    """
+    args = build_parser().parse_args([])
+    for name, value in job.items():
+        if name == "embedding_provider":
+            raise ValueError("The embedding provider is set for the whole batch with --embedding_provider")
+        if not hasattr(args, name) or name == "output_path":
+            raise ValueError(f"Unknown job option: {name}")
+        setattr(args, name, Path(value) if name == "resume" else value)
+    args.output_path = output_path
+    args.embedding_provider = embedding_provider
+    return args
+
+
+def run_job(
+        index: int, job: Dict[str, Any], output_path: Path, batch_dir: Path, embedding_provider: str
+) -> Dict[str, Any]:
+    title = job.get("title") or ""
+    output_dir = Path(job["resume"]) if job.get("resume") else batch_dir / f"{index:03d}_{title.replace(' ', '_')}"
+    result = {"index": index, "title": title, "output_dir": str(output_dir)}
+    start = time.perf_counter()
+    try:
+        output_dir = run_pipeline(job_args(job, output_path, embedding_provider), output_dir=output_dir, write_trace=False)
+        result.update(status="succeeded", output_dir=str(output_dir))
+    except Exception as e:
+        traceback.print_exc()
+        result.update(status="failed", error=repr(e))
+    result["seconds"] = time.perf_counter() - start
+    manifest_path = Path(result["output_dir"]) / MANIFEST_FILENAME
+    if manifest_path.exists():
+        stages = load_json(manifest_path)["stages"]
+        result["stage_seconds"] = {stage: record.get("seconds") for stage, record in stages.items()}
+    print(f"[{index}] {title}: {result['status']} in {result['seconds']:.1f}s")
+    return result
+
+
+def run_batch(
+        jobs: List[Dict[str, Any]],
+        output_path: Path,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        embedding_provider: str | None = None,
+) -> Path:
+    """
+    Generate several surveys in this process on a pool of max_workers threads.
+    The jobs share the process-wide retriever, embedding provider, embedding cache and LLM cache; each job gets its own run
+    directory under a batch directory, which also receives batch_report.json with per-job timings and failures,
+    and the trace and metrics of the whole batch.
+    :return: The path of the report.
+    """
+    batch_dir = output_path / f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    batch_dir.mkdir(parents=True)
+    # Every job (resumed ones included) runs with the same provider, configured once before the threads start
+    embedding_provider = embedding_provider or os.environ.get("GENSURV_EMBEDDING_PROVIDER") or DEFAULT_PROVIDER_SPEC
+    configure_embedding_provider(embedding_provider)
+    get_tracer().reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_job, index, job, output_path, batch_dir, embedding_provider)
+                   for index, job in enumerate(jobs)]
+        results = [future.result() for future in futures]
+
+    report = {
+        "jobs_total": len(results),
+        "jobs_succeeded": sum(result["status"] == "succeeded" for result in results),
+        "jobs_failed": sum(result["status"] == "failed" for result in results),
+        "seconds": time.perf_counter() - start,
+        "max_workers": max_workers,
+        "jobs": results,
+    }
+    get_tracer().write(batch_dir)
+    report_path = batch_dir / "batch_report.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"{report['jobs_succeeded']}/{report['jobs_total']} surveys generated in {report['seconds']:.1f}s; "
+          f"report written to {report_path}")
+    return report_path
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_batch(load_jobs(args.jobs_path), args.output_path.resolve(), args.max_workers, args.embedding_provider)
@@ -1,7 +1,42 @@
-from .generate_query import generate_query
-from .retrieve_papers import retrieve_papers
-from .generate_headings import generate_headings
-from .classify_papers import classify_papers
-from .generate_overview import generate_overview
-from .generate_draft import generate_draft
-from .utils import load_papers, load_headings
\ No newline at end of file
+import importlib
+import sys
+import types
+
+# Public functions and the submodules defining them. They are imported on first access (PEP 562), so that
+# `import gensurv` does not pay for the API clients, numpy and pydantic of stages the caller never uses.
+_LAZY_ATTRIBUTES = {
+    "generate_query": ".generate_query",
+    "retrieve_papers": ".retrieve_papers",
+    "generate_headings": ".generate_headings",
+    "classify_papers": ".classify_papers",
+    "generate_overview": ".generate_overview",
+    "generate_draft": ".generate_draft",
+    "load_papers": ".utils",
+    "load_headings": ".utils",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule binds it on the package, which would hide the function of the same name
+        # (gensurv.generate_headings is the function, as it was when the functions were imported eagerly)
+        if isinstance(value, types.ModuleType) and _LAZY_ATTRIBUTES.get(name) == f".{name}":
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -0,0 +1,3 @@
+from .corpus import load_corpus
+from .fake_api import FakeAPI
+from .runner import compare_with_baseline, run_corpus
@@ -0,0 +1,76 @@
+from pathlib import Path
+import random
+from typing import List
+
+from ..bibliography import with_bibtex
+from ..models import Author, Paper
+from ..utils import load_papers
+
+DATA_DIR = Path(__file__).resolve().parents[3] / "data"
+DATASETS = {
+    "manual_by_ono": DATA_DIR / "test" / "manual_by_ono" / "headings_input_data.json",
+    "auto_from_filemaker": DATA_DIR / "test" / "auto_from_filemaker" / "headings_input_data.json",
+}
+SYNTHETIC_SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+N_TOPICS = 12
+TOPIC_VOCABULARY_SIZE = 40
+COMMON_WORDS = (
+    "the of and in to a we for with is on by this that are from an our as be results method study approach "
+    "data using based which these system show performance analysis model new two can"
+).split()
+SYLLABLES = ["ro", "bo", "ta", "li", "qui", "pha", "gen", "mic", "flu", "sen", "tor", "xa", "ne", "lab", "cyt", "ome"]
+
+
+def load_dataset(name: str) -> List[Paper]:
+    return load_papers(DATASETS[name])
+
+
+def synthetic_corpus(n_papers: int, seed: int = 0) -> List[Paper]:
+    """
+    Generate n_papers papers on N_TOPICS topics. Each topic has its own vocabulary, so papers on the same topic
+    share words (and hashed embeddings), much like a real corpus clusters by subject.
+    """
+    rng = random.Random(seed)
+    topics = [
+        ["".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(TOPIC_VOCABULARY_SIZE)]
+        for _ in range(N_TOPICS)
+    ]
+    surnames = ["".join(rng.choices(SYLLABLES, k=3)).capitalize() for _ in range(500)]
+    papers = []
+    for i in range(n_papers):
+        vocabulary = topics[rng.randrange(N_TOPICS)]
+        title = " ".join(rng.choices(vocabulary, k=6)).capitalize()
+        abstract = " ".join(rng.choice(vocabulary) if rng.random() < 0.4 else rng.choice(COMMON_WORDS) for _ in range(150))
+        authors = [Author(id=str(rng.randrange(10 ** 6)), name=f"A. {rng.choice(surnames)}") for _ in range(rng.randint(1, 5))]
+        papers.append(Paper(
+            id=f"{i:040x}", title=title, abstract=abstract.capitalize() + ".", venue="Synthetic Journal",
+            year=rng.randint(1990, 2024), authors=authors, citation_styles=None,
+        ))
+    return with_bibtex(papers)
+
+
+def load_corpus(name: str) -> List[Paper]:
+    """
+    :param name: A test dataset (see DATASETS) or a synthetic corpus size (see SYNTHETIC_SIZES).
+    """
+    if name in DATASETS:
+        return load_dataset(name)
+    if name in SYNTHETIC_SIZES:
+        return synthetic_corpus(SYNTHETIC_SIZES[name])
+    raise ValueError(f"Unknown corpus: {name}. Choose from {list(DATASETS) + list(SYNTHETIC_SIZES)}.")
+
+
+def to_semantic_scholar_record(paper: Paper) -> dict:
+    """
+    The record the Semantic Scholar API returns for paper with PAPER_FIELDS.
+    """
+    return {
+        "paperId": paper.id,
+        "title": paper.title,
+        "abstract": paper.abstract,
+        "venue": paper.venue,
+        "year": paper.year,
+        "authors": [{"authorId": author.id, "name": author.name} for author in paper.authors or []],
+        "citationStyles": paper.citation_styles,
+    }
@@ -0,0 +1,230 @@
+import base64
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import multiprocessing
+import re
+import socket
+import threading
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+import zlib
+
+import numpy as np
+
+DEFAULT_EMBEDDING_DIM = 256
+FAKE_CATEGORIES = [
+    "Automated sample preparation",
+    "Robotic liquid handling",
+    "Laboratory information management",
+    "Machine learning for experiment planning",
+    "High-throughput screening",
+    "Microfluidic platforms",
+    "Closed-loop optimisation",
+    "Reproducibility and standards",
+]
+BIBTEX_KEY_PATTERN = re.compile(r"@\w+\s*\{\s*([^,\s]+)\s*,")
+
+# Queued error responses by endpoint: (status code, Retry-After header or None)
+Failures = Dict[str, List[Tuple[int, str | None]]]
+
+
+def hashed_embedding(text: str, dim: int) -> np.ndarray:
+    """
+    A bag-of-words embedding: every word is hashed to one dimension, so texts that share words are similar.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        vector[zlib.crc32(word.encode("utf-8")) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    """
+    Answers the OpenAI (chat completions, embeddings), Anthropic (messages) and Semantic Scholar
+    (search, paper, batch) endpoints used by gensurv with canned or derived responses after a configurable delay.
+    """
+    server: "FakeAPIServer"
+    # Keep connections alive, as the real APIs do; every response has a Content-Length
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _count(self, endpoint: str, latency_key: str) -> bool:
+        """
+        Count a call and wait for the latency of its provider. If an error is queued for the endpoint, send it.
+        :return: Whether an error was sent instead of the response.
+        """
+        with self.server.lock:
+            self.server.calls[endpoint] += 1
+            queued = self.server.failures.get(endpoint)
+            failure = queued.pop(0) if queued else None
+        time.sleep(self.server.latencies.get(latency_key, 0.0))
+        if failure is None:
+            return False
+        status, retry_after = failure
+        body = json.dumps({"error": "Injected failure"}).encode("utf-8")
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header("Retry-After", retry_after)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        if url.path == "/_stats":
+            with self.server.lock:
+                return self._send_json(dict(self.server.calls))
+        if url.path.endswith("/paper/search"):
+            if self._count("s2.search", "s2"):
+                return
+            offset, limit = int(params.get("offset", 0)), int(params.get("limit", 100))
+            papers = self.server.papers[offset:offset + limit]
+            response = {"total": len(self.server.papers), "offset": offset,
+                        "data": [{"paperId": paper["paperId"], "title": paper["title"]} for paper in papers]}
+            if offset + limit < len(self.server.papers):
+                response["next"] = offset + limit
+            return self._send_json(response)
+        match = re.search(r"/paper/([^/]+)$", url.path)
+        if match:
+            if self._count("s2.paper", "s2"):
+                return
+            paper = self.server.papers_by_id.get(match.group(1))
+            return self._send_json(paper if paper else {"error": "Paper not found"}, 200 if paper else 404)
+        self._send_json({"error": f"Unknown endpoint {url.path}"}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        request = self._read_json()
+        if url.path.endswith("/paper/batch"):
+            if self._count("s2.batch", "s2"):
+                return
+            return self._send_json([self.server.papers_by_id.get(paper_id) for paper_id in request["ids"]])
+        if url.path.endswith("/embeddings"):
+            return self._embeddings(request)
+        if url.path.endswith("/chat/completions"):
+            if self._count("openai.chat", "openai"):
+                return
+            content = "\n".join(f"{i}. {category}" for i, category in enumerate(FAKE_CATEGORIES, start=1))
+            return self._send_json({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": 0, "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+        if url.path.endswith("/messages"):
+            if self._count("anthropic.messages", "anthropic"):
+                return
+            prompt = " ".join(str(message.get("content")) for message in request.get("messages", []))
+            keys = list(dict.fromkeys(BIBTEX_KEY_PATTERN.findall(prompt)))
+            text = f"This section reviews {len(keys)} papers \\cite{{{', '.join(keys)}}}." if keys else "No papers."
+            return self._send_json({
+                "id": "msg_fake", "type": "message", "role": "assistant", "model": request.get("model"),
+                "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4},
+            })
+        self._send_json({"error": f"Unknown endpoint {url.path}"}, 404)
+
+    def _embeddings(self, request) -> None:
+        if self._count("openai.embeddings", "openai"):
+            return
+        texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        data = []
+        for i, text in enumerate(texts):
+            vector = hashed_embedding(text, self.server.embedding_dim)
+            if request.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        self._send_json({"object": "list", "data": data, "model": request.get("model"),
+                         "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+
+
+class FakeAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self, address, papers: List[dict], latencies: Dict[str, float], embedding_dim: int, failures: Failures,
+    ):
+        super().__init__(address, FakeAPIHandler)
+        self.failures = {endpoint: list(queued) for endpoint, queued in failures.items()}
+        self.papers = papers
+        self.papers_by_id = {paper["paperId"]: paper for paper in papers}
+        self.latencies = latencies
+        self.embedding_dim = embedding_dim
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+
+def _serve(port: int, papers: List[dict], latencies: Dict[str, float], embedding_dim: int, failures: Failures) -> None:
+    FakeAPIServer(("127.0.0.1", port), papers, latencies, embedding_dim, failures).serve_forever()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeAPI:
+    """
+    Runs FakeAPIServer in a separate process, so that serving requests neither competes with the benchmarked
+    code for the GIL nor counts towards its memory.
+    :param papers: Semantic Scholar paper records served by the search, paper and batch endpoints.
+    :param latencies: Seconds each request waits before it is answered, by provider ("openai", "anthropic", "s2").
+    :param failures: Errors answered by an endpoint (e.g. "s2.batch") before it answers normally, in order, as
+        (status code, Retry-After header or None); for testing how clients retry.
+    """
+
+    def __init__(
+            self,
+            papers: List[dict],
+            latencies: Dict[str, float],
+            embedding_dim: int = DEFAULT_EMBEDDING_DIM,
+            failures: Failures | None = None,
+    ):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._process = multiprocessing.get_context("spawn").Process(
+            target=_serve, args=(self.port, papers, latencies, embedding_dim, failures or {}), daemon=True
+        )
+
+    def __enter__(self) -> "FakeAPI":
+        self._process.start()
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline or not self._process.is_alive():
+                    raise RuntimeError("The fake API server did not start.")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc_info) -> None:
+        self._process.terminate()
+        self._process.join()
+
+    def calls(self) -> Dict[str, int]:
+        from urllib.request import urlopen
+        with urlopen(f"{self.url}/_stats") as response:
+            return json.load(response)
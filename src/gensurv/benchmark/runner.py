@@ -0,0 +1,165 @@
+from contextlib import contextmanager, redirect_stdout
+import importlib
+import io
+from pathlib import Path
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from anthropic import Anthropic, AsyncAnthropic
+from openai import OpenAI
+
+from ..embedding_cache import configure_embedding_cache
+from ..embeddings import OpenAIEmbeddingProvider, configure_embedding_provider
+from ..generate_headings import (
+    classify_papers_with_scores, generate_headings, get_text_embeddings, order_categories, paper_to_text
+)
+from ..generate_overview import generate_overview
+from ..llm_cache import configure_llm_cache
+from ..models import Paper
+from ..render_latex import render_draft
+from ..retrievers.semantic_scholar import SemanticScholarRetriever
+from .corpus import DATA_DIR, to_semantic_scholar_record
+from .fake_api import DEFAULT_EMBEDDING_DIM, FakeAPI
+
+STAGES = ["retrieval", "embedding", "headings", "ordering", "classification", "overview", "draft"]
+BENCHMARK_TITLE = "Laboratory automation"
+# The fake Semantic Scholar API is not rate limited, so the retriever may go as fast as the latency allows
+S2_REQUESTS_PER_SECOND = 1000.0
+DEFAULT_LATENCIES = {"openai": 0.05, "anthropic": 0.2, "s2": 0.02}
+# Slowdowns smaller than this are noise, whatever the relative threshold
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def point_clients_at(url: str) -> None:
+    """
+    Send the OpenAI and Anthropic requests of gensurv to url instead of the real APIs, replacing the client
+    factories of the stages with clients that need no credentials.
+    """
+    generate_headings = importlib.import_module("gensurv.generate_headings")
+    generate_overview = importlib.import_module("gensurv.generate_overview")
+    openai_client = OpenAI(api_key="benchmark", base_url=f"{url}/v1")
+    anthropic_client = Anthropic(api_key="benchmark", base_url=url)
+    generate_headings.get_client = lambda: openai_client
+    generate_overview.get_client = lambda: anthropic_client
+    # Every generate_overview call runs its own event loop, so it gets a new async client, as in a real run
+    generate_overview.create_async_client = lambda: AsyncAnthropic(api_key="benchmark", base_url=url)
+    configure_embedding_provider(OpenAIEmbeddingProvider(client=openai_client))
+
+
+class StageRecorder:
+    def __init__(self, fake_api: FakeAPI, cache_dir: Path, measure_memory: bool = True):
+        self.fake_api = fake_api
+        self.cache_dir = cache_dir
+        self.measure_memory = measure_memory
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def measure(self, stage: str, n_items: int):
+        """
+        Record the wall time, API calls, peak memory (if enabled) and throughput of the code run in the block.
+        The block runs with an empty embedding cache of its own, so that a stage does not reuse the embeddings
+        of the stages before it and is timed as in a fresh run.
+        Its output is discarded, since printing every paper would dominate the timings of large corpora.
+        """
+        configure_embedding_cache(self.cache_dir / stage)
+        calls_before = self.fake_api.calls()
+        if self.measure_memory:
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            yield
+        seconds = time.perf_counter() - start
+        calls_after = self.fake_api.calls()
+        result = {
+            "seconds": seconds,
+            "calls": {endpoint: count - calls_before.get(endpoint, 0) for endpoint, count in calls_after.items()
+                      if count != calls_before.get(endpoint, 0)},
+            "items": n_items,
+            "items_per_second": n_items / seconds if seconds > 0 else None,
+        }
+        if self.measure_memory:
+            result["peak_memory_mb"] = (tracemalloc.get_traced_memory()[1] - memory_before) / 2 ** 20
+        self.stages[stage] = result
+
+
+def run_corpus(
+        papers: List[Paper],
+        latencies: Dict[str, float] = DEFAULT_LATENCIES,
+        embedding_dim: int = DEFAULT_EMBEDDING_DIM,
+        measure_memory: bool = True,
+        embedding_provider: str = "openai",
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Run every stage of the pipeline on papers against a fake API with the given latencies.
+    Every stage starts with an empty embedding cache in a temporary directory and the LLM cache is disabled,
+    so every stage makes the requests a fresh run would make.
+    :param embedding_provider: "openai" embeds through the fake API; any other spec (see make_embedding_provider),
+        such as "local", embeds in process.
+    :return: The measurements of each stage.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir, FakeAPI(
+        [to_semantic_scholar_record(paper) for paper in papers], latencies, embedding_dim
+    ) as fake_api:
+        point_clients_at(fake_api.url)
+        if embedding_provider != "openai":
+            configure_embedding_provider(embedding_provider)
+        configure_llm_cache(None)
+        retriever = SemanticScholarRetriever(
+            output_dir=Path(tmp_dir) / "semantic_scholar", base_url=f"{fake_api.url}/graph/v1",
+            api_key="benchmark", requests_per_second=S2_REQUESTS_PER_SECOND,
+        )
+        recorder = StageRecorder(fake_api, Path(tmp_dir) / "embeddings", measure_memory)
+        if measure_memory:
+            tracemalloc.start()
+        try:
+            with recorder.measure("retrieval", len(papers)):
+                retrieved = list(retriever.iter_papers(BENCHMARK_TITLE, max_papers=len(papers)))
+            with recorder.measure("embedding", len(retrieved)):
+                get_text_embeddings([paper_to_text(paper) for paper in retrieved])
+            with recorder.measure("headings", len(retrieved)):
+                structured_papers = generate_headings(retrieved)
+            headings = list(structured_papers)
+            with recorder.measure("ordering", len(headings)):
+                order_categories(headings)
+            with recorder.measure("classification", len(retrieved)):
+                classify_papers_with_scores(retrieved, headings)
+            with recorder.measure("overview", len(headings)):
+                overview = generate_overview(structured_papers, BENCHMARK_TITLE)
+            template = (DATA_DIR / "latex" / "template.tex").read_text(encoding="utf-8")
+            with recorder.measure("draft", len(retrieved)):
+                render_draft(template, BENCHMARK_TITLE, overview, retrieved)
+        finally:
+            if measure_memory:
+                tracemalloc.stop()
+    return recorder.stages
+
+
+def compare_with_baseline(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    :param results: Benchmark results, as written by the benchmark script.
+    :param baseline: Earlier results to compare with.
+    :param threshold: Allowed relative increase of wall time and peak memory, e.g. 0.2 for 20%.
+    :return: A description of every regression; API call counts are deterministic, so any increase is one.
+    """
+    regressions = []
+    for corpus, stages in results["corpora"].items():
+        baseline_stages = baseline.get("corpora", {}).get(corpus, {})
+        for stage, measured in stages.items():
+            expected = baseline_stages.get(stage)
+            if expected is None:
+                continue
+            if (measured["seconds"] > expected["seconds"] * (1 + threshold)
+                    and measured["seconds"] - expected["seconds"] > MIN_REGRESSION_SECONDS):
+                regressions.append(f"{corpus}/{stage}: {measured['seconds']:.3f}s vs {expected['seconds']:.3f}s")
+            if ("peak_memory_mb" in measured and "peak_memory_mb" in expected
+                    and measured["peak_memory_mb"] > max(expected["peak_memory_mb"], 1.0) * (1 + threshold)):
+                regressions.append(f"{corpus}/{stage}: peak memory {measured['peak_memory_mb']:.1f} MB "
+                                   f"vs {expected['peak_memory_mb']:.1f} MB")
+            for endpoint, count in measured["calls"].items():
+                if count > expected["calls"].get(endpoint, 0):
+                    regressions.append(f"{corpus}/{stage}: {count} {endpoint} calls "
+                                       f"vs {expected['calls'].get(endpoint, 0)}")
+    return regressions
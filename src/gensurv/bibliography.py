@@ -0,0 +1,173 @@
+from pathlib import Path
+import re
+from typing import Dict, Iterator, List
+
+from .models import Paper
+
+BIBTEX_KEY_PATTERN = re.compile(r"@\w+\s*\{\s*([^,\s]+)\s*,")
+BIBTEX_ENTRY_START_PATTERN = re.compile(r"@\w+\s*\{")
+# \cite, \citep, \citet, \citeauthor, ... with optional [pre][post] notes; the group holds the comma-separated keys
+CITE_PATTERN = re.compile(r"\\cite[a-zA-Z]*\*?(?:\[[^\]]*\])*\{([^}]*)\}")
+
+
+def iter_bibtex_entries(text: str) -> Iterator[str]:
+    """
+    Split BibTeX text into its entries, matching braces so that fields may contain nested braces.
+    """
+    position = 0
+    while (match := BIBTEX_ENTRY_START_PATTERN.search(text, position)) is not None:
+        depth = 0
+        for end in range(match.end() - 1, len(text)):
+            if text[end] == "{":
+                depth += 1
+            elif text[end] == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+        yield text[match.start():end + 1]
+        position = end + 1
+
+
+def bibtex_key(bibtex: str) -> str | None:
+    match = BIBTEX_KEY_PATTERN.search(bibtex or "")
+    return match.group(1) if match else None
+
+
+def bibtex_field(bibtex: str, name: str) -> str | None:
+    match = re.search(rf"\b{name}\s*=\s*[{{\"]\s*(.+?)\s*[}}\"]\s*,?\s*$", bibtex, re.IGNORECASE | re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def normalize_title(title: str) -> str:
+    return re.sub(r"[^0-9a-z]", "", title.lower())
+
+
+def extract_citation_keys(text: str) -> List[str]:
+    """
+    Every key cited in text, in order of appearance.
+    """
+    return [key.strip() for match in CITE_PATTERN.finditer(text) for key in match.group(1).split(",") if key.strip()]
+
+
+def make_bibtex(paper: Paper) -> str:
+    surnames = [author.name.split()[-1] for author in paper.authors or [] if author.name.split()]
+    key = re.sub(r"[^a-z0-9]", "", f"{surnames[0] if surnames else 'anonymous'}{paper.year or ''}".lower()) + paper.id[:8]
+    return (f"@article{{{key},\n title={{{paper.title}}},\n author={{"
+            f"{' and '.join(author.name for author in paper.authors or []) or 'Anonymous'}}},\n"
+            f" journal={{{paper.venue or 'arXiv'}}},\n year={{{paper.year or ''}}}\n}}")
+
+
+def with_bibtex(papers: List[Paper]) -> List[Paper]:
+    """
+    Give papers without citation styles (as in the test datasets and the FileMaker export) a BibTeX entry,
+    which the overview prompts and the bibliography need.
+    """
+    for paper in papers:
+        if not (paper.citation_styles or {}).get("bibtex"):
+            paper.citation_styles = {"bibtex": make_bibtex(paper)}
+    return papers
+
+
+class Bibliography:
+    """
+    The BibTeX entries of a draft, indexed by citation key and by paper identity (DOI, else normalized title).
+    An entry whose paper is already in the bibliography under another key is not added again; its key becomes
+    an alias of the existing one, and canonicalize_citations rewrites citations of aliases.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, str] = {}
+        self.aliases: Dict[str, str] = {}
+        self._keys_by_identity: Dict[str, str] = {}
+
+    @classmethod
+    def parse(cls, text: str) -> "Bibliography":
+        bibliography = cls()
+        for entry in iter_bibtex_entries(text):
+            bibliography.add_entry(entry)
+        return bibliography
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries or key in self.aliases
+
+    def _identities(self, bibtex: str, title: str | None) -> List[str]:
+        identities = []
+        doi = bibtex_field(bibtex, "doi")
+        if doi:
+            identities.append("doi:" + doi.lower())
+        title = title or bibtex_field(bibtex, "title")
+        if title and normalize_title(title):
+            identities.append("title:" + normalize_title(title))
+        return identities
+
+    def add_entry(self, bibtex: str, title: str | None = None) -> str | None:
+        """
+        :param bibtex: A single BibTeX entry.
+        :param title: Title of the paper, if known; otherwise the title field of the entry is used.
+        :return: The key under which the entry can be cited, or None if the entry has no key.
+        """
+        key = bibtex_key(bibtex)
+        if key is None:
+            return None
+        if key in self:
+            return self.resolve(key)
+        identities = self._identities(bibtex, title)
+        for identity in identities:
+            if identity in self._keys_by_identity:
+                self.aliases[key] = self._keys_by_identity[identity]
+                return self.aliases[key]
+        self.entries[key] = bibtex.strip()
+        for identity in identities:
+            self._keys_by_identity[identity] = key
+        return key
+
+    def add_paper(self, paper: Paper) -> str | None:
+        bibtex = (paper.citation_styles or {}).get("bibtex")
+        if not bibtex:
+            print(f"Warning: BibTeX missing for paper: {paper.title}")
+            return None
+        return self.add_entry(bibtex, title=paper.title)
+
+    def add_papers(self, papers: List[Paper]) -> None:
+        for paper in papers:
+            self.add_paper(paper)
+
+    def resolve(self, key: str) -> str:
+        return self.aliases.get(key, key)
+
+    def canonicalize_citations(self, text: str) -> str:
+        """
+        Rewrite citations of duplicate entries to the key that is kept in the bibliography.
+        """
+        if not self.aliases:
+            return text
+
+        def replace(match: re.Match) -> str:
+            keys = [self.resolve(key.strip()) for key in match.group(1).split(",")]
+            start, end = match.span(1)
+            return match.group(0)[:start - match.start()] + ", ".join(dict.fromkeys(keys)) + match.group(0)[end - match.start():]
+
+        return CITE_PATTERN.sub(replace, text)
+
+    def find_missing_citations(self, paragraphs: Dict[str, str]) -> Dict[str, List[str]]:
+        """
+        Check every citation in paragraphs against the bibliography.
+        :param paragraphs: Paragraphs keyed by section title.
+        :return: The cited keys that are not in the bibliography, keyed by section title (sections without any are omitted).
+        """
+        missing = {}
+        for section_title, paragraph in paragraphs.items():
+            unknown_keys = [key for key in dict.fromkeys(extract_citation_keys(paragraph)) if key not in self]
+            if unknown_keys:
+                missing[section_title] = unknown_keys
+        return missing
+
+    def to_bibtex(self) -> str:
+        return "".join(entry + "\n\n" for entry in self.entries.values())
+
+    def write(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_bibtex())
@@ -2,4 +2,10 @@ from .models import Paper
 
 
 def classify_papers(headings: list[str], papers: list[Paper]) -> dict[str, list[Paper]]:
-    ...
+    """
+    Classify papers into given headings (e.g. loaded with load_headings) by embedding similarity.
+    The headings keep their order; headings that receive no paper are dropped.
+    """
+    from .generate_headings import classify_papers_into_categories
+    classification = classify_papers_into_categories(papers, headings)
+    return {heading: classification[heading] for heading in headings if heading in classification}
@@ -0,0 +1,119 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def kmeans(
+        vectors: np.ndarray,
+        k: int,
+        n_iter: int = 50,
+        n_init: int = 4,
+        seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means: cluster unit-normalized vectors by cosine similarity, with k-means++ initialisation.
+    The clustering is run n_init times from different seeds and the one with the highest total similarity is kept.
+    :param vectors: A (n, dim) matrix.
+    :param k: Number of clusters; capped at n.
+    :return: A (n,) array of cluster labels and the (k, dim) matrix of unit-normalized centroids.
+    """
+    x = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    k = min(k, x.shape[0])
+    best = None
+    for run in range(n_init):
+        labels, centroids = _kmeans_single(x, k, n_iter, np.random.default_rng(seed + run))
+        objective = float(np.sum(x * centroids[labels]))
+        if best is None or objective > best[0]:
+            best = (objective, labels, centroids)
+    return best[1], best[2]
+
+
+def _kmeans_single(x: np.ndarray, k: int, n_iter: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    n = x.shape[0]
+
+    # k-means++: pick each new centroid with probability proportional to its squared distance to the nearest one
+    centroids = np.empty((k, x.shape[1]), dtype=x.dtype)
+    centroids[0] = x[rng.integers(n)]
+    closest = np.maximum(2 - 2 * (x @ centroids[0]), 0)
+    for i in range(1, k):
+        total = closest.sum()
+        index = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centroids[i] = x[index]
+        closest = np.minimum(closest, np.maximum(2 - 2 * (x @ centroids[i]), 0))
+
+    labels = np.full(n, -1)
+    for _ in range(n_iter):
+        new_labels = np.argmax(x @ centroids.T, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, x)
+        counts = np.bincount(labels, minlength=k)
+        # Re-seed empty clusters with the points farthest from their centroid
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            farthest = np.argsort(np.sum(x * centroids[labels], axis=1))[:len(empty)]
+            sums[empty] = x[farthest]
+        centroids = normalize_rows(sums)
+    return labels, centroids
+
+
+def silhouette_score(vectors: np.ndarray, labels: np.ndarray) -> float:
+    """
+    Mean silhouette coefficient under cosine distance. Quadratic in n, so pass a sample for large inputs.
+    """
+    x = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    distances = 1 - x @ x.T
+    cluster_ids = np.unique(labels)
+    if len(cluster_ids) < 2:
+        return 0.0
+    membership = (labels[:, None] == cluster_ids[None, :]).astype(np.float32)
+    counts = membership.sum(axis=0)
+    # Mean distance from each point to each cluster; a point's own cluster excludes itself
+    sums = distances @ membership
+    own = np.searchsorted(cluster_ids, labels)
+    own_counts = counts[own] - 1
+    a = np.where(own_counts > 0, sums[np.arange(len(x)), own] / np.maximum(own_counts, 1), 0.0)
+    mean_to_clusters = sums / counts
+    mean_to_clusters[np.arange(len(x)), own] = np.inf
+    b = mean_to_clusters.min(axis=1)
+    s = np.where(own_counts > 0, (b - a) / np.maximum(np.maximum(a, b), 1e-12), 0.0)
+    return float(s.mean())
+
+
+def choose_k(
+        vectors: np.ndarray,
+        k_range: range = range(4, 13),
+        sample_size: int = 2000,
+        seed: int = 0,
+) -> int:
+    """
+    Pick the number of clusters with the best silhouette score, evaluated on a random sample of the vectors.
+    """
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    sample = vectors[rng.choice(n, size=sample_size, replace=False)] if n > sample_size else vectors
+    candidates = [k for k in k_range if 2 <= k < sample.shape[0]]
+    if not candidates:
+        return max(1, min(n, k_range.start))
+    scores = {k: silhouette_score(sample, kmeans(sample, k, seed=seed)[0]) for k in candidates}
+    return max(scores, key=scores.get)
+
+
+def representative_indices(vectors: np.ndarray, labels: np.ndarray, centroids: np.ndarray, top_n: int = 5) -> List[List[int]]:
+    """
+    For each cluster, the indices of the top_n members closest to its centroid, closest first.
+    """
+    similarity = np.sum(normalize_rows(vectors) * centroids[labels], axis=1)
+    representatives = []
+    for cluster in range(centroids.shape[0]):
+        members = np.flatnonzero(labels == cluster)
+        representatives.append(members[np.argsort(-similarity[members])][:top_n].tolist())
+    return representatives
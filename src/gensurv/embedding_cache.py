@@ -0,0 +1,253 @@
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Iterator
+
+import numpy as np
+
+# Bytes of the sha256 digest kept per entry; 128 bits is plenty to avoid collisions
+KEY_BYTES = 16
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "gensurv" / "embeddings"
+INITIAL_CAPACITY = 1024
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()[:KEY_BYTES]
+
+
+class _ModelStore:
+    """
+    Embeddings of a single model, stored as three memory-mapped arrays that share a row index:
+    - vectors.f32: float32 matrix of shape (capacity, dim)
+    - keys.bin: content hash of the text embedded in each row
+    - ticks.bin: last access tick of each row, used for LRU eviction
+    Only the keys are read eagerly (to build the lookup table); vectors stay on disk until a row is read.
+    Several processes can share a store: reads hold a shared lock on store_dir / "lock" and writes, including the
+    access ticks of the rows a read returned, an exclusive one. Each operation first reloads meta.json to pick up
+    rows appended or compacted by other processes.
+    """
+
+    def __init__(self, store_dir: Path, max_bytes: int):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.meta_path = store_dir / "meta.json"
+        self.dim = None
+        self.count = 0
+        self.capacity = 0
+        self.tick = 0
+        # Incremented by every eviction, which moves rows, so that other processes rebuild their index
+        self.generation = 0
+        self.index = {}
+
+    @staticmethod
+    def _build_index(keys: np.ndarray, start: int = 0) -> dict[bytes, int]:
+        raw = keys.tobytes()
+        return {raw[i * KEY_BYTES:(i + 1) * KEY_BYTES]: start + i for i in range(len(keys))}
+
+    @property
+    def entry_bytes(self) -> int:
+        return self.dim * 4 + KEY_BYTES + 8
+
+    @contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.store_dir / "lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                self._reload()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload(self) -> None:
+        if not self.meta_path.exists():
+            return
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        generation = meta.get("generation", 0)
+        if (meta["dim"], meta["capacity"], generation) != (self.dim, self.capacity, self.generation):
+            # Another process created, grew or compacted the store
+            self.dim, self.capacity, self.generation = meta["dim"], meta["capacity"], generation
+            self._open_arrays()
+            self.index = self._build_index(self.keys[:meta["count"]])
+        elif meta["count"] > self.count:
+            self.index.update(self._build_index(self.keys[self.count:meta["count"]], start=self.count))
+        self.count = meta["count"]
+        self.tick = max(self.tick, meta["tick"])
+
+    def _open_arrays(self) -> None:
+        self.vectors = np.memmap(self.store_dir / "vectors.f32", dtype=np.float32, mode="r+",
+                                 shape=(self.capacity, self.dim))
+        self.keys = np.memmap(self.store_dir / "keys.bin", dtype=np.uint8, mode="r+",
+                              shape=(self.capacity, KEY_BYTES))
+        self.ticks = np.memmap(self.store_dir / "ticks.bin", dtype=np.uint64, mode="r+", shape=(self.capacity,))
+
+    def _resize_files(self, capacity: int) -> None:
+        if self.capacity:
+            self._flush_arrays()
+            # Unmap before truncating; a mapping past the end of a shrunk file faults when touched
+            del self.vectors, self.keys, self.ticks
+        for name, row_bytes in (("vectors.f32", self.dim * 4), ("keys.bin", KEY_BYTES), ("ticks.bin", 8)):
+            with open(self.store_dir / name, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self.capacity = capacity
+        self._open_arrays()
+
+    def _write_meta(self) -> None:
+        tmp_path = self.meta_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"dim": self.dim, "count": self.count, "capacity": self.capacity, "tick": self.tick,
+                       "generation": self.generation}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _flush_arrays(self) -> None:
+        self.vectors.flush()
+        self.keys.flush()
+        self.ticks.flush()
+
+    def flush(self) -> None:
+        if self.dim is None:
+            return
+        self._flush_arrays()
+        self._write_meta()
+
+    def get_many(self, keys: list[bytes]) -> list[np.ndarray | None]:
+        if not self.meta_path.exists():
+            return [None] * len(keys)
+        with self._locked(exclusive=False):
+            rows = [self.index.get(key) for key in keys]
+            hits = sorted({row for row in rows if row is not None})
+            if not hits:
+                return [None] * len(keys)
+            vectors = np.asarray(self.vectors[hits])
+        self._touch([key for key, row in zip(keys, rows) if row is not None])
+        position = {row: i for i, row in enumerate(hits)}
+        return [None if row is None else vectors[position[row]] for row in rows]
+
+    def _touch(self, keys: list[bytes]) -> None:
+        # Record the access for eviction. Like any write this needs the exclusive lock, and another process may
+        # have compacted the store since the read, so the rows are looked up again.
+        with self._locked(exclusive=True):
+            rows = sorted({self.index[key] for key in keys if key in self.index})
+            if not rows:
+                return
+            self.tick += 1
+            self.ticks[rows] = self.tick
+            self.ticks.flush()
+            self._write_meta()
+
+    def put_many(self, keys: list[bytes], vectors: np.ndarray) -> None:
+        with self._locked(exclusive=True):
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._resize_files(INITIAL_CAPACITY)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}.")
+
+            self.tick += 1
+            for key, vector in zip(keys, vectors):
+                row = self.index.get(key)
+                if row is None:
+                    if self.count == self.capacity:
+                        self._resize_files(self.capacity * 2)
+                    row = self.count
+                    self.count += 1
+                    self.keys[row] = np.frombuffer(key, dtype=np.uint8)
+                    self.index[key] = row
+                self.vectors[row] = vector
+                self.ticks[row] = self.tick
+
+            if self.count * self.entry_bytes > self.max_bytes:
+                self._evict()
+            self.flush()
+
+    def _evict(self) -> None:
+        # Keep the most recently used rows so that the store shrinks to 90% of its budget, then compact the
+        # files to the kept rows
+        keep_count = int(self.max_bytes * 0.9) // self.entry_bytes
+        keep = np.sort(np.argsort(self.ticks[:self.count], kind="stable")[self.count - keep_count:])
+        vectors, keys, ticks = np.asarray(self.vectors[keep]), np.asarray(self.keys[keep]), np.asarray(self.ticks[keep])
+        self.vectors[:keep_count] = vectors
+        self.keys[:keep_count] = keys
+        self.ticks[:keep_count] = ticks
+        self.count = keep_count
+        self.generation += 1
+        self.index = self._build_index(keys)
+        self._resize_files(max(keep_count, INITIAL_CAPACITY))
+
+
+class EmbeddingCache:
+    """
+    A local, persistent store of text embeddings keyed by (model name, content hash).
+    Each model gets its own memory-mapped store under cache_dir, so opening a large cache is cheap.
+    Entries are evicted least-recently-used first once a model's store grows beyond max_bytes.
+    The cache is safe to share between threads and between processes (e.g. parallel runs using the default
+    cache_dir); stores are locked with fcntl while they are read or written.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def _store(self, model: str) -> _ModelStore:
+        if model not in self._stores:
+            store_dir = self.cache_dir / re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+            self._stores[model] = _ModelStore(store_dir, self.max_bytes)
+        return self._stores[model]
+
+    def get_many(self, model: str, texts: list[str]) -> list[np.ndarray | None]:
+        """
+        Look up the embeddings of texts.
+        :return: One entry per text: the cached embedding, or None on a miss.
+        """
+        keys = [text_hash(text) for text in texts]
+        with self._lock:
+            return self._store(model).get_many(keys)
+
+    def put_many(self, model: str, texts: list[str], vectors: np.ndarray) -> None:
+        """
+        Store the embeddings of texts; row i of vectors is the embedding of texts[i].
+        """
+        if not texts:
+            return
+        keys = [text_hash(text) for text in texts]
+        with self._lock:
+            self._store(model).put_many(keys, np.asarray(vectors, dtype=np.float32))
+
+    def __len__(self) -> int:
+        return sum(store.count for store in self._stores.values())
+
+
+_embedding_cache = None
+_embedding_cache_configured = False
+
+
+def configure_embedding_cache(cache_dir: Path | None, max_bytes: int = DEFAULT_MAX_BYTES) -> EmbeddingCache | None:
+    """
+    Set the process-wide embedding cache. Pass None as cache_dir to disable caching.
+    """
+    global _embedding_cache, _embedding_cache_configured
+    _embedding_cache = EmbeddingCache(cache_dir, max_bytes) if cache_dir is not None else None
+    _embedding_cache_configured = True
+    return _embedding_cache
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """
+    Return the process-wide embedding cache, configuring it from the environment on first use.
+    GENSURV_EMBEDDING_CACHE_DIR sets the location (an empty value disables the cache) and
+    GENSURV_EMBEDDING_CACHE_MAX_BYTES the per-model size budget.
+    """
+    if not _embedding_cache_configured:
+        cache_dir = os.environ.get("GENSURV_EMBEDDING_CACHE_DIR", str(DEFAULT_CACHE_DIR))
+        max_bytes = int(os.environ.get("GENSURV_EMBEDDING_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        configure_embedding_cache(Path(cache_dir).expanduser() if cache_dir else None, max_bytes)
+    return _embedding_cache
@@ -0,0 +1,247 @@
+from abc import ABC, abstractmethod
+import hashlib
+import os
+from pathlib import Path
+from typing import List, TYPE_CHECKING
+
+import numpy as np
+
+from .tracing import span
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+# Upper bounds for a single embeddings request. The API accepts up to 2048 inputs,
+# but keeping batches smaller bounds the payload size and the cost of a retry.
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_BATCH_MAX_CHARS = 400_000
+# Provider used when neither configure_embedding_provider() nor GENSURV_EMBEDDING_PROVIDER says otherwise
+DEFAULT_PROVIDER_SPEC = "openai"
+# Hashed (unigram and bigram) features of the local provider, and the dimension of the vectors it returns
+LOCAL_N_FEATURES = 2 ** 16
+LOCAL_EMBEDDING_DIM = 256
+
+
+class EmbeddingProvider(ABC):
+    """
+    Turns texts into vectors. Similarities are only meaningful between vectors of the same provider.
+    name identifies the provider and its settings: it namespaces the embedding cache and is saved in run
+    fingerprints, so it must change whenever the vectors would. Providers that are cheaper to run than to look up
+    set cacheable to False.
+    """
+    name: str
+    cacheable: bool = True
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        :return: A (len(texts), dim) float matrix whose rows follow the order of texts.
+        """
+
+
+def iter_embedding_batches(
+        texts: List[str],
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_chars: int = EMBEDDING_BATCH_MAX_CHARS,
+) -> List[List[int]]:
+    """
+    Split texts into request-sized batches of indices.
+    A batch is closed when it reaches batch_size inputs or when adding the next text would exceed max_chars.
+    """
+    batches = []
+    batch, batch_chars = [], 0
+    for i, text in enumerate(texts):
+        if batch and (len(batch) >= batch_size or batch_chars + len(text) > max_chars):
+            batches.append(batch)
+            batch, batch_chars = [], 0
+        batch.append(i)
+        batch_chars += len(text)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """
+    Embeddings from the OpenAI API, requested in batches of at most batch_size texts and max_chars characters.
+    """
+
+    def __init__(
+            self,
+            model: str = EMBEDDING_MODEL,
+            client: "OpenAI | None" = None,
+            batch_size: int = EMBEDDING_BATCH_SIZE,
+            max_chars: int = EMBEDDING_BATCH_MAX_CHARS,
+    ):
+        self.model = model
+        self._client = client
+        self.batch_size = batch_size
+        self.max_chars = max_chars
+        # Cache entries are keyed by the model alone, as they were before providers existed
+        self.name = model
+
+    @property
+    def client(self) -> "OpenAI":
+        # Created on first use, so that embeddings served from the cache need neither openai nor an API key
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        embeddings = [None] * len(texts)
+        for batch in iter_embedding_batches(texts, self.batch_size, self.max_chars):
+            with span("openai.embeddings", "llm", model=self.model, texts=len(batch)) as span_args:
+                response = self.client.embeddings.create(input=[texts[i] for i in batch], model=self.model)
+                span_args["input_tokens"] = response.usage.prompt_tokens
+            # The API echoes an index per input, which keeps the mapping explicit
+            for item in response.data:
+                embeddings[batch[item.index]] = item.embedding
+        return np.array(embeddings)
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    CPU-only embeddings that need neither network nor API key.
+    Texts are turned into hashed unigram and bigram counts (sublinear tf), weighted by idf and L2-normalized,
+    then projected to dim dimensions: by the SVD of a fitted corpus (latent semantic analysis, see fit()), or,
+    without a fitted model, by a fixed sparse random projection, which preserves the cosine similarities of the
+    hashed features. Being stateless, a text always gets the same vector, whatever it is embedded with.
+    """
+    cacheable = False
+
+    def __init__(
+            self,
+            dim: int = LOCAL_EMBEDDING_DIM,
+            n_features: int = LOCAL_N_FEATURES,
+            idf: np.ndarray | None = None,
+            components: np.ndarray | None = None,
+            seed: int = 0,
+    ):
+        if components is not None:
+            dim = components.shape[0]
+        self.dim = dim
+        self.n_features = n_features
+        self.idf = idf
+        self.components = components
+        self.seed = seed
+        self._projection = None
+        if components is None:
+            self.name = f"local-hashing-{n_features}-{dim}-{seed}"
+        else:
+            digest = hashlib.sha256(np.ascontiguousarray(components).tobytes()).hexdigest()[:12]
+            self.name = f"local-lsa-{digest}"
+
+    @staticmethod
+    def _vectorizer(n_features: int):
+        # scikit-learn is only imported once a local provider is used
+        from sklearn.feature_extraction.text import HashingVectorizer
+        return HashingVectorizer(
+            n_features=n_features, ngram_range=(1, 2), stop_words="english", alternate_sign=False, norm=None,
+            dtype=np.float32,
+        )
+
+    @classmethod
+    def _term_frequencies(cls, texts: List[str], n_features: int):
+        counts = cls._vectorizer(n_features).transform(texts)
+        counts.data = 1.0 + np.log(counts.data)
+        return counts
+
+    def _features(self, texts: List[str]):
+        from sklearn.preprocessing import normalize
+        features = self._term_frequencies(texts, self.n_features)
+        if self.idf is not None:
+            features = features.multiply(self.idf.reshape(1, -1)).tocsr()
+        return normalize(features)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        features = self._features(texts)
+        if self.components is not None:
+            vectors = features @ self.components.T.astype(np.float32)
+        else:
+            if self._projection is None:
+                from sklearn.random_projection import SparseRandomProjection
+                from scipy.sparse import csr_matrix
+                # The projection only depends on the shape of the data it is fitted on, so a single empty row will do
+                self._projection = SparseRandomProjection(n_components=self.dim, random_state=self.seed).fit(
+                    csr_matrix((1, self.n_features), dtype=np.float32)
+                )
+            vectors = self._projection.transform(features)
+        return np.asarray(vectors.todense() if hasattr(vectors, "todense") else vectors, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, texts: List[str], dim: int = LOCAL_EMBEDDING_DIM, n_features: int = LOCAL_N_FEATURES) -> "LocalEmbeddingProvider":
+        """
+        Fit idf weights and an SVD projection (latent semantic analysis) on a corpus, typically the papers that
+        are going to be classified. dim is capped below the number of texts.
+        """
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.preprocessing import normalize
+        if len(texts) < 2:
+            raise ValueError("Fitting a local embedding model needs at least two texts.")
+        term_frequencies = cls._term_frequencies(texts, n_features)
+        document_frequencies = np.bincount(term_frequencies.indices, minlength=n_features)
+        idf = (np.log((1 + len(texts)) / (1 + document_frequencies)) + 1).astype(np.float32)
+        features = normalize(term_frequencies.multiply(idf.reshape(1, -1)).tocsr())
+        svd = TruncatedSVD(n_components=min(dim, len(texts) - 1), random_state=0).fit(features)
+        # Rounded to the float16 precision save() stores, so a fitted model and its saved copy embed texts
+        # identically and share a name
+        return cls(n_features=n_features, idf=idf, components=svd.components_.astype(np.float16).astype(np.float32))
+
+    def save(self, path: Path) -> None:
+        if self.components is None:
+            raise ValueError("Only fitted local embedding models can be saved.")
+        # float16 halves the file size; the projection does not need more precision, and fit() already rounded to it
+        # Written through a file object so that numpy does not append .npz to the path
+        with open(path, "wb") as f:
+            np.savez_compressed(f, idf=self.idf, components=self.components.astype(np.float16),
+                                n_features=self.n_features)
+
+    @classmethod
+    def load(cls, path: Path) -> "LocalEmbeddingProvider":
+        with np.load(Path(path)) as model:
+            return cls(n_features=int(model["n_features"]), idf=model["idf"],
+                       components=model["components"].astype(np.float32))
+
+
+def make_embedding_provider(spec: str) -> EmbeddingProvider:
+    """
+    :param spec: "openai" (EMBEDDING_MODEL), "openai:<model>", "local" (hashing with a random projection)
+        or "local:<path>" (a model fitted with LocalEmbeddingProvider.fit and saved as .npz).
+    """
+    kind, _, argument = spec.partition(":")
+    if kind == "openai":
+        return OpenAIEmbeddingProvider(argument or EMBEDDING_MODEL)
+    if kind == "local":
+        return LocalEmbeddingProvider.load(Path(argument).expanduser()) if argument else LocalEmbeddingProvider()
+    raise ValueError(f"Unknown embedding provider: {spec}. Use 'openai', 'openai:<model>', 'local' or 'local:<path>'.")
+
+
+_embedding_provider: EmbeddingProvider | None = None
+_embedding_provider_spec: str | None = None
+
+
+def configure_embedding_provider(provider: EmbeddingProvider | str | None) -> EmbeddingProvider | None:
+    """
+    Set the process-wide embedding provider, given as a provider or a spec (see make_embedding_provider).
+    Configuring the spec that is already configured keeps the current provider (and its loaded model).
+    None goes back to the default, resolved again on next use.
+    """
+    global _embedding_provider, _embedding_provider_spec
+    if isinstance(provider, str):
+        if provider != _embedding_provider_spec or _embedding_provider is None:
+            _embedding_provider, _embedding_provider_spec = make_embedding_provider(provider), provider
+    else:
+        _embedding_provider, _embedding_provider_spec = provider, None
+    return _embedding_provider
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """
+    Return the process-wide embedding provider, configuring it on first use from GENSURV_EMBEDDING_PROVIDER
+    (a spec, see make_embedding_provider), which defaults to "openai".
+    """
+    if _embedding_provider is None:
+        configure_embedding_provider(os.environ.get("GENSURV_EMBEDDING_PROVIDER") or DEFAULT_PROVIDER_SPEC)
+    return _embedding_provider
@@ -1,16 +1,31 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
 import os
 from pathlib import Path
-import re
 import shutil
 import subprocess
-from typing import List, Dict
+import time
+from typing import List, Dict, Tuple, TYPE_CHECKING
 
-from aider.coders import Coder
-from aider.models import Model
-from aider.io import InputOutput
 from pydantic import BaseModel
 
+from .bibliography import Bibliography
 from .models import Paper
+from .render_latex import render_draft
+from .tracing import span
+
+if TYPE_CHECKING:
+    from aider.coders import Coder
+
+LATEX_JOB_NAME = "template"
+LATEX_COMMAND = ["pdflatex", "-interaction=nonstopmode", f"{LATEX_JOB_NAME}.tex"]
+BIBTEX_COMMAND = ["bibtex", "-debug", LATEX_JOB_NAME]
+# LaTeX passes per build; three are enough for citations, a fourth or fifth only when the .aux keeps changing
+MAX_LATEX_PASSES = 5
+DEFAULT_LATEX_WORKERS = 4
+# Hashes of the inputs of the last build, kept next to template.tex
+LATEX_BUILD_STATE_FILENAME = ".latex_build.json"
 
 
 class Config(BaseModel):
@@ -22,7 +37,12 @@ class Config(BaseModel):
     model_name: str = "claude-3-5-sonnet-20240620"
 
 
-def setup_coder(config: Config) -> Coder:
+def setup_coder(config: Config) -> "Coder":
+    # aider is only needed for the optional LLM passes, so it is imported on demand
+    from aider.coders import Coder
+    from aider.io import InputOutput
+    from aider.models import Model
+
     io = InputOutput(yes=True)
     main_model = Model(config.model_name)
     return Coder.create(
@@ -35,106 +55,214 @@ def setup_coder(config: Config) -> Coder:
     )
 
 
-def replace_title_in_latex(coder: Coder, title: str) -> None:
-    file_path = list(coder.abs_fnames)[0]
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+def run_latex_command(command: List[str], cwd: str, timeout: int = 30, verbose: bool = True) -> int | None:
+    """
+    :return: The exit code of the command, or None if it could not run to completion.
+    """
+    try:
+        with span(f"latex.{Path(command[0]).name}", "subprocess", command=" ".join(command), cwd=str(cwd)) as span_args:
+            result = subprocess.run(
+                command,
+                cwd=cwd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=timeout,
+            )
+            span_args["returncode"] = result.returncode
+        if verbose:
+            print(f"Command: {' '.join(command)}")
+            print(f"Exit code: {result.returncode}")
+            print(f"Standard Output:\n{result.stdout}")
+            print(f"Standard Error:\n{result.stderr}")
+        if result.returncode != 0:
+            print(f"Warning: Command {' '.join(command)} exited with non-zero status")
+        return result.returncode
+    except subprocess.TimeoutExpired:
+        print(f"Command {' '.join(command)} timed out after {timeout} seconds")
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Error running command {' '.join(command)}: {e}")
+    return None
 
-    pattern = r'\\title\{TITLE HERE\}'
-    replacement = rf'\\title{{{title}}}'
-    updated_content = re.sub(pattern, replacement, content)
 
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(updated_content)
-    return
+class LatexPass(BaseModel):
+    command: List[str]
+    seconds: float
+    returncode: int | None
 
 
-def add_section_to_latex(coder: Coder, section_title: str, section_content: str) -> None:
-    latex_edit_template = """
-        Add the following section to the latex template:
-        \section{{{section_title}}}
-        {section_content}
+class LatexBuildReport(BaseModel):
+    cwd: str
+    pdf_file: str
+    passes: List[LatexPass] = []
+    skipped: bool = False
+    pdf_created: bool = False
 
-       - Note that you should properly escape use LaTeX special characters, e.g. backslash, blacket, etc.
-       - If there are duplicate bibtex entries, you should remove them.
-    """
-    coder.run(
-        latex_edit_template.format(
-            section_title=section_title,
-            section_content=section_content
-        )
-    )
+    @property
+    def seconds(self) -> float:
+        return sum(latex_pass.seconds for latex_pass in self.passes)
 
 
-def add_bibtex_to_latex(coder: Coder, papers: List[Paper]) -> None:
-    latex_edit_template = "Add the following bibtex entries to the latex template:"
-    for paper in papers:
-        bibtex = paper.citation_styles["bibtex"]
-        bibtex_string = "\n".join(bibtex)
-        latex_edit_template += bibtex_string + "\n"
-    
-    coder.run(latex_edit_template)
+def _hash_file(path: Path) -> str | None:
+    if not path.exists():
+        return None
+    return hashlib.sha256(path.read_bytes()).hexdigest()
 
 
-def run_latex_command(command: List[str], cwd: str, timeout: int = 30) -> None:
-    try:
-        result = subprocess.run(
-            command,
-            cwd=cwd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=timeout,
-        )
-        print(f"Command: {' '.join(command)}")
-        print(f"Exit code: {result.returncode}")
-        print(f"Standard Output:\n{result.stdout}")
-        print(f"Standard Error:\n{result.stderr}")
-        if result.returncode != 0:
-            print(f"Warning: Command {' '.join(command)} exited with non-zero status")
-    except subprocess.TimeoutExpired:
-        print(f"Command {' '.join(command)} timed out after {timeout} seconds")
-    except subprocess.CalledProcessError as e:
-        print(f"Error running command {' '.join(command)}: {e}")
+def _hash_bibtex_inputs(cwd: Path) -> str | None:
+    # bibtex only reads the citation, style and database lines of the .aux file, and the .bib files
+    aux_path = cwd / f"{LATEX_JOB_NAME}.aux"
+    if not aux_path.exists():
+        return None
+    lines = [
+        line for line in aux_path.read_text(encoding="utf-8", errors="replace").splitlines()
+        if line.startswith(("\\citation", "\\bibdata", "\\bibstyle"))
+    ]
+    digest = hashlib.sha256("\n".join(lines).encode("utf-8"))
+    for bib_path in sorted(cwd.glob("*.bib")):
+        digest.update(bib_path.read_bytes())
+    return digest.hexdigest()
 
 
-def compile_latex(cwd: str, pdf_file: str, timeout: int = 30) -> None:
-    print("GENERATING LATEX")
+def _hash_sources(cwd: Path) -> str:
+    digest = hashlib.sha256()
+    for path in sorted([*cwd.glob("*.tex"), *cwd.glob("*.bib"), *cwd.glob("*.sty"), *cwd.glob("*.bst")]):
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
 
-    commands = [
-        ["pdflatex", "-interaction=nonstopmode", "template.tex"],
-        ["bibtex", "-debug", "template"],
-        ["pdflatex", "-interaction=nonstopmode", "template.tex"],
-        ["pdflatex", "-interaction=nonstopmode", "template.tex"]
-    ]
 
-    for command in commands:
-        run_latex_command(command, cwd, timeout)
+def compile_latex(
+        cwd: str,
+        pdf_file: str,
+        timeout: int = 30,
+        latex_command: List[str] = LATEX_COMMAND,
+        bibtex_command: List[str] = BIBTEX_COMMAND,
+        max_latex_passes: int = MAX_LATEX_PASSES,
+        verbose: bool = True,
+) -> LatexBuildReport:
+    """
+    Build template.tex in cwd into pdf_file, running only the passes whose inputs changed.
+    Nothing runs if the sources are unchanged since the last build of pdf_file. Otherwise LaTeX runs once,
+    bibtex runs if the citations or .bib files changed (or there is no .bbl yet), and LaTeX reruns until the
+    .aux and .bbl files reach a fixed point, at most max_latex_passes times in total.
+    The commands can be replaced, e.g. by stubs where TeX is not installed.
+    :return: The commands that ran, with their timings.
+    """
+    build_dir = Path(cwd)
+    report = LatexBuildReport(cwd=str(cwd), pdf_file=str(pdf_file))
+    state_path = build_dir / LATEX_BUILD_STATE_FILENAME
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+    sources_hash = _hash_sources(build_dir)
+    if state.get("sources") == sources_hash and Path(pdf_file).exists():
+        print(f"LaTeX sources in {cwd} are unchanged; skipping the build")
+        report.skipped = True
+        return report
+
+    def run(command: List[str]) -> None:
+        start = time.perf_counter()
+        returncode = run_latex_command(command, cwd, timeout, verbose)
+        report.passes.append(LatexPass(command=command, seconds=time.perf_counter() - start, returncode=returncode))
+
+    print("GENERATING LATEX")
+    aux_path = build_dir / f"{LATEX_JOB_NAME}.aux"
+    bbl_path = build_dir / f"{LATEX_JOB_NAME}.bbl"
+    latex_passes = 0
+    while latex_passes < max_latex_passes:
+        inputs_before = (_hash_file(aux_path), _hash_file(bbl_path))
+        run(latex_command)
+        latex_passes += 1
 
+        bibtex_inputs = _hash_bibtex_inputs(build_dir)
+        if bibtex_inputs is not None and (bibtex_inputs != state.get("bibtex_inputs") or not bbl_path.exists()):
+            run(bibtex_command)
+            state["bibtex_inputs"] = bibtex_inputs
+        if (_hash_file(aux_path), _hash_file(bbl_path)) == inputs_before:
+            break
+
+    for latex_pass in report.passes:
+        print(f"{' '.join(latex_pass.command)}: {latex_pass.seconds:.2f}s (exit code {latex_pass.returncode})")
     print("FINISHED GENERATING LATEX")
 
     try:
-        shutil.move(os.path.join(cwd, "template.pdf"), pdf_file)
+        shutil.move(os.path.join(cwd, f"{LATEX_JOB_NAME}.pdf"), pdf_file)
+        report.pdf_created = True
         print(f"PDF successfully moved to {pdf_file}")
     except FileNotFoundError:
         print("Failed to rename PDF. File not found.")
     except Exception as e:
         print(f"Error moving PDF: {e}")
 
+    if report.pdf_created:
+        state["sources"] = sources_hash
+    state_path.write_text(json.dumps(state))
+    return report
+
+
+def compile_latex_dirs(
+        builds: List[Tuple[str, str]],
+        max_workers: int = DEFAULT_LATEX_WORKERS,
+        **kwargs,
+) -> List[LatexBuildReport]:
+    """
+    Run compile_latex for several (cwd, pdf_file) pairs in parallel worker processes.
+    :param kwargs: Passed on to compile_latex.
+    :return: The build reports, in the order of builds.
+    """
+    kwargs.setdefault("verbose", False)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(compile_latex, cwd, pdf_file, **kwargs) for cwd, pdf_file in builds]
+        return [future.result() for future in futures]
+
+
+def write_bibliography(bibliography: Bibliography, overview: Dict[str, str], output_dir: Path) -> None:
+    """
+    Write references.bib next to the draft and warn about citations that are not in it.
+    """
+    bibliography.write(Path(output_dir) / "references.bib")
+    for section_title, keys in bibliography.find_missing_citations(overview).items():
+        print(f"Warning: section '{section_title}' cites keys missing from references.bib: {', '.join(keys)}")
+
 
-def generate_draft(title: str, overview: Dict[str, str], papers: List[Paper], output_dir: Path, _compile_latex: bool = False) -> None:
+def polish_latex(coder: "Coder") -> None:
+    with span("aider.run", "llm", model=coder.main_model.name):
+        coder.run(
+            """
+            Proofread the survey in the latex template and improve its flow and wording.
+            - Do not add, remove or change any \\cite{...} command or bibtex entry.
+            - Keep the sections and their order as they are.
+            - Fix anything that would not compile, e.g. unescaped LaTeX special characters.
+            """
+        )
+
+
+def generate_draft(
+        title: str,
+        overview: Dict[str, str],
+        papers: List[Paper],
+        output_dir: Path,
+        _compile_latex: bool = False,
+        polish: bool = False,
+) -> None:
+    """
+    Write the survey into output_dir / "template.tex".
+    The title, BibTeX entries and sections are rendered directly into the template without any LLM call,
+    and the bibliography is also written to output_dir / "references.bib"; with polish=True, aider then makes one editing pass over the rendered draft.
+    """
     config = Config(
         latex_dir=str(output_dir),
         writeup_file=str(output_dir / "template.tex"),
         pdf_output=str(output_dir / "paper.pdf")
     )
-    coder = setup_coder(config)
-
-    replace_title_in_latex(coder, title)
+    with open(config.writeup_file, "r", encoding="utf-8") as f:
+        template = f.read()
+    latex, bibliography = render_draft(template, title, overview, papers)
+    with open(config.writeup_file, "w", encoding="utf-8") as f:
+        f.write(latex)
+    write_bibliography(bibliography, overview, output_dir)
 
-    add_bibtex_to_latex(coder, papers)
-    for section_title, paragraph in overview.items():
-        add_section_to_latex(coder, section_title, paragraph)
+    if polish:
+        polish_latex(setup_coder(config))
 
     if _compile_latex:
         compile_latex(config.latex_dir, config.pdf_output)
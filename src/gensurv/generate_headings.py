@@ -1,16 +1,39 @@
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
 import numpy as np
 from dotenv import load_dotenv
 import os
 import json
-import networkx as nx
-from typing import List, Dict
+from typing import List, Dict, Tuple, TYPE_CHECKING
 import re
+import warnings
 
-from .models import Paper
+from .clustering import choose_k, kmeans, normalize_rows, representative_indices
+from .embedding_cache import get_embedding_cache
+from .embeddings import EmbeddingProvider, OpenAIEmbeddingProvider, get_embedding_provider
+from .llm_cache import cached_openai_chat
+from .models import Paper, PaperTable
+from .ordering import ORDERING_METHODS, cosine_similarity_matrix
+from .tracing import get_tracer
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+CATEGORY_MODEL = "gpt-4o"
+# Token budget for the papers placed in a single category-generation prompt, well below gpt-4o's context window
+CATEGORY_PROMPT_TOKEN_BUDGET = 30_000
+# Number of chunks whose categories are proposed at the same time in map-reduce mode
+CATEGORY_MAP_WORKERS = 4
+# Number of papers closest to a cluster centroid shown to the LLM when naming the cluster
+CLUSTER_REPRESENTATIVES = 5
+
+@cache
+def get_client() -> "OpenAI":
+    # Created on first use: importing openai is slow, and runs served from the LLM cache need no API key
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 def generate_initial_categories(sample_papers: List[Paper]) -> List[str]:
     
@@ -44,17 +67,16 @@ def generate_initial_categories(sample_papers: List[Paper]) -> List[str]:
     Categories:
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4o", 
+    raw_output = cached_openai_chat(
+        get_client,
+        model=CATEGORY_MODEL,
         messages=[
             {"role": "system", "content": "You are an expert in categorizing scientific research papers."},
             {"role": "user", "content": prompt}
         ],
         temperature=0.5,  
         max_tokens=1000
-    )
-
-    raw_output = response.choices[0].message.content.strip()
+    ).strip()
     
     categories = raw_output.split("\n")
     categories = [re.sub(r'^\d+\.\s*', '', cat.strip()) for cat in categories]
@@ -97,17 +119,16 @@ def refine_categories(categories: List[str], sample_papers: List[Paper]) -> List
     Refined Categories:
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
+    raw_output = cached_openai_chat(
+        get_client,
+        model=CATEGORY_MODEL,
         messages=[
             {"role": "system", "content": "You are an expert in refining research categories."},
             {"role": "user", "content": prompt}
         ],
         temperature=0.5,
         max_tokens=1000
-    )
-
-    raw_output = response.choices[0].message.content.strip()
+    ).strip()
 
     refined_categories = raw_output.strip().split('\n')
     refined_categories = [re.sub(r'^\d+\.\s*', '', cat.strip()) for cat in refined_categories]
@@ -116,16 +137,206 @@ def refine_categories(categories: List[str], sample_papers: List[Paper]) -> List
     # return [cat[:50] for cat in refined_categories if cat]
     return [cat for cat in categories if cat]
 
-def get_text_embedding(text: str, model: str = "text-embedding-3-large") -> np.array:
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English text; good enough to size prompts without a tokenizer
+    return len(text) // 4 + 1
+
+def paper_prompt_tokens(paper: Paper) -> int:
+    return estimate_tokens(json.dumps({"title": paper.title, "abstract": paper.abstract}, indent=2))
+
+def partition_papers_by_tokens(papers: List[Paper], max_tokens: int = CATEGORY_PROMPT_TOKEN_BUDGET) -> List[List[Paper]]:
+
+    """
+    ・Split papers into consecutive chunks whose prompt size stays within max_tokens.
+    ・A single paper larger than the budget gets a chunk of its own.
+    """
+
+    chunks = []
+    chunk, chunk_tokens = [], 0
+    for paper in papers:
+        tokens = paper_prompt_tokens(paper)
+        if chunk and chunk_tokens + tokens > max_tokens:
+            chunks.append(chunk)
+            chunk, chunk_tokens = [], 0
+        chunk.append(paper)
+        chunk_tokens += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def systematic_sampling(papers: List[Paper], interval: int) -> List[Paper]:
+    # Take every interval-th paper, which keeps the sample spread over the whole list
+    return papers[::max(1, interval)]
+
+def sample_papers_within_budget(papers: List[Paper], max_tokens: int = CATEGORY_PROMPT_TOKEN_BUDGET) -> List[Paper]:
+
+    """
+    ・Systematically sample papers so that the sample fits in a prompt of max_tokens.
+    """
+
+    total_tokens = sum(paper_prompt_tokens(paper) for paper in papers)
+    interval = -(-total_tokens // max_tokens)
+    sample = systematic_sampling(papers, interval)
+    return partition_papers_by_tokens(sample, max_tokens)[0] if sample else sample
+
+def merge_categories(candidate_categories: List[str], max_tokens: int = CATEGORY_PROMPT_TOKEN_BUDGET) -> List[str]:
+
+    """
+    ・Reduce step: merge and deduplicate the categories proposed for each chunk of papers into one set.
+    ・Exact duplicates are dropped first; the remaining names are merged by the LLM.
+    ・If the names themselves exceed max_tokens, they are merged group by group and the results merged again.
+    """
+
+    unique_categories = list({cat.strip().lower(): cat.strip() for cat in candidate_categories if cat.strip()}.values())
+
+    groups = [[]]
+    group_tokens = 0
+    for category in unique_categories:
+        tokens = estimate_tokens(category) + 2
+        if groups[-1] and group_tokens + tokens > max_tokens:
+            groups.append([])
+            group_tokens = 0
+        groups[-1].append(category)
+        group_tokens += tokens
+    if len(groups) > 1:
+        return merge_categories([cat for group in groups for cat in merge_categories(group, max_tokens)], max_tokens)
+
+    prompt = f"""
+    The following research categories were proposed independently for different subsets of the same collection of papers.
+    Merge them into a single set of categories for the whole collection.
+
+    Your task:
+    1. Merge categories that are duplicates, synonyms or strongly overlapping
+    2. Keep categories that represent distinct research themes
+    3. Each category should be between 4-8 words long
+    4. Use terminology that is widely recognized in academic and professional research
+
+    Aim to produce 7-10 categories.
+    Ensure that each category is complete and does not get cut off midway.
+
+    Proposed Categories:
+    {json.dumps(unique_categories, indent=2)}
+
+    Provide the merged categories as a numbered list, with each category on a new line.
+
+    Merged Categories:
+    """
+
+    raw_output = cached_openai_chat(
+        get_client,
+        model=CATEGORY_MODEL,
+        messages=[
+            {"role": "system", "content": "You are an expert in organizing research categories."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.5,
+        max_tokens=1000
+    ).strip()
+
+    merged_categories = [re.sub(r'^\d+\.\s*', '', cat.strip()) for cat in raw_output.split("\n")]
+    return [cat for cat in merged_categories if cat]
+
+def generate_categories_map_reduce(
+        papers: List[Paper],
+        max_tokens: int = CATEGORY_PROMPT_TOKEN_BUDGET,
+        max_workers: int = CATEGORY_MAP_WORKERS,
+) -> List[str]:
+
+    """
+    ・Map step: partition papers into chunks of at most max_tokens and propose categories for all chunks concurrently.
+    ・Reduce step: merge the proposals into one deduplicated set with merge_categories.
+    ・Every prompt stays within max_tokens however many papers there are.
+    """
+
+    chunks = partition_papers_by_tokens(papers, max_tokens)
+    if len(chunks) == 1:
+        return generate_initial_categories(chunks[0])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        proposals = list(executor.map(generate_initial_categories, chunks))
+    return merge_categories([cat for categories in proposals for cat in categories], max_tokens)
+
+def _embedding_provider_for(provider: EmbeddingProvider | str | None, model: str | None) -> EmbeddingProvider | None:
+    # Before providers existed, callers chose an OpenAI model with model=, or as the second positional argument
+    if isinstance(provider, str):
+        provider, model = None, provider
+    if model is None:
+        return provider
+    if provider is not None:
+        raise ValueError("Pass either provider or model, not both.")
+    warnings.warn("model= is deprecated; pass provider=OpenAIEmbeddingProvider(model) instead.",
+                  DeprecationWarning, stacklevel=3)
+    return OpenAIEmbeddingProvider(model)
+
+def get_text_embedding(text: str, provider: EmbeddingProvider | None = None, model: str | None = None) -> np.array:
     
     """
-    ・Generate a text embedding for the given input using the specified model.
+    ・Generate a text embedding for the given input using the specified provider (default: the configured one).
     ・This is used to numerically represent the content of the text, enabling similarity calculations.
+    ・model is a deprecated alias for provider=OpenAIEmbeddingProvider(model).
+    """
+
+    return get_text_embeddings([text], provider=_embedding_provider_for(provider, model))[0]
+
+def get_text_embeddings(
+        texts: List[str],
+        provider: EmbeddingProvider | None = None,
+        model: str | None = None,
+) -> np.ndarray:
+
+    """
+    ・Generate embeddings for many texts with as few requests as possible.
+    ・provider defaults to the process-wide one (see gensurv.embeddings.configure_embedding_provider).
+    ・model is a deprecated alias for provider=OpenAIEmbeddingProvider(model).
+    ・Returns a (len(texts), dim) matrix whose rows follow the order of texts.
+    """
+
+    provider = _embedding_provider_for(provider, model)
+    if not texts:
+        return np.empty((0, 0))
+    if provider is None:
+        provider = get_embedding_provider()
+
+    # Serve what we can from the local cache and only embed the missing texts, once each
+    cache = get_embedding_cache() if provider.cacheable else None
+    embeddings = cache.get_many(provider.name, texts) if cache is not None else [None] * len(texts)
+    missing_texts = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+    if cache is not None:
+        get_tracer().increment("embedding_cache.hits", sum(embedding is not None for embedding in embeddings))
+
+    if missing_texts:
+        fetched = provider.embed(missing_texts)
+        if cache is not None:
+            cache.put_many(provider.name, missing_texts, fetched)
+        if len(missing_texts) == len(texts):
+            return np.asarray(fetched)
+        fetched_by_text = dict(zip(missing_texts, fetched))
+        embeddings = [fetched_by_text[text] if embedding is None else embedding for text, embedding in zip(texts, embeddings)]
+    return np.array(embeddings)
+
+def paper_to_text(paper: Paper) -> str:
+    # Concatenate title and abstract, which is what papers are embedded from
+    paper_content = ""
+    if paper.title is not None:
+        paper_content += paper.title + " "
+    if paper.abstract is not None:
+        paper_content += paper.abstract
+    return paper_content
+
+def paper_texts(papers: List[Paper]) -> List[str]:
+    # The texts of many papers; a PaperTable builds them from its columns without creating Paper objects
+    if isinstance(papers, PaperTable):
+        return [title + " " + (abstract or "") for title, abstract in zip(papers.titles, papers.abstracts)]
+    return [paper_to_text(paper) for paper in papers]
+
+def compute_paper_category_scores(paper_vectors: np.ndarray, category_vectors: np.ndarray) -> np.ndarray:
+
+    """
+    ・Score every paper against every category with a single matrix product.
+    ・Rows are papers and columns are categories; each entry is a cosine similarity.
     """
 
-    response = client.embeddings.create(input=[text], model=model)
-    embedding = response.data[0].embedding
-    return np.array(embedding)
+    return normalize_rows(paper_vectors) @ normalize_rows(category_vectors).T
 
 def calculate_text_similarity(embedding1: np.array, embedding2: np.array) -> float:
     
@@ -138,58 +349,39 @@ def calculate_text_similarity(embedding1: np.array, embedding2: np.array) -> flo
     
     return similarity
 
-def compute_category_similarity_matrix(category_names: List[str]) -> Dict[tuple[str, str], float]:
+def compute_category_similarity_matrix(category_names: List[str]) -> np.ndarray:
     
     """
     ・Compute pairwise similarities between all categories based on their text embeddings.
     ・This helps to understand the relationships and potential overlaps between categories, 
     ・which is useful for further refinement and ordering of categories.
+    ・Returns a dense (n, n) cosine similarity matrix whose rows and columns follow category_names.
     """
     
-    category_embedding_dict = {
-        category: get_text_embedding(category) 
-        for category in category_names
-    }
-    # {"Machine Learning": np.array([0.2, 0.4, ...]), "Data Science": np.array([0.1, 0.3, ...]), "Robotics": np.array([0.5, 0.7, ...])}
-    
-    # Compute pairwise similarities
-    similarity_matrix = {}
-    for i, cat1 in enumerate(category_names):
-        for cat2 in category_names[i+1:]:
-            similarity = calculate_text_similarity(
-                category_embedding_dict[cat1],
-                category_embedding_dict[cat2]
-            )
-            similarity_matrix[(cat1, cat2)] = similarity
-    
-    return similarity_matrix
-    #relations = {
-    #("Lab Automation", "DNA Sequencing"): 0.75,
-    #("Lab Automation", "Robotics"): 0.85,
-    #("DNA Sequencing", "Robotics"): 0.60
-    #}
-
-def order_categories(category_names: List[str]) -> List[str]:
+    return cosine_similarity_matrix(get_text_embeddings(category_names))
+    # array([[1.00, 0.75, 0.85],   # Lab Automation
+    #        [0.75, 1.00, 0.60],   # DNA Sequencing
+    #        [0.85, 0.60, 1.00]])  # Robotics
+
+def order_categories(category_names: List[str], method: str = "spanning_tree") -> List[str]:
+
+    """
+    ・Order categories so that related categories end up next to each other.
+    ・method is "spanning_tree" (breadth-first walk over a spanning tree of the similarity graph)
+    ・or "nearest_neighbor" (greedy tour that always moves to the most similar remaining category).
+    """
+
+    if method not in ORDERING_METHODS:
+        raise ValueError(f"Unknown ordering method: {method}. Choose from {list(ORDERING_METHODS)}.")
+
+    # Duplicate names would collapse into one heading anyway
+    category_names = list(dict.fromkeys(category_names))
+    if len(category_names) <= 1:
+        return category_names
+
     # Compute similarities between categories
-    category_similarities = compute_category_similarity_matrix(category_names)
-    
-    G = nx.Graph()
-    G.add_weighted_edges_from([
-        (cat1, cat2, 1 - weight)  
-        for (cat1, cat2), weight in category_similarities.items()
-    ])
-    
-    mst = nx.maximum_spanning_tree(G)
-    
-    start_node = max(mst.degree, key=lambda x: x[1])[0]
-    
-    # Perform a breadth-first search to order the categories
-    ordered_categories = list(nx.bfs_tree(mst, start_node))
-    
-    # Add any categories that weren't included in the MST
-    ordered_categories.extend([cat for cat in category_names if cat not in ordered_categories])
-    
-    return ordered_categories
+    similarity = compute_category_similarity_matrix(category_names)
+    return [category_names[i] for i in ORDERING_METHODS[method](similarity)]
 
 def find_best_category_for_paper(paper: Paper, category_vector_dict: Dict[str, np.array]) -> str:
 
@@ -218,43 +410,165 @@ def find_best_category_for_paper(paper: Paper, category_vector_dict: Dict[str, n
     best_matching_category = max(category_similarity_dict, key=category_similarity_dict.get)
     return best_matching_category
 
-def classify_papers_into_categories(papers: List[Paper], category_names: List[str]) -> Dict[str, List[Paper]]:
-    
+def classify_papers_with_scores(
+        papers: List[Paper],
+        category_names: List[str],
+) -> Tuple[Dict[str, List[Paper]], np.ndarray]:
+
     """
     ・Classify each paper into the most appropriate category based on embedding similarity.
-    ・The goal is to ensure that each category contains papers that are closely related in content.
+    ・Papers and categories are embedded in batches and scored in one matrix product.
+    ・The (papers x categories) score matrix is returned alongside the classification so callers can reuse it.
     """
-    
-    # Generate embeddings for all categories
-    category_embedding_dict = {
-        category: get_text_embedding(category) 
-        for category in category_names
-    }
-    
-    # Initialize the classification dictionary
-    classification_result = {category: [] for category in category_names}
-    
-    # Classify each paper
-    for paper in papers:
-        best_category = find_best_category_for_paper(paper, category_embedding_dict)
-        classification_result[best_category].append(paper)
-    
+
+    if not papers or not category_names:
+        return {}, np.zeros((len(papers), len(category_names)))
+
+    category_vectors = get_text_embeddings(category_names)
+    paper_vectors = get_text_embeddings(paper_texts(papers))
+    scores = compute_paper_category_scores(paper_vectors, category_vectors)
+
+    best_indices = np.argmax(scores, axis=1)
+    if isinstance(papers, PaperTable):
+        # Each category gets a view of the table's rows, so no paper is copied or converted
+        classification_result = {
+            category: papers.take(np.flatnonzero(best_indices == i)) for i, category in enumerate(category_names)
+        }
+    else:
+        # Initialize the classification dictionary
+        classification_result = {category: [] for category in category_names}
+        for paper, best_index in zip(papers, best_indices):
+            classification_result[category_names[best_index]].append(paper)
+
     # Remove any empty categories
     classification_result = {
         category: paper_list 
         for category, paper_list in classification_result.items() 
         if paper_list
     }
+
+    return classification_result, scores
+
+def classify_papers_into_categories(papers: List[Paper], category_names: List[str]) -> Dict[str, List[Paper]]:
+    
+    """
+    ・Classify each paper into the most appropriate category based on embedding similarity.
+    ・The goal is to ensure that each category contains papers that are closely related in content.
+    """
     
+    classification_result, _ = classify_papers_with_scores(papers, category_names)
     return classification_result
 
-def generate_headings(papers: list[Paper]) -> dict[str, list[Paper]]:
+def name_cluster(representative_papers: List[Paper]) -> str:
+
+    """
+    ・Ask the LLM for a category name that covers a cluster, given a few of its most representative papers.
+    ・Abstracts are truncated so the prompt stays small whatever the cluster size.
+    """
+
+    papers_data = [{"title": p.title, "abstract": (p.abstract or "")[:1000]} for p in representative_papers]
+
+    prompt = f"""
+    The following papers are the most representative members of a group of related research papers.
+    Provide one research category name that best describes the whole group.
+
+    The category should:
+    1. Be between 4-8 words long
+    2. Represent a research area or methodology shared by the papers
+    3. Use terminology that reflects common research areas recognized in the field
+
+    Answer with the category name only.
+
+    Papers:
+    {json.dumps(papers_data, indent=2)}
+
+    Category:
+    """
+
+    raw_output = cached_openai_chat(
+        get_client,
+        model=CATEGORY_MODEL,
+        messages=[
+            {"role": "system", "content": "You are an expert in categorizing scientific research papers."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.5,
+        max_tokens=50
+    ).strip()
+
+    return re.sub(r'^\d+\.\s*', '', raw_output.split("\n")[0].strip()).strip('"*')
+
+def generate_cluster_headings(
+        papers: List[Paper],
+        n_clusters: int | None = None,
+        ordering_method: str = "spanning_tree",
+        max_workers: int = CATEGORY_MAP_WORKERS,
+) -> Dict[str, List[Paper]]:
+
+    """
+    ・Embedding-clustering engine: embed every paper once, cluster the embeddings with spherical k-means,
+    ・and ask the LLM only to name each cluster from its most representative papers.
+    ・n_clusters=None picks the number of clusters by silhouette score.
+    ・Headings are ordered by the similarity of their cluster centroids, so no extra embeddings are needed.
+    """
+
+    if not papers:
+        return {}
+
+    paper_vectors = get_text_embeddings(paper_texts(papers))
+    if n_clusters is None:
+        n_clusters = choose_k(paper_vectors)
+    labels, centroids = kmeans(paper_vectors, n_clusters)
+    representatives = representative_indices(paper_vectors, labels, centroids, CLUSTER_REPRESENTATIVES)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        names = list(executor.map(name_cluster, [[papers[i] for i in members] for members in representatives]))
+
+    order = ORDERING_METHODS[ordering_method](centroids @ centroids.T)
+    rows_by_name = {}
+    for cluster in order:
+        rows = np.flatnonzero(labels == cluster)
+        if len(rows):
+            # Clusters that end up with the same name are merged under it
+            rows_by_name.setdefault(names[cluster], []).append(rows)
+    if isinstance(papers, PaperTable):
+        return {name: papers.take(np.concatenate(rows)) for name, rows in rows_by_name.items()}
+    return {name: [papers[i] for i in np.concatenate(rows)] for name, rows in rows_by_name.items()}
+
+def generate_headings(
+        papers: list[Paper],
+        mode: str = "auto",
+        max_prompt_tokens: int = CATEGORY_PROMPT_TOKEN_BUDGET,
+        engine: str = "llm",
+        n_clusters: int | None = None,
+) -> dict[str, list[Paper]]:
+
+    """
+    ・Generate headings for papers and classify the papers under them.
+    ・engine "llm" lets the LLM propose categories from the papers, "cluster" uses generate_cluster_headings.
+    ・For the llm engine, mode "single" puts every paper in one prompt, "map_reduce" proposes categories per chunk
+    ・of papers and merges them, and "auto" uses map_reduce only when the papers do not fit in max_prompt_tokens.
+    """
+
+    if engine == "cluster":
+        return generate_cluster_headings(papers, n_clusters)
+    if engine != "llm":
+        raise ValueError(f"Unknown engine: {engine}. Choose from 'llm' or 'cluster'.")
+    if mode not in ("auto", "single", "map_reduce"):
+        raise ValueError(f"Unknown mode: {mode}. Choose from 'auto', 'single' or 'map_reduce'.")
+    if mode == "auto":
+        total_tokens = sum(paper_prompt_tokens(paper) for paper in papers)
+        mode = "map_reduce" if total_tokens > max_prompt_tokens else "single"
+
     try:
 
-        # sample_papers_for_initial = systematic_sampling(papers, 3)
-        initial_categories = generate_initial_categories(papers)
-        # sample_papers_for_refined = systematic_sampling(papers, 4)
-        refined_categories = refine_categories(initial_categories, papers)
+        if mode == "map_reduce":
+            initial_categories = generate_categories_map_reduce(papers, max_prompt_tokens)
+            sample_papers_for_refined = sample_papers_within_budget(papers, max_prompt_tokens)
+        else:
+            initial_categories = generate_initial_categories(papers)
+            sample_papers_for_refined = papers
+        refined_categories = refine_categories(initial_categories, sample_papers_for_refined)
 
         ordered_categories = order_categories(refined_categories)
 
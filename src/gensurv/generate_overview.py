@@ -1,44 +1,56 @@
-from typing import Dict, List
+import asyncio
+from functools import cache
+from typing import Callable, Dict, List, TYPE_CHECKING
 
+from .llm_cache import cached_anthropic_message, cached_anthropic_message_async
 from .models import Paper, Author
 from .utils import format_bibtex
 
 import os
 
-import anthropic
+if TYPE_CHECKING:
+    import anthropic
 
+MODEL_NAME = "claude-3-5-sonnet-20240620"
+MAX_TOKENS = 2000
+# Number of sections generated at the same time
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+# The clients are created on first use: importing anthropic is slow, and runs served from the LLM cache
+# need no API key
+@cache
+def get_client() -> "anthropic.Anthropic":
+    import anthropic
+    return anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+
+
+def create_async_client() -> "anthropic.AsyncAnthropic":
+    # Not cached: the connection pool of an async client is bound to the event loop that first uses it, and each
+    # generate_overview call runs its own loop
+    import anthropic
+    return anthropic.AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
 
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
 
 # Type aliases
 ParagraphDict = Dict[str, str]
+ClientFactory = Callable[[], "anthropic.Anthropic"]
+AsyncClientFactory = Callable[[], "anthropic.AsyncAnthropic"]
+
+
+class OverviewGenerationError(Exception):
+    """
+    Raised when some sections could not be generated.
+    failures maps each failed section title to its exception and paragraphs holds the sections
+    that were generated, in heading order, so callers can keep them.
+    """
+
+    def __init__(self, failures: Dict[str, Exception], paragraphs: ParagraphDict):
+        self.failures = failures
+        self.paragraphs = paragraphs
+        details = "; ".join(f"{section_title}: {e!r}" for section_title, e in failures.items())
+        super().__init__(f"Failed to generate {len(failures)} section(s): {details}")
 
-# def count_citations_in_paragraph(paragraph: str, papers: List[Paper]) -> int:
-#     citation_count = 0
-#     for paper in papers:
-#         try:
-#             bibtex = paper.citation_styles.get("bibtex", "")
-#             if not bibtex:
-#                 print(f"❌ BibTeX missing for paper: {paper.title}")
-#                 continue
-#             # BibTeXのラベルを抽出
-#             bibtex_label = re.search(r'{(.+?),', bibtex)
-#             if bibtex_label:
-#                 citation_label = bibtex_label.group(1)
-#             else:
-#                 print(f"❌ Failed to extract BibTeX label for paper: {paper.title}")
-#                 continue
-#         except Exception as e:
-#             print(f"❌ Error parsing BibTeX for paper: {paper.title} - {e}")
-#             continue
-
-#         cite_pattern = re.compile(rf"\\cite{{[^}}]*\b{citation_label}\b[^}}]*}}")
-#         if cite_pattern.search(paragraph):
-#             citation_count += 1
-#         else:
-#             print(f"❌ Citation for {citation_label} not found in paragraph.")
-
-#     return citation_count
 
 def create_prompt(section_title: str, papers: List[Paper], title: str) -> str:
     prompt = f"""
@@ -57,9 +69,8 @@ def create_prompt(section_title: str, papers: List[Paper], title: str) -> str:
 
     for paper in papers:
         bibtex = paper.citation_styles["bibtex"]
-        bibtex_string = "\n".join(bibtex)
         prompt += f"abstract: {paper.abstract}\n"
-        prompt += f"bibtex: {bibtex_string}\n\n"
+        prompt += f"bibtex: {bibtex}\n\n"
    
     # for paper in papers:
     #     bibtex = paper.citation_styles.get("bibtex", "")
@@ -76,57 +87,119 @@ def create_prompt(section_title: str, papers: List[Paper], title: str) -> str:
     return prompt
 
 
-def generate_paragraph(client: anthropic.Anthropic, system_message: str, prompt: str, papers: List[Paper]) -> str:
-    try:
+def generate_paragraph(
+        client: "anthropic.Anthropic | ClientFactory",
+        system_message: str,
+        prompt: str,
+        papers: List[Paper],
+) -> str:
+    return cached_anthropic_message(
+        client,
+        model=MODEL_NAME,
+        max_tokens=MAX_TOKENS,
+        system=system_message,
+        messages=[
+            {"role": "user", "content": prompt}
+        ]
+    )
 
-        completion = client.messages.create(
-            
-            model="claude-3-5-sonnet-20240620",
-            max_tokens=2000,
-            system=system_message,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
-       
-        paragraph = completion.content[0].text
-       
-        # print(f"Generated paragraph:\n{paragraph}")
-        
-        # # Check if citations are included in the generated paragraph
-        # if '\\cite{' not in paragraph:
-        #     print("❌ No citations found in the generated paragraph.")
-        # else:
-        #     print("✔️ Citations found in the generated paragraph.")
-        
-        # # Check if the number of citations matches the number of papers
-        # citation_count = count_citations_in_paragraph(paragraph, papers)
-        # if citation_count != len(papers):
-        #     print(f"❌ Citation count mismatch: Expected {len(papers)}, but found {citation_count}.")
-        # else:
-        #     print(f"✔️ Citation count matches the number of papers: {citation_count}.")
-        
-        return paragraph
-
-
-    except Exception as e:
-        print(f"Error generating paragraph: {e}")
-        return ""
-
-def generate_overview(structured_papers: Dict[str, List[Paper]], title: str) -> ParagraphDict:
-    system_message = f"""
+
+async def generate_paragraph_async(
+        client: "anthropic.AsyncAnthropic | AsyncClientFactory",
+        system_message: str,
+        prompt: str,
+        papers: List[Paper],
+) -> str:
+    return await cached_anthropic_message_async(
+        client,
+        model=MODEL_NAME,
+        max_tokens=MAX_TOKENS,
+        system=system_message,
+        messages=[
+            {"role": "user", "content": prompt}
+        ]
+    )
+
+
+def create_system_message(title: str) -> str:
+    return f"""
         You are a expert researcher in the field of AI. 
         You are writing an academic review paper on the theme of {title}.
         You are tasked with generating a paragraph for the review paper.
     """
+
+
+async def generate_overview_async(
+        structured_papers: Dict[str, List[Paper]],
+        title: str,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> ParagraphDict:
+    """
+    Generate the paragraphs of all sections concurrently, at most max_concurrency at a time.
+    The sections share one async client, created on the first LLM cache miss and closed before returning.
+    :return: Paragraphs keyed by section title, in the order of structured_papers.
+    :raises OverviewGenerationError: If any section failed; the error carries the sections that succeeded.
+    """
+    system_message = create_system_message(title)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    client = None
+
+    def get_call_client() -> "anthropic.AsyncAnthropic":
+        nonlocal client
+        if client is None:
+            client = create_async_client()
+        return client
+
+    async def generate_section(section_title: str, papers: List[Paper]) -> str:
+        async with semaphore:
+            prompt = create_prompt(section_title, papers, title)
+            return await generate_paragraph_async(get_call_client, system_message, prompt, papers)
+
+    section_titles = list(structured_papers)
+    try:
+        results = await asyncio.gather(
+            *(generate_section(section_title, structured_papers[section_title]) for section_title in section_titles),
+            return_exceptions=True,
+        )
+    finally:
+        if client is not None:
+            await client.close()
+
     paragraphs = {}
+    failures = {}
+    for section_title, result in zip(section_titles, results):
+        if isinstance(result, Exception):
+            failures[section_title] = result
+        else:
+            paragraphs[section_title] = result
+    if failures:
+        raise OverviewGenerationError(failures, paragraphs)
+    return paragraphs
+
 
+def generate_overview(
+        structured_papers: Dict[str, List[Paper]],
+        title: str,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> ParagraphDict:
+    """
+    Generate a paragraph for each section. Sections are generated concurrently (see generate_overview_async);
+    with max_concurrency=1 they are generated one after another with the synchronous client.
+    """
+    if max_concurrency > 1:
+        return asyncio.run(generate_overview_async(structured_papers, title, max_concurrency))
+
+    system_message = create_system_message(title)
+    paragraphs = {}
+    failures = {}
     for section_title, papers in structured_papers.items():
-        # print(f"=================Generating paragraph for section '{section_title}'...==================")
         prompt = create_prompt(section_title, papers, title)
-        paragraph = generate_paragraph(client, system_message, prompt, papers)
-        paragraphs[section_title] = paragraph
-        # print("=" * 100)
+        try:
+            paragraphs[section_title] = generate_paragraph(get_client, system_message, prompt, papers)
+        except Exception as e:
+            failures[section_title] = e
+    if failures:
+        raise OverviewGenerationError(failures, paragraphs)
     return paragraphs
 
 def main():
@@ -186,7 +259,7 @@ def main():
     }
 
     title = "AI alignment"
-    paragraphs = generate_overview(client, structured_papers, title)
+    paragraphs = generate_overview(structured_papers, title)
     for section_title, paragraph in paragraphs.items():
         print(f"Section: {section_title}")
         print(f"Paragraph: {paragraph}")
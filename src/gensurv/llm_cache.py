@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+from .tracing import get_tracer, span
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "gensurv" / "llm_responses.sqlite3"
+# read_write: serve hits and record misses; replay: serve hits and fail on misses; off: always call the API
+CACHE_MODES = ("read_write", "replay", "off")
+
+
+class LLMCacheMiss(Exception):
+    pass
+
+
+def make_cache_key(provider: str, model: str, temperature: float | None, messages: list[dict], **params) -> str:
+    """
+    Build a content-addressed key from everything that determines a response: the provider, the model,
+    the temperature, a hash of the messages (including any system prompt) and the remaining request parameters.
+    """
+    messages_hash = hashlib.sha256(
+        json.dumps(messages, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    key_data = {
+        "provider": provider,
+        "model": model,
+        "temperature": temperature,
+        "messages": messages_hash,
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    A local store of LLM responses keyed by make_cache_key, backed by a single SQLite file.
+    """
+
+    def __init__(self, path: Path, mode: str = "read_write"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode}. Choose from {CACHE_MODES}.")
+        self.path = Path(path)
+        self.mode = mode
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, provider TEXT, model TEXT, response TEXT NOT NULL, created_at REAL)"
+        )
+
+    def get(self, key: str) -> str | None:
+        if self.mode == "off":
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None and self.mode == "replay":
+            raise LLMCacheMiss(f"No recorded response for key {key} (cache: {self.path}).")
+        return row[0] if row is not None else None
+
+    def put(self, key: str, provider: str, model: str, response: str) -> None:
+        if self.mode != "read_write":
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, response, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, provider, model, response, time.time()),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+_llm_cache = None
+_llm_cache_configured = False
+
+
+def configure_llm_cache(path: Path | None, mode: str = "read_write") -> LLMCache | None:
+    """
+    Set the process-wide LLM response cache. Pass None as path (or mode="off") to disable caching.
+    """
+    global _llm_cache, _llm_cache_configured
+    _llm_cache = LLMCache(path, mode) if path is not None and mode != "off" else None
+    _llm_cache_configured = True
+    return _llm_cache
+
+
+def get_llm_cache() -> LLMCache | None:
+    """
+    Return the process-wide LLM response cache, configuring it from the environment on first use.
+    GENSURV_LLM_CACHE_PATH sets the SQLite file (an empty value disables the cache) and
+    GENSURV_LLM_CACHE_MODE one of CACHE_MODES.
+    """
+    if not _llm_cache_configured:
+        path = os.environ.get("GENSURV_LLM_CACHE_PATH", str(DEFAULT_CACHE_PATH))
+        mode = os.environ.get("GENSURV_LLM_CACHE_MODE", "read_write")
+        configure_llm_cache(Path(path).expanduser() if path else None, mode)
+    return _llm_cache
+
+
+def _lookup(provider: str, params: dict) -> tuple[LLMCache | None, str | None, str | None]:
+    cache = get_llm_cache()
+    if cache is None:
+        return None, None, None
+    messages = params.get("messages", [])
+    if "system" in params:
+        messages = [{"role": "system", "content": params["system"]}] + list(messages)
+    other_params = {k: v for k, v in params.items() if k not in ("model", "temperature", "messages", "system")}
+    key = make_cache_key(provider, params["model"], params.get("temperature"), messages, **other_params)
+    return cache, key, cache.get(key)
+
+
+def _resolve(client):
+    # SDK clients are not callable, so a callable is a client factory
+    return client() if callable(client) else client
+
+
+def cached_openai_chat(client, **params) -> str:
+    """
+    Call client.chat.completions.create(**params) through the LLM cache.
+    client may also be a function returning the client, called only on a cache miss, so that responses can be
+    replayed without an API key.
+    :return: The content of the first choice.
+    """
+    cache, key, response = _lookup("openai", params)
+    if response is not None:
+        get_tracer().increment("llm_cache.hits")
+        return response
+    with span("openai.chat.completions", "llm", model=params["model"]) as span_args:
+        completion = _resolve(client).chat.completions.create(**params)
+        if completion.usage is not None:
+            span_args.update(input_tokens=completion.usage.prompt_tokens, output_tokens=completion.usage.completion_tokens)
+    response = completion.choices[0].message.content
+    if cache is not None:
+        cache.put(key, "openai", params["model"], response)
+    return response
+
+
+def cached_anthropic_message(client, **params) -> str:
+    """
+    Call client.messages.create(**params) through the LLM cache. As in cached_openai_chat, client may be a
+    function returning the client.
+    :return: The text of the first content block.
+    """
+    cache, key, response = _lookup("anthropic", params)
+    if response is not None:
+        get_tracer().increment("llm_cache.hits")
+        return response
+    with span("anthropic.messages", "llm", model=params["model"]) as span_args:
+        completion = _resolve(client).messages.create(**params)
+        span_args.update(input_tokens=completion.usage.input_tokens, output_tokens=completion.usage.output_tokens)
+    response = completion.content[0].text
+    if cache is not None:
+        cache.put(key, "anthropic", params["model"], response)
+    return response
+
+
+async def cached_anthropic_message_async(client, **params) -> str:
+    """
+    Async variant of cached_anthropic_message for anthropic.AsyncAnthropic clients.
+    """
+    cache, key, response = _lookup("anthropic", params)
+    if response is not None:
+        get_tracer().increment("llm_cache.hits")
+        return response
+    with span("anthropic.messages", "llm", model=params["model"]) as span_args:
+        completion = await _resolve(client).messages.create(**params)
+        span_args.update(input_tokens=completion.usage.input_tokens, output_tokens=completion.usage.output_tokens)
+    response = completion.content[0].text
+    if cache is not None:
+        cache.put(key, "anthropic", params["model"], response)
+    return response
@@ -1,2 +1,3 @@
 from .paper import Paper
 from .author import Author
+from .paper_table import PaperTable
@@ -0,0 +1,355 @@
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+import numpy as np
+
+from .author import Author
+from .paper import Paper
+
+# Stored in the year column for papers without a year
+MISSING_YEAR = 0
+# Stored in the author ID codes for authors without an ID
+MISSING_CODE = -1
+
+
+class _StringPool:
+    """
+    Interns repeated strings (venues, author names and IDs): each distinct string is stored once and rows refer
+    to it by an integer code.
+    """
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: str | None) -> int:
+        if value is None:
+            return MISSING_CODE
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def value(self, code: int) -> str | None:
+        return None if code == MISSING_CODE else self.values[code]
+
+
+class _Columns:
+    """
+    The columns of a PaperTable. They are never modified once built, so tables can share them.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.titles: List[str] = []
+        self.abstracts: List[str | None] = []
+        self.venues = _StringPool()
+        self.venue_codes: List[int] = []
+        self.years: List[int] = []
+        self.has_authors: List[bool] = []
+        # The authors of row i are at author_offsets[i]:author_offsets[i + 1] of the author code columns
+        self.author_offsets: List[int] = [0]
+        self.author_names = _StringPool()
+        self.author_name_codes: List[int] = []
+        self.author_ids = _StringPool()
+        self.author_id_codes: List[int] = []
+        self.citation_styles: List[Dict[str, str] | None] = []
+
+    def append(
+            self,
+            id: str,
+            title: str,
+            abstract: str | None,
+            venue: str | None,
+            year: int | None,
+            authors: Iterable[tuple[str | None, str]] | None,
+            citation_styles: Dict[str, str] | None,
+    ) -> None:
+        self.ids.append(id)
+        self.titles.append(title)
+        self.abstracts.append(abstract)
+        self.venue_codes.append(self.venues.code(venue))
+        self.years.append(MISSING_YEAR if year is None else year)
+        self.has_authors.append(authors is not None)
+        for author_id, name in authors or ():
+            self.author_id_codes.append(self.author_ids.code(author_id))
+            self.author_name_codes.append(self.author_names.code(name))
+        self.author_offsets.append(len(self.author_name_codes))
+        self.citation_styles.append(citation_styles)
+
+    def freeze(self) -> "_Columns":
+        # Numeric columns become compact arrays once every row has been appended
+        self.venue_codes = np.array(self.venue_codes, dtype=np.int32)
+        self.years = np.array(self.years, dtype=np.int32)
+        self.has_authors = np.array(self.has_authors, dtype=bool)
+        self.author_offsets = np.array(self.author_offsets, dtype=np.int64)
+        self.author_name_codes = np.array(self.author_name_codes, dtype=np.int32)
+        self.author_id_codes = np.array(self.author_id_codes, dtype=np.int32)
+        return self
+
+
+class PaperTable(Sequence):
+    """
+    A columnar collection of papers for large corpora. Titles and abstracts are kept as plain strings, venues and
+    author names/IDs are interned, years are an integer array and the authors of all papers are stored flat with
+    per-paper offsets, so a table takes a fraction of the memory of the equivalent Paper objects.
+    A table is a Sequence of Paper and can be passed wherever a list of papers is expected: Paper objects are only
+    created, without validation, when an item is read.
+    Indexing with a slice, or take() with row indices, returns a view sharing the columns, which is how papers are
+    grouped by heading without copying them.
+    """
+
+    def __init__(self, columns: _Columns, rows: np.ndarray | None = None):
+        self._columns = columns
+        # Rows of the columns in this table, in order; None means all of them
+        self._rows = rows
+
+    @classmethod
+    def from_papers(cls, papers: Iterable[Paper]) -> "PaperTable":
+        if isinstance(papers, PaperTable):
+            return papers
+        columns = _Columns()
+        for paper in papers:
+            columns.append(
+                paper.id, paper.title, paper.abstract, paper.venue, paper.year,
+                None if paper.authors is None else [(author.id, author.name) for author in paper.authors],
+                paper.citation_styles,
+            )
+        return cls(columns.freeze())
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "PaperTable":
+        """
+        Build a table from dicts in the format of Paper.dict(), e.g. a papers checkpoint or to_records().
+        The records are trusted, which is what makes loading fast; build Paper objects and use from_papers
+        to validate untrusted data.
+        """
+        columns = _Columns()
+        for record in records:
+            authors = record.get("authors")
+            columns.append(
+                record["id"], record["title"], record.get("abstract"), record.get("venue"), record.get("year"),
+                None if authors is None else [(author.get("id"), author["name"]) for author in authors],
+                record.get("citation_styles"),
+            )
+        return cls(columns.freeze())
+
+    def __len__(self) -> int:
+        return len(self._columns.ids) if self._rows is None else len(self._rows)
+
+    def _row(self, index: int) -> int:
+        return index if self._rows is None else int(self._rows[index])
+
+    def row_indices(self) -> np.ndarray:
+        """
+        The rows of the underlying columns that this table (or view) holds.
+        """
+        return np.arange(len(self._columns.ids)) if self._rows is None else self._rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(self.row_indices()[index], relative=False)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("PaperTable index out of range")
+        return self._paper(self._row(index))
+
+    def __iter__(self) -> Iterator[Paper]:
+        for row in (range(len(self._columns.ids)) if self._rows is None else self._rows.tolist()):
+            yield self._paper(row)
+
+    def _paper(self, row: int) -> Paper:
+        columns = self._columns
+        authors = None
+        if columns.has_authors[row]:
+            start, end = columns.author_offsets[row], columns.author_offsets[row + 1]
+            authors = [
+                Author.model_construct(id=columns.author_ids.value(id_code), name=columns.author_names.values[name_code])
+                for id_code, name_code in zip(columns.author_id_codes[start:end].tolist(),
+                                              columns.author_name_codes[start:end].tolist())
+            ]
+        year = int(columns.years[row])
+        return Paper.model_construct(
+            id=columns.ids[row],
+            title=columns.titles[row],
+            abstract=columns.abstracts[row],
+            venue=columns.venues.value(int(columns.venue_codes[row])),
+            year=None if year == MISSING_YEAR else year,
+            authors=authors,
+            citation_styles=columns.citation_styles[row],
+        )
+
+    def take(self, indices: Iterable[int], relative: bool = True) -> "PaperTable":
+        """
+        A view of the given papers that shares this table's columns.
+        :param indices: Positions in this table (or rows of the underlying columns if relative is False).
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if relative and self._rows is not None:
+            indices = self._rows[indices]
+        return PaperTable(self._columns, indices)
+
+    def to_papers(self) -> List[Paper]:
+        return list(self)
+
+    # Column accessors, which read the fields of many papers without creating Paper objects
+
+    @property
+    def ids(self) -> List[str]:
+        return self._select(self._columns.ids)
+
+    @property
+    def titles(self) -> List[str]:
+        return self._select(self._columns.titles)
+
+    @property
+    def abstracts(self) -> List[str | None]:
+        return self._select(self._columns.abstracts)
+
+    @property
+    def years(self) -> np.ndarray:
+        """
+        Years as integers, MISSING_YEAR where unknown.
+        """
+        return self._columns.years if self._rows is None else self._columns.years[self._rows]
+
+    def _select(self, column: List[Any]) -> List[Any]:
+        return list(column) if self._rows is None else [column[row] for row in self._rows.tolist()]
+
+    # Serialization
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """
+        The papers as dicts in the format of Paper.dict().
+        """
+        columns = self._columns
+        records = []
+        for row in self.row_indices().tolist():
+            authors = None
+            if columns.has_authors[row]:
+                start, end = columns.author_offsets[row], columns.author_offsets[row + 1]
+                authors = [
+                    {"id": columns.author_ids.value(id_code), "name": columns.author_names.values[name_code]}
+                    for id_code, name_code in zip(columns.author_id_codes[start:end].tolist(),
+                                                  columns.author_name_codes[start:end].tolist())
+                ]
+            year = int(columns.years[row])
+            records.append({
+                "id": columns.ids[row],
+                "title": columns.titles[row],
+                "abstract": columns.abstracts[row],
+                "venue": columns.venues.value(int(columns.venue_codes[row])),
+                "year": None if year == MISSING_YEAR else year,
+                "authors": authors,
+                "citation_styles": columns.citation_styles[row],
+            })
+        return records
+
+    def to_json(self) -> bytes:
+        """
+        The papers as a JSON array (the format of papers checkpoints), serialized with orjson.
+        """
+        import orjson
+        return orjson.dumps(self.to_records())
+
+    @classmethod
+    def from_json(cls, data: bytes | str) -> "PaperTable":
+        import orjson
+        return cls.from_records(orjson.loads(data))
+
+    def write_parquet(self, path: Path) -> None:
+        """
+        Write the papers to a Parquet file. Columns are converted directly, without going through Paper objects:
+        authors are a list<struct<id, name>> column built from the author offsets, and venues are
+        dictionary-encoded as they are in the table.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = self._columns
+        rows = self.row_indices()
+        # Gather the authors of the selected rows into new flat arrays with their own offsets
+        starts, ends = columns.author_offsets[rows], columns.author_offsets[rows + 1]
+        counts = ends - starts
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        author_rows = (np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])).astype(np.int64)
+        author_ids = [columns.author_ids.value(code) for code in columns.author_id_codes[author_rows].tolist()]
+        author_names = [columns.author_names.values[code] for code in columns.author_name_codes[author_rows].tolist()]
+        authors = pa.ListArray.from_arrays(
+            pa.array(offsets, type=pa.int32()),
+            pa.StructArray.from_arrays([pa.array(author_ids, pa.string()), pa.array(author_names, pa.string())],
+                                       names=["id", "name"]),
+            mask=pa.array(~columns.has_authors[rows]),
+        )
+        years = columns.years[rows]
+        venue_codes = columns.venue_codes[rows]
+        table = pa.table({
+            "id": pa.array(self.ids, pa.string()),
+            "title": pa.array(self.titles, pa.string()),
+            "abstract": pa.array(self.abstracts, pa.string()),
+            "venue": pa.DictionaryArray.from_arrays(
+                pa.array(venue_codes, mask=venue_codes == MISSING_CODE),
+                pa.array(columns.venues.values or [""], pa.string()),
+            ),
+            "year": pa.array(years, mask=years == MISSING_YEAR),
+            "authors": authors,
+            "citation_styles": pa.array(
+                [None if styles is None else list(styles.items()) for styles in self._select(columns.citation_styles)],
+                pa.map_(pa.string(), pa.string()),
+            ),
+        })
+        pq.write_table(table, Path(path))
+
+    @classmethod
+    def read_parquet(cls, path: Path) -> "PaperTable":
+        """
+        Read papers written by write_parquet (or any Parquet file with the same columns).
+        """
+        import pyarrow.parquet as pq
+        return cls.from_arrow(pq.read_table(Path(path)))
+
+    @classmethod
+    def from_arrow(cls, table) -> "PaperTable":
+        """
+        Build a table from a pyarrow Table with the columns of Paper; authors is a list of {id, name} structs
+        and citation_styles a map of strings. The authors are read from their flat child arrays and offsets.
+        """
+        table = table.combine_chunks()
+        n_rows = table.num_rows
+
+        def column(name: str) -> List[Any]:
+            return table.column(name).to_pylist() if name in table.column_names else [None] * n_rows
+
+        columns = _Columns()
+        columns.ids, columns.titles, columns.abstracts = column("id"), column("title"), column("abstract")
+        venues = table.column("venue") if "venue" in table.column_names else None
+        if venues is not None and venues.num_chunks and hasattr(venues.type, "index_type"):
+            # Dictionary-encoded venues (as written by write_parquet) keep their codes, mapped onto the pool
+            venues = venues.chunk(0)
+            pool_codes = [columns.venues.code(venue) for venue in venues.dictionary.to_pylist()] + [MISSING_CODE]
+            codes = np.asarray(pool_codes, dtype=np.int32)[venues.indices.fill_null(len(pool_codes) - 1).to_numpy()]
+            columns.venue_codes = codes
+        else:
+            columns.venue_codes = [columns.venues.code(venue) for venue in column("venue")]
+        columns.years = [MISSING_YEAR if year is None else year for year in column("year")]
+        columns.citation_styles = [
+            None if styles is None else dict(styles) for styles in column("citation_styles")
+        ]
+        if "authors" in table.column_names and table.column("authors").num_chunks:
+            authors = table.column("authors").chunk(0)
+            # Offsets index the whole child array, which may extend beyond the rows of a sliced array
+            columns.author_offsets = authors.offsets.to_numpy()
+            columns.has_authors = authors.is_valid().to_numpy(zero_copy_only=False)
+            columns.author_id_codes = [columns.author_ids.code(id) for id in authors.values.field("id").to_pylist()]
+            columns.author_name_codes = [
+                columns.author_names.code(name) for name in authors.values.field("name").to_pylist()
+            ]
+        else:
+            columns.author_offsets = [0] * (n_rows + 1)
+            columns.has_authors = [False] * n_rows
+        return cls(columns.freeze())
+
+    def __repr__(self) -> str:
+        return f"PaperTable({len(self)} papers)"
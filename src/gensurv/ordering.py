@@ -0,0 +1,100 @@
+from collections import deque
+from typing import Callable, Dict, List
+
+import numpy as np
+
+
+def cosine_similarity_matrix(vectors: np.ndarray) -> np.ndarray:
+    """
+    Compute the dense (n, n) cosine similarity matrix of the rows of vectors.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    normalized = vectors / norms
+    return normalized @ normalized.T
+
+
+def spanning_tree_order(similarity: np.ndarray) -> List[int]:
+    """
+    Order items by a breadth-first walk over a spanning tree of the similarity graph.
+    The tree is built with Kruskal's algorithm, taking edges by descending 1 - similarity with ties broken
+    by (i, j) order, and the walk starts from the first item of highest degree. This reproduces the order
+    of the former networkx implementation (maximum_spanning_tree over 1 - similarity, then bfs_tree).
+    :param similarity: A symmetric (n, n) similarity matrix.
+    :return: Item indices in walk order.
+    """
+    n = similarity.shape[0]
+    if n <= 1:
+        return list(range(n))
+
+    rows, cols = np.triu_indices(n, k=1)
+    weights = 1 - similarity[rows, cols]
+    edge_order = np.argsort(-weights, kind="stable")
+
+    parent = list(range(n))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Neighbours are appended in the order edges join the tree, which fixes the BFS visiting order
+    adjacency = [[] for _ in range(n)]
+    accepted = 0
+    for edge in edge_order:
+        i, j = int(rows[edge]), int(cols[edge])
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j:
+            continue
+        parent[root_j] = root_i
+        adjacency[i].append(j)
+        adjacency[j].append(i)
+        accepted += 1
+        if accepted == n - 1:
+            break
+
+    start = int(np.argmax([len(neighbours) for neighbours in adjacency]))
+    order = [start]
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    queue = deque([start])
+    while queue:
+        for neighbour in adjacency[queue.popleft()]:
+            if not visited[neighbour]:
+                visited[neighbour] = True
+                order.append(neighbour)
+                queue.append(neighbour)
+    return order
+
+
+def nearest_neighbor_order(similarity: np.ndarray, start: int | None = None) -> List[int]:
+    """
+    Order items as a greedy nearest-neighbour tour (a TSP-style heuristic): starting from one item,
+    repeatedly move to the most similar item not yet visited, so that adjacent items are closely related.
+    :param similarity: A symmetric (n, n) similarity matrix.
+    :param start: Index of the first item. Defaults to the item most similar to all others.
+    :return: Item indices in tour order.
+    """
+    n = similarity.shape[0]
+    if n <= 1:
+        return list(range(n))
+
+    if start is None:
+        start = int(np.argmax(similarity.sum(axis=1) - np.diag(similarity)))
+    order = [start]
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    current = start
+    for _ in range(n - 1):
+        candidates = np.where(visited, -np.inf, similarity[current])
+        current = int(np.argmax(candidates))
+        visited[current] = True
+        order.append(current)
+    return order
+
+
+ORDERING_METHODS: Dict[str, Callable[[np.ndarray], List[int]]] = {
+    "spanning_tree": spanning_tree_order,
+    "nearest_neighbor": nearest_neighbor_order,
+}
@@ -0,0 +1,183 @@
+from datetime import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+import time
+from typing import Any, Callable, Dict, List, TypeVar
+
+from .models import Paper, PaperTable
+from .tracing import profile_stage, span
+
+T = TypeVar("T")
+
+STAGES = ["query", "papers", "headings", "overview", "draft"]
+MANIFEST_FILENAME = "pipeline_manifest.json"
+CHECKPOINT_DIRNAME = "checkpoints"
+PROFILE_DIRNAME = "profile"
+
+
+def fingerprint(inputs: Any) -> str:
+    """
+    Hash the inputs of a stage. inputs must be JSON-serializable; key order does not matter.
+    """
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(path: Path | str | None, chunk_size: int = 1 << 20) -> str | None:
+    """
+    Hash the contents of an input file, so that a stage reading it reruns when the file is edited.
+    :return: None if path is None.
+    """
+    if path is None:
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PipelineRun:
+    """
+    Tracks the stages of one run in output_dir so that an interrupted or modified run can be resumed.
+    Each completed stage is recorded in pipeline_manifest.json with the fingerprint of its inputs and the path
+    of its checkpoint. A stage whose fingerprint matches its record is loaded from the checkpoint instead of run.
+    Stages from from_stage onwards are always rerun.
+    Every stage is traced; with profile=True the stages that run are also profiled into output_dir / "profile".
+    """
+
+    def __init__(self, output_dir: Path, from_stage: str | None = None, profile: bool = False):
+        if from_stage is not None and from_stage not in STAGES:
+            raise ValueError(f"Unknown stage: {from_stage}. Choose from {STAGES}.")
+        self.output_dir = Path(output_dir)
+        self.checkpoint_dir = self.output_dir / CHECKPOINT_DIRNAME
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.output_dir / MANIFEST_FILENAME
+        self.from_stage = from_stage
+        self.profile_dir = self.output_dir / PROFILE_DIRNAME if profile else None
+        self.manifest = {"settings": {}, "stages": {}}
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """
+        Run settings (e.g. the command line arguments) saved with the manifest, for resuming a run.
+        """
+        return self.manifest["settings"]
+
+    def save_settings(self, settings: Dict[str, Any]) -> None:
+        self.manifest["settings"] = settings
+        self._write_manifest()
+
+    def _write_manifest(self) -> None:
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=4, default=str)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _forced(self, stage: str) -> bool:
+        return self.from_stage is not None and STAGES.index(stage) >= STAGES.index(self.from_stage)
+
+    def is_fresh(self, stage: str, stage_fingerprint: str) -> bool:
+        record = self.manifest["stages"].get(stage)
+        return (
+            not self._forced(stage)
+            and record is not None
+            and record["fingerprint"] == stage_fingerprint
+            and Path(record["checkpoint"]).exists()
+        )
+
+    def run_stage(
+            self,
+            stage: str,
+            inputs: Dict[str, Any],
+            compute: Callable[[], T],
+            save: Callable[[T, Path], None],
+            load: Callable[[Path], T],
+    ) -> T:
+        """
+        Run a stage, or reuse its checkpoint if it was already completed with the same inputs.
+        :param stage: One of STAGES.
+        :param inputs: Everything the stage output depends on, including upstream outputs (e.g. paper IDs).
+        :param compute: Produces the stage output.
+        :param save: Writes the output to the given checkpoint path.
+        :param load: Reads the output back from the checkpoint path.
+        :return: The stage output.
+        """
+        stage_fingerprint = fingerprint(inputs)
+        checkpoint = self.checkpoint_dir / f"{stage}.json"
+        if self.is_fresh(stage, stage_fingerprint):
+            print(f"Reusing {stage} from {checkpoint}")
+            with span(stage, "stage", reused=True):
+                return load(checkpoint)
+
+        start = time.perf_counter()
+        with span(stage, "stage", reused=False):
+            if self.profile_dir is not None:
+                with profile_stage(self.profile_dir, stage):
+                    result = compute()
+            else:
+                result = compute()
+            save(result, checkpoint)
+        self.manifest["stages"][stage] = {
+            "fingerprint": stage_fingerprint,
+            "checkpoint": str(checkpoint),
+            "completed_at": datetime.now().isoformat(),
+            "seconds": time.perf_counter() - start,
+        }
+        self._write_manifest()
+        return result
+
+
+def save_json(obj: Any, path: Path) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_json(path: Path) -> Any:
+    with open(path) as f:
+        return json.load(f)
+
+
+def paper_records(papers: List[Paper]) -> List[Dict[str, Any]]:
+    # A PaperTable serializes from its columns without creating Paper objects
+    return papers.to_records() if isinstance(papers, PaperTable) else [paper.dict() for paper in papers]
+
+
+def save_papers(papers: List[Paper], path: Path) -> None:
+    save_json(paper_records(papers), path)
+
+
+def load_papers_checkpoint(path: Path) -> List[Paper]:
+    return [Paper.parse_obj(paper) for paper in load_json(path)]
+
+
+def save_structured_papers(structured_papers: Dict[str, List[Paper]], path: Path) -> None:
+    save_json({heading: paper_records(papers) for heading, papers in structured_papers.items()}, path)
+
+
+def load_structured_papers_checkpoint(path: Path) -> Dict[str, List[Paper]]:
+    return {heading: [Paper.parse_obj(paper) for paper in papers] for heading, papers in load_json(path).items()}
+
+
+def write_papers_summary(papers: List[Paper], output_dir: Path) -> None:
+    with open(output_dir / "papers.json", "w") as f:
+        papers_json = [
+            {"title": p.title, "authors": [a.name for a in p.authors or []], "venue": p.venue, "year": p.year}
+            for p in papers
+        ]
+        json.dump(papers_json, f, indent=4)
+
+
+def write_structured_papers_summary(structured_papers: Dict[str, List[Paper]], output_dir: Path) -> None:
+    with open(output_dir / "structured_papers.json", "w") as f:
+        structured_papers_json = {
+            heading: [paper.title for paper in papers]
+            for heading, papers in structured_papers.items()
+        }
+        json.dump(structured_papers_json, f, indent=4)
@@ -0,0 +1,145 @@
+import re
+from typing import Dict, List, Tuple
+
+from .bibliography import Bibliography
+from .models import Paper
+
+LATEX_SPECIAL_CHARACTERS = {
+    "\\": r"\textbackslash{}",
+    "&": r"\&",
+    "%": r"\%",
+    "$": r"\$",
+    "#": r"\#",
+    "_": r"\_",
+    "{": r"\{",
+    "}": r"\}",
+    "~": r"\textasciitilde{}",
+    "^": r"\textasciicircum{}",
+}
+LATEX_SPECIAL_PATTERN = re.compile("|".join(re.escape(character) for character in LATEX_SPECIAL_CHARACTERS))
+# LaTeX the overview model writes on purpose: commands such as \cite{a, b} or \textit{...}, escaped characters and \\
+LATEX_COMMAND_PATTERN = re.compile(r"\\(?:[a-zA-Z]+\*?(?:\[[^\]]*\])?(?:\{[^{}]*\})*|[&%$#_{}~^\\ ])")
+TITLE_PLACEHOLDER = r"\title{TITLE HERE}"
+
+SECTION_PATTERN = re.compile(r"\\section\*?\{((?:[^{}]|\{[^{}]*\})*)\}")
+BACK_MATTER_PATTERN = re.compile(r"\\bibliographystyle|\\bibliography\{|\\end\{document\}")
+# A section body runs until the next section or the back matter of the document
+SECTION_END_PATTERN = re.compile(r"\\section\*?\{|" + BACK_MATTER_PATTERN.pattern)
+FILECONTENTS_PATTERN = re.compile(r"(\\begin\{filecontents\*?\}\{references\.bib\}\n?)(.*?)(\\end\{filecontents\*?\})", re.DOTALL)
+
+
+def escape_latex(text: str) -> str:
+    """
+    Escape every LaTeX special character in plain text, e.g. a title or a section heading.
+    """
+    return LATEX_SPECIAL_PATTERN.sub(lambda match: LATEX_SPECIAL_CHARACTERS[match.group(0)], text)
+
+
+def escape_latex_paragraph(paragraph: str) -> str:
+    """
+    Escape the special characters of a generated paragraph while keeping the LaTeX commands it contains,
+    most importantly \\cite{...}.
+    """
+    escaped = []
+    position = 0
+    for match in LATEX_COMMAND_PATTERN.finditer(paragraph):
+        escaped.append(escape_latex(paragraph[position:match.start()]))
+        escaped.append(match.group(0))
+        position = match.end()
+    escaped.append(escape_latex(paragraph[position:]))
+    return "".join(escaped)
+
+
+def render_title(latex: str, title: str) -> str:
+    return latex.replace(TITLE_PLACEHOLDER, f"\\title{{{escape_latex(title)}}}")
+
+
+def _normalize_title(title: str) -> str:
+    # Compare titles regardless of LaTeX escaping (e.g. "R\&D" vs "R&D") and spacing
+    return " ".join(title.replace("\\", "").split()).lower()
+
+
+def patch_latex_sections(latex: str, sections: Dict[str, str]) -> str:
+    """
+    Replace the body of each \\section{title} in latex with the given paragraph.
+    Sections that are not in the document yet are inserted before the bibliography.
+    Titles and paragraphs are inserted as they are, so escape them first.
+    :param latex: Contents of a .tex file.
+    :param sections: New paragraphs keyed by section title.
+    :return: The patched contents.
+    """
+    remaining = {_normalize_title(title): (title, paragraph) for title, paragraph in sections.items()}
+    patched = []
+    position = 0
+    for match in SECTION_PATTERN.finditer(latex):
+        key = _normalize_title(match.group(1))
+        if key not in remaining or match.start() < position:
+            continue
+        _, paragraph = remaining.pop(key)
+        end_match = SECTION_END_PATTERN.search(latex, match.end())
+        body_end = end_match.start() if end_match else len(latex)
+        patched.append(latex[position:match.end()])
+        patched.append(f"\n{paragraph}\n\n")
+        position = body_end
+    patched.append(latex[position:])
+    latex = "".join(patched)
+
+    if remaining:
+        new_sections = "".join(f"\\section{{{title}}}\n{paragraph}\n\n" for title, paragraph in remaining.values())
+        end_match = BACK_MATTER_PATTERN.search(latex, max(latex.find("\\begin{document}"), 0))
+        insert_at = end_match.start() if end_match else len(latex)
+        latex = latex[:insert_at] + new_sections + latex[insert_at:]
+    return latex
+
+
+def read_bibliography(latex: str) -> Bibliography:
+    """
+    Parse the entries of the references.bib filecontents block of latex.
+    """
+    match = FILECONTENTS_PATTERN.search(latex)
+    return Bibliography.parse(match.group(2)) if match else Bibliography()
+
+
+def replace_bibliography(latex: str, bibliography: Bibliography) -> str:
+    """
+    Replace the contents of the references.bib filecontents block of latex with the bibliography.
+    """
+    return FILECONTENTS_PATTERN.sub(lambda match: match.group(1) + bibliography.to_bibtex() + match.group(3), latex, count=1)
+
+
+def add_bibtex_entries(latex: str, papers: List[Paper]) -> Tuple[str, Bibliography]:
+    """
+    Add the BibTeX entries of papers to the references.bib filecontents block of latex, skipping papers that
+    are already there under any citation key.
+    :return: The updated contents and the resulting bibliography.
+    """
+    bibliography = read_bibliography(latex)
+    bibliography.add_papers(papers)
+    return replace_bibliography(latex, bibliography), bibliography
+
+
+def render_sections(latex: str, overview: Dict[str, str], bibliography: Bibliography | None = None) -> str:
+    """
+    Write the overview into latex, one section per heading, escaping headings and paragraphs.
+    If a bibliography is given, citations of duplicate entries are rewritten to the keys it keeps.
+    """
+    if bibliography is not None:
+        overview = {section_title: bibliography.canonicalize_citations(paragraph) for section_title, paragraph in overview.items()}
+    return patch_latex_sections(
+        latex,
+        {escape_latex(section_title): escape_latex_paragraph(paragraph) for section_title, paragraph in overview.items()}
+    )
+
+
+def render_draft(template: str, title: str, overview: Dict[str, str], papers: List[Paper]) -> Tuple[str, Bibliography]:
+    """
+    Fill the LaTeX template with the title, the BibTeX entries of papers and one section per overview heading.
+    :param template: Contents of template.tex.
+    :param title: Title of the survey.
+    :param overview: Paragraphs keyed by section title, in document order.
+    :param papers: Papers cited by the overview.
+    :return: The rendered .tex contents and its bibliography.
+    """
+    latex = render_title(template, title)
+    latex, bibliography = add_bibtex_entries(latex, papers)
+    return render_sections(latex, overview, bibliography), bibliography
@@ -1,11 +1,29 @@
 from pathlib import Path
+import threading
+from typing import Dict, Iterator
+
 from dotenv import load_dotenv
 
-from .retrievers.semantic_scholar import SemanticScholarRetriever
+from .retrievers.semantic_scholar import SearchCursor, SemanticScholarRetriever
 from .models import Paper
 
 load_dotenv()
 
+_retrievers: Dict[Path, SemanticScholarRetriever] = {}
+_retrievers_lock = threading.Lock()
+
+
+def get_retriever(output_dir: Path) -> SemanticScholarRetriever:
+    """
+    The process-wide retriever for output_dir, so that callers in the same process (e.g. batch jobs or app
+    sessions) share its paper store, HTTP session and rate limiter.
+    """
+    key = Path(output_dir).resolve()
+    with _retrievers_lock:
+        if key not in _retrievers:
+            _retrievers[key] = SemanticScholarRetriever(output_dir=output_dir)
+        return _retrievers[key]
+
 
 def retrieve_papers(query: str, max_papers: int, output_dir: Path) -> list[Paper]:
     """
@@ -14,6 +32,24 @@ def retrieve_papers(query: str, max_papers: int, output_dir: Path) -> list[Paper
     :param output_dir: A directory to save the retrieved papers.
     :return:
     """
-    retriever = SemanticScholarRetriever(output_dir=output_dir, load_max_docs=max_papers)
-    papers = retriever.retrieve(query)
+    retriever = get_retriever(output_dir)
+    papers = list(retriever.iter_papers(query, max_papers=max_papers))
     return papers
+
+
+def stream_papers(
+        query: str,
+        max_papers: int | None,
+        output_dir: Path,
+        cursor: SearchCursor | None = None,
+) -> Iterator[Paper]:
+    """
+    Like retrieve_papers, but yields papers page by page as they are retrieved.
+    :param query: A query to retrieve papers.
+    :param max_papers: Maximum number of papers to retrieve. None retrieves all results.
+    :param output_dir: A directory to save the retrieved papers.
+    :param cursor: A cursor saved from a previous search to resume from. It is updated in place.
+    :return:
+    """
+    retriever = get_retriever(output_dir)
+    yield from retriever.iter_papers(query, cursor=cursor, max_papers=max_papers)
@@ -0,0 +1,111 @@
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Iterable
+
+from ..models import Paper
+
+# Stay well below SQLite's limit on the number of bound parameters per statement
+QUERY_CHUNK_SIZE = 500
+
+
+class PaperStore:
+    """
+    A single-file paper cache backed by SQLite, with the paper ID as primary key.
+    A lookup is one indexed read and a bulk lookup one query per QUERY_CHUNK_SIZE IDs.
+    Writes are transactional and the database runs in WAL mode, so several processes can share the file.
+    The meta table holds key-value state about the store itself, such as completed migrations.
+    """
+
+    def __init__(self, path: Path, timeout: float = 30.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS papers (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def get(self, paper_id: str) -> Paper | None:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM papers WHERE id = ?", (paper_id,)).fetchone()
+        return Paper.parse_raw(row[0]) if row is not None else None
+
+    def get_many(self, paper_ids: list[str]) -> dict[str, Paper]:
+        """
+        :return: The stored papers among paper_ids, keyed by ID. Missing IDs are omitted.
+        """
+        rows = []
+        with self._lock:
+            for start in range(0, len(paper_ids), QUERY_CHUNK_SIZE):
+                chunk = paper_ids[start:start + QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows += self._conn.execute(f"SELECT id, data FROM papers WHERE id IN ({placeholders})", chunk).fetchall()
+        return {paper_id: Paper.parse_raw(data) for paper_id, data in rows}
+
+    def put(self, paper: Paper) -> None:
+        self.put_many([paper])
+
+    def put_many(self, papers: Iterable[Paper], replace: bool = True) -> None:
+        """
+        :param replace: Whether to overwrite papers that are already stored; otherwise they are kept.
+        """
+        rows = [(paper.id, paper.json()) for paper in papers]
+        if not rows:
+            return
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers wait instead of failing mid-way
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO papers (id, data) VALUES (?, ?)", rows
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def get_meta(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def __contains__(self, paper_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM papers WHERE id = ?", (paper_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def import_json_dir(store: PaperStore, json_dir: Path, batch_size: int = 1000) -> int:
+    """
+    Import a directory of per-paper JSON files ({paper_id}.json), the former cache layout, into store.
+    Papers already in the store are kept, and files that cannot be read as a paper are skipped with a warning.
+    :return: The number of imported papers.
+    """
+    imported = 0
+    batch = []
+    for path in Path(json_dir).glob("*.json"):
+        try:
+            with open(path) as f:
+                batch.append(Paper.parse_raw(f.read()))
+        except (OSError, ValueError) as e:
+            print(f"Warning: skipping {path}, which is not a valid paper: {e}")
+            continue
+        if len(batch) >= batch_size:
+            store.put_many(batch, replace=False)
+            imported += len(batch)
+            batch = []
+    store.put_many(batch, replace=False)
+    return imported + len(batch)
@@ -1,68 +1,213 @@
 from dotenv import load_dotenv
 import os
 from pathlib import Path
+import re
 import time
+from typing import Iterator
 
-import backoff
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PrivateAttr
 import requests
 
 from ..models import Paper, Author
+from ..tracing import get_tracer, span
+from .paper_store import PaperStore, import_json_dir
+from .transport import TokenBucket, get_rate_limiter, get_session, parse_retry_after
 
 load_dotenv()
 
+PAPER_FIELDS = "title,abstract,authors,venue,year,citationStyles"
+# The /paper/batch endpoint accepts at most 500 IDs per request
+BATCH_MAX_IDS = 500
+PAPER_STORE_FILENAME = "papers.sqlite3"
+# Key of the paper store's meta table recording that the JSON cache of output_dir was imported
+JSON_IMPORT_META_KEY = "json_cache_imported"
+# The /paper/search endpoint returns at most 100 results per page
+SEARCH_PAGE_SIZE = 100
+# The rate granted to a standard API key; override with SEMANTIC_SCHOLAR_REQUESTS_PER_SECOND
+DEFAULT_REQUESTS_PER_SECOND = 1.0
+
 
 class SemanticScholarError(Exception):
     pass
 
 
+class SearchCursor(BaseModel):
+    """
+    Position in the results of a search. iter_papers advances it as papers are yielded,
+    so it can be saved (e.g. with .json()) and passed back to resume the search later.
+    """
+    query: str
+    offset: int = 0
+    exhausted: bool = False
+
+
 class SemanticScholarRetriever(BaseModel):
     output_dir: Path
-    api_key: str = os.environ.get("SEMANTIC_SCHOLAR_API_KEY")
-    if api_key is None:
-        raise SemanticScholarError("API key is required.")
-    base_url: str = "https://api.semanticscholar.org/graph/v1"
+    # Read from the environment when a retriever is created, not when this module is imported
+    api_key: str | None = Field(default_factory=lambda: os.environ.get("SEMANTIC_SCHOLAR_API_KEY"))
+    base_url: str = Field(
+        default_factory=lambda: os.environ.get("SEMANTIC_SCHOLAR_BASE_URL", "https://api.semanticscholar.org/graph/v1")
+    )
     load_max_docs: int = 10
-    sleep_time: int = 3
+    # Requests per second allowed by the API key; shared by every retriever using the same key
+    requests_per_second: float = Field(
+        default_factory=lambda: float(os.environ.get("SEMANTIC_SCHOLAR_REQUESTS_PER_SECOND", DEFAULT_REQUESTS_PER_SECOND))
+    )
+    max_retries: int = 5
+    timeout: float = 30.0
+    _rate_limiter: TokenBucket = PrivateAttr()
+    _store: PaperStore = PrivateAttr()
 
     def __init__(self, **data):
         super().__init__(**data)
+        if self.api_key is None:
+            raise SemanticScholarError("API key is required.")
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._store = PaperStore(self.output_dir / PAPER_STORE_FILENAME)
+        if self._store.get_meta(JSON_IMPORT_META_KEY) is None:
+            # One-shot migration of the former one-JSON-per-paper cache, recorded once it has completed
+            imported = import_json_dir(self._store, self.output_dir)
+            self._store.set_meta(JSON_IMPORT_META_KEY, str(imported))
+        self._rate_limiter = get_rate_limiter(self.api_key, self.requests_per_second)
+
+    @property
+    def stats(self) -> dict:
+        """
+        Counters of the requests sent with this retriever's API key: requests_sent, throttle_wait_seconds and retries.
+        """
+        return self._rate_limiter.stats.as_dict()
 
     def retrieve(
             self,
             query: str,
     ) -> list[Paper]:
-        res = self.search_papers(query)
-        self._sleep()
-        if not res.get("data"):
-            return []
-        paper_ids = [paper["paperId"] for paper in res["data"]]
-        papers = [self.retrieve_paper(paper_id) for paper_id in paper_ids]
-        return papers
-
-    def search_papers(self, query: str) -> dict:
-        url = f"{self.base_url}/paper/search"
-        params = {"query": query, "limit": self.load_max_docs}
-        headers = {"x-api-key": self.api_key}
-        response = requests.get(url, params=params, headers=headers)
-        return self.check_response_status(response)
+        return list(self.iter_papers(query, max_papers=self.load_max_docs))
 
-    @backoff.on_exception(backoff.expo, SemanticScholarError, max_tries=5)
-    def retrieve_paper(self, paper_id: str, fields: str = "title,abstract,authors,venue,year,citationStyles") -> Paper:
-        if (self.output_dir / f"{paper_id}.json").exists():
-            with open(self.output_dir / f"{paper_id}.json") as f:
-                return Paper.parse_raw(f.read())
+    def iter_papers(
+            self,
+            query: str | None = None,
+            cursor: SearchCursor | None = None,
+            max_papers: int | None = None,
+    ) -> Iterator[Paper]:
+        """
+        Search papers page by page and yield each paper as soon as its page has been fetched.
+        :param query: A query to search papers. Not needed when resuming from a cursor.
+        :param cursor: A cursor to resume from. It is updated in place as papers are yielded.
+        :param max_papers: Maximum number of papers to yield. None walks through all results.
+        """
+        if cursor is None:
+            if query is None:
+                raise ValueError("Either query or cursor is required.")
+            cursor = SearchCursor(query=query)
 
-        url = f"{self.base_url}/paper/{paper_id}"
-        params = {"fields": fields}
+        yielded = 0
+        while not cursor.exhausted and (max_papers is None or yielded < max_papers):
+            limit = SEARCH_PAGE_SIZE if max_papers is None else min(SEARCH_PAGE_SIZE, max_papers - yielded)
+            page_offset = cursor.offset
+            res = self.search_papers(cursor.query, offset=page_offset, limit=limit)
+            paper_ids = [paper["paperId"] for paper in res.get("data") or []]
+            if "next" not in res or not paper_ids:
+                cursor.exhausted = True
+
+            papers = self.retrieve_papers_bulk(paper_ids)
+            for i, paper_id in enumerate(paper_ids):
+                # Advance before yielding so that a cursor saved by the consumer points past this paper
+                cursor.offset = page_offset + i + 1
+                if paper_id not in papers:
+                    continue
+                yield papers[paper_id]
+                yielded += 1
+                if max_papers is not None and yielded >= max_papers:
+                    return
+
+    def search_papers(self, query: str, offset: int = 0, limit: int | None = None) -> dict:
+        """
+        Fetch a single page of search results.
+        :return: The raw response, with "data" (paper IDs), "offset", "total" and, if there are more results, "next".
+        """
+        limit = min(limit or self.load_max_docs, SEARCH_PAGE_SIZE)
+        params = {"query": query, "offset": offset, "limit": limit}
+        return self._request("GET", "/paper/search", params=params)
+
+    def retrieve_paper(self, paper_id: str, fields: str = PAPER_FIELDS) -> Paper:
+        paper = self._store.get(paper_id)
+        if paper is not None:
+            return paper
+
+        response_dict = self._request("GET", f"/paper/{paper_id}", params={"fields": fields})
+        paper = self._parse_paper(paper_id, response_dict)
+        self._store.put(paper)
+        return paper
+
+    def retrieve_papers_bulk(self, paper_ids: list[str], fields: str = PAPER_FIELDS) -> dict[str, Paper]:
+        """
+        Retrieve many papers at once: cached papers are read locally and the rest are fetched
+        through the /paper/batch endpoint, up to BATCH_MAX_IDS per request.
+        :param paper_ids: IDs of the papers to retrieve. Duplicates are fetched once.
+        :param fields: Fields to request from the API.
+        :return: Papers keyed by the requested ID, in the order of paper_ids. IDs unknown to the API are omitted.
+        """
+        paper_ids = list(dict.fromkeys(paper_ids))
+        cached = self._store.get_many(paper_ids)
+        papers = {paper_id: cached.get(paper_id) for paper_id in paper_ids}
+        missing_ids = [paper_id for paper_id, paper in papers.items() if paper is None]
+
+        for start in range(0, len(missing_ids), BATCH_MAX_IDS):
+            chunk = missing_ids[start:start + BATCH_MAX_IDS]
+            # The endpoint answers with one entry per requested ID, null for unknown IDs
+            fetched = [
+                self._parse_paper(paper_id, response_dict)
+                for paper_id, response_dict in zip(chunk, self._fetch_paper_batch(chunk, fields))
+                if response_dict is not None
+            ]
+            self._store.put_many(fetched)
+            papers.update({paper.id: paper for paper in fetched})
+
+        return {paper_id: paper for paper_id, paper in papers.items() if paper is not None}
+
+    def _fetch_paper_batch(self, paper_ids: list[str], fields: str) -> list[dict | None]:
+        return self._request("POST", "/paper/batch", params={"fields": fields}, json={"ids": paper_ids})
+
+    def _request(self, method: str, path: str, **kwargs):
+        """
+        Send a request once the shared rate limiter allows it, retrying rate-limited (429), server (5xx)
+        and connection errors. A 429 holds back every retriever sharing the API key for the Retry-After
+        period (or an exponential backoff when the header is missing).
+        """
+        url = f"{self.base_url}{path}"
         headers = {"x-api-key": self.api_key}
-        response = requests.get(url, params=params, headers=headers)
-        response_dict = self.check_response_status(response)
+        # Paper IDs are left out of span names so that all single-paper requests share one latency histogram
+        span_name = f"s2.{method} {re.sub(r'/paper/(?!search$|batch$)[^/]+', '/paper/{id}', path)}"
+        for attempt in range(self.max_retries + 1):
+            self._rate_limiter.acquire()
+            try:
+                with span(span_name, "http", attempt=attempt) as span_args:
+                    response = get_session().request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+                    span_args["status"] = response.status_code
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error, delay = SemanticScholarError(f"Request failed: {e}"), 2 ** attempt
+            else:
+                if response.status_code != 429 and response.status_code < 500:
+                    return self.check_response_status(response)
+                error = SemanticScholarError(f"Request failed with status code {response.status_code}: {response.text}")
+                delay = parse_retry_after(response.headers.get("Retry-After"))
+                if delay is None:
+                    delay = 2 ** attempt
+                if response.status_code == 429:
+                    self._rate_limiter.pause_for(delay)
+                    delay = 0
+            if attempt == self.max_retries:
+                raise error
+            self._rate_limiter.stats.record_retry()
+            get_tracer().record_retry(span_name)
+            time.sleep(delay)
+
+    @staticmethod
+    def _parse_paper(paper_id: str, response_dict: dict) -> Paper:
         authors = [
-            Author(id=author.get("authorId", None), name=author["name"]) for author in response_dict.get("authors", [])
+            Author(id=author.get("authorId", None), name=author["name"]) for author in response_dict.get("authors") or []
         ]
-        paper = Paper(
+        return Paper(
             id=paper_id,
             title=response_dict.get("title", ""),
             abstract=response_dict.get("abstract", ""),
@@ -71,14 +216,6 @@ class SemanticScholarRetriever(BaseModel):
             authors=authors,
             citation_styles=response_dict.get("citationStyles", ""),
         )
-        with open(self.output_dir / f"{paper_id}.json", "w") as f:
-            f.write(paper.json())
-
-        return paper
-
-    def _sleep(self):
-        time.sleep(self.sleep_time)
-        return
 
     @staticmethod
     def check_response_status(response) -> dict:
@@ -0,0 +1,136 @@
+from email.utils import parsedate_to_datetime
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_MAXSIZE = 16
+
+
+class RequestStats:
+    """
+    Counters of the requests sent through a rate limiter. Safe to update from several threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.throttle_wait_seconds = 0.0
+        self.retries = 0
+
+    def record_request(self, waited: float) -> None:
+        with self._lock:
+            self.requests_sent += 1
+            self.throttle_wait_seconds += waited
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "requests_sent": self.requests_sent,
+                "throttle_wait_seconds": self.throttle_wait_seconds,
+                "retries": self.retries,
+            }
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that lets through `rate` requests per second, with bursts of up to `capacity`.
+    Callers reserve a token and sleep until it is theirs, so concurrent callers are spread out evenly.
+    pause_until() stops the flow for everyone, e.g. when the server answers with Retry-After.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive.")
+        self.rate = rate
+        self.capacity = capacity
+        self.stats = RequestStats()
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        # Time from which tokens accumulate; lies in the future while the bucket is paused
+        self._updated = time.monotonic()
+
+    def acquire(self) -> float:
+        """
+        Block until a request may be sent.
+        :return: The number of seconds spent waiting.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now > self._updated:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            self._tokens -= 1
+            wait = (self._updated - now) + max(0.0, -self._tokens) / self.rate
+        if wait > 0:
+            time.sleep(wait)
+        self.stats.record_request(wait)
+        return wait
+
+    def pause_until(self, deadline: float) -> None:
+        """
+        Hold back every request until the time.monotonic() deadline.
+        """
+        with self._lock:
+            if deadline > self._updated:
+                self._tokens = min(self._tokens, 0.0)
+                self._updated = deadline
+
+    def pause_for(self, seconds: float) -> None:
+        self.pause_until(time.monotonic() + seconds)
+
+
+_rate_limiters: dict[str, TokenBucket] = {}
+_rate_limiters_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_rate_limiter(key: str, rate: float) -> TokenBucket:
+    """
+    Return the process-wide rate limiter for key (e.g. an API key), creating it on first use.
+    The quota belongs to the key rather than to a client object, so every client using the same key shares it.
+    The most recently requested rate wins.
+    """
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = TokenBucket(rate)
+        limiter = _rate_limiters[key]
+        limiter.rate = rate
+        return limiter
+
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide HTTP session, which keeps connections alive and pools them across threads.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parse a Retry-After header, given either in seconds or as an HTTP date.
+    :return: The number of seconds to wait, or None if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
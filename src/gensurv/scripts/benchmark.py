@@ -0,0 +1,90 @@
+# This script benchmarks every stage of the pipeline offline: the OpenAI, Anthropic and Semantic Scholar APIs
+# are replaced by a local fake server with configurable latency, and the corpora are the test datasets or
+# synthetic corpora of 1k/10k/100k papers. Pass --baseline to fail on regressions against earlier results.
+
+import argparse
+from datetime import datetime
+import json
+from pathlib import Path
+import sys
+
+from ..benchmark.corpus import DATASETS, SYNTHETIC_SIZES, load_corpus
+from ..benchmark.fake_api import DEFAULT_EMBEDDING_DIM
+from ..benchmark.runner import DEFAULT_LATENCIES, STAGES, compare_with_baseline, run_corpus
+
+DEFAULT_CORPORA = ["manual_by_ono", "auto_from_filemaker", "1k", "10k"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpora", nargs="+", choices=list(DATASETS) + list(SYNTHETIC_SIZES), default=DEFAULT_CORPORA,
+                        help=f"Corpora to benchmark (default: {' '.join(DEFAULT_CORPORA)})")
+    parser.add_argument("--openai_latency_ms", type=float, default=DEFAULT_LATENCIES["openai"] * 1000)
+    parser.add_argument("--anthropic_latency_ms", type=float, default=DEFAULT_LATENCIES["anthropic"] * 1000)
+    parser.add_argument("--s2_latency_ms", type=float, default=DEFAULT_LATENCIES["s2"] * 1000)
+    parser.add_argument("--embedding_dim", type=int, default=DEFAULT_EMBEDDING_DIM,
+                        help="Dimension of the fake embeddings (text-embedding-3-large has 3072)")
+    parser.add_argument("--embedding_provider", type=str, default="openai",
+                        help="'openai' embeds through the fake server; e.g. 'local' benchmarks the in-process provider")
+    parser.add_argument("--no_memory", action="store_true", help="Do not trace peak memory, which slows the stages")
+    parser.add_argument("--output_path", type=Path, default=Path("benchmark_results.json"))
+    parser.add_argument("--baseline_path", type=Path, help="Results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative increase of wall time and peak memory over the baseline")
+    return parser.parse_args()
+
+
+def print_stages(corpus: str, stages: dict) -> None:
+    print(f"\n{corpus}")
+    print(f"  {'stage':<15}{'seconds':>10}{'items/s':>12}{'peak MB':>10}  calls")
+    for stage in STAGES:
+        result = stages[stage]
+        calls = ", ".join(f"{endpoint}={count}" for endpoint, count in sorted(result["calls"].items()))
+        throughput = f"{result['items_per_second']:.1f}" if result["items_per_second"] else "-"
+        memory = f"{result['peak_memory_mb']:.1f}" if "peak_memory_mb" in result else "-"
+        print(f"  {stage:<15}{result['seconds']:>10.3f}{throughput:>12}{memory:>10}  {calls}")
+
+
+def main():
+    args = parse_args()
+    latencies = {
+        "openai": args.openai_latency_ms / 1000,
+        "anthropic": args.anthropic_latency_ms / 1000,
+        "s2": args.s2_latency_ms / 1000,
+    }
+    # Read before running: the results may be written over the baseline (as with the default --output_path)
+    baseline = None
+    if args.baseline_path is not None:
+        with open(args.baseline_path) as f:
+            baseline = json.load(f)
+
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "settings": {"latencies": latencies, "embedding_dim": args.embedding_dim,
+                     "embedding_provider": args.embedding_provider, "embedding_cache": "cold_per_stage"},
+        "corpora": {},
+    }
+    for corpus in args.corpora:
+        papers = load_corpus(corpus)
+        stages = run_corpus(papers, latencies, args.embedding_dim, measure_memory=not args.no_memory,
+                            embedding_provider=args.embedding_provider)
+        results["corpora"][corpus] = stages
+        print_stages(f"{corpus} ({len(papers)} papers)", stages)
+
+    with open(args.output_path, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"\nResults written to {args.output_path}")
+
+    if baseline is not None:
+        if baseline.get("settings") != results["settings"]:
+            print("Warning: the baseline was run with different settings; timings are not comparable")
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
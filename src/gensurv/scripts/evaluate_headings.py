@@ -3,22 +3,40 @@
 
 import argparse
 import json
+import os
 from pathlib import Path
 from typing import List, Dict
 import numpy as np
-import os
-from openai import OpenAI
 
+from dotenv import load_dotenv
+
+from ..embedding_cache import configure_embedding_cache
+from ..embeddings import configure_embedding_provider
 from ..generate_headings import generate_headings
+from ..llm_cache import CACHE_MODES, DEFAULT_CACHE_PATH, configure_llm_cache
 from ..models import Paper
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 def parse_args():
     parser = argparse.ArgumentParser()
     # if you want to try dataset from filemaker, need to implement create_dataset.py first
     parser.add_argument("--input_data_path", type=Path, required=True)
     parser.add_argument("--eval_data_path", type=Path, required=True)
+    parser.add_argument("--engine", choices=["llm", "cluster"], default="llm",
+                        help="Heading engine: LLM category proposal or embedding clustering")
+    parser.add_argument("--n_clusters", type=int, help="Number of clusters for the cluster engine (default: automatic)")
+    parser.add_argument("--embedding_provider", type=str,
+                        help="'openai', 'openai:<model>', 'local' or 'local:<fitted model .npz>' "
+                             "(default: $GENSURV_EMBEDDING_PROVIDER or openai)")
+    parser.add_argument("--embedding_cache_dir", type=Path,
+                        help="Directory of the embedding cache reused across evaluation runs "
+                             "(default: $GENSURV_EMBEDDING_CACHE_DIR or ~/.cache/gensurv/embeddings)")
+    parser.add_argument("--no_embedding_cache", action="store_true", help="Always request fresh embeddings")
+    parser.add_argument("--llm_cache_path", type=Path,
+                        help="SQLite file of recorded LLM responses "
+                             "(default: $GENSURV_LLM_CACHE_PATH or ~/.cache/gensurv/llm_responses.sqlite3)")
+    parser.add_argument("--llm_cache_mode", choices=CACHE_MODES,
+                        help="'replay' runs offline from recorded responses and fails on any unrecorded prompt "
+                             "(default: $GENSURV_LLM_CACHE_MODE or read_write)")
     return parser.parse_args()
 
 def load_input_papers(input_data_path: Path) -> List[Paper]:
@@ -147,14 +165,28 @@ def compare_paper_counts(generated_headings: Dict[str, List[Paper]], eval_headin
         print("Mismatch detected in the number of papers between generated and evaluated headings.")
 
 def main():
+    load_dotenv()
     args = parse_args()
+    # Caches not set on the command line are configured from the environment on first use
+    if args.no_embedding_cache:
+        configure_embedding_cache(None)
+    elif args.embedding_cache_dir is not None:
+        configure_embedding_cache(args.embedding_cache_dir)
+    if args.llm_cache_path is not None or args.llm_cache_mode is not None:
+        # A flag given alone keeps the other setting from the environment
+        configure_llm_cache(
+            args.llm_cache_path or Path(os.environ.get("GENSURV_LLM_CACHE_PATH") or DEFAULT_CACHE_PATH).expanduser(),
+            args.llm_cache_mode or os.environ.get("GENSURV_LLM_CACHE_MODE", "read_write"),
+        )
+    if args.embedding_provider is not None:
+        configure_embedding_provider(args.embedding_provider)
     
     print("loading papers...")
     input_papers = load_input_papers(args.input_data_path)
     eval_headings = load_eval_headings(args.eval_data_path)
 
     print("Generating headings...")
-    structured_papers = generate_headings(input_papers)
+    structured_papers = generate_headings(input_papers, engine=args.engine, n_clusters=args.n_clusters)
     # {
     #     "Single-cell isolation techniques": [
     #         Paper(
@@ -0,0 +1,34 @@
+# This script fits a local embedding model (hashed TF-IDF features projected by SVD) on a corpus of papers,
+# for use with --embedding_provider local:<output_path> (or GENSURV_EMBEDDING_PROVIDER) without any API calls.
+
+import argparse
+from pathlib import Path
+import time
+
+from ..embeddings import LOCAL_EMBEDDING_DIM, LocalEmbeddingProvider
+from ..generate_headings import paper_to_text
+from .evaluate_headings import load_input_papers
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_data_path", type=Path, required=True,
+                        help="JSON list of papers, in the format of headings_input_data.json")
+    parser.add_argument("--output_path", type=Path, required=True, help="Where to save the model (.npz)")
+    parser.add_argument("--dim", type=int, default=LOCAL_EMBEDDING_DIM,
+                        help=f"Dimension of the embeddings (default: {LOCAL_EMBEDDING_DIM})")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    papers = load_input_papers(args.input_data_path)
+    start = time.perf_counter()
+    provider = LocalEmbeddingProvider.fit([paper_to_text(paper) for paper in papers], args.dim)
+    provider.save(args.output_path)
+    print(f"Fitted a {provider.dim}-dimensional model on {len(papers)} papers in {time.perf_counter() - start:.1f}s; "
+          f"saved to {args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
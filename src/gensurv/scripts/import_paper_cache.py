@@ -0,0 +1,28 @@
+# This script migrates a directory of per-paper JSON files ({paper_id}.json), the former Semantic Scholar cache layout,
+# into the single-file paper store used by SemanticScholarRetriever.
+
+import argparse
+from pathlib import Path
+
+from ..retrievers.paper_store import PaperStore, import_json_dir
+from ..retrievers.semantic_scholar import PAPER_STORE_FILENAME
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json_dir", type=Path, required=True, help="Directory containing {paper_id}.json files")
+    parser.add_argument("--store_path", type=Path, help=f"Paper store to import into (default: <json_dir>/{PAPER_STORE_FILENAME})")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store_path = args.store_path or args.json_dir / PAPER_STORE_FILENAME
+    store = PaperStore(store_path)
+    imported = import_json_dir(store, args.json_dir)
+    print(f"Imported {imported} papers into {store_path} (total: {len(store)})")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
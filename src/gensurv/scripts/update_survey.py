@@ -0,0 +1,58 @@
+# This script adds papers to a finished run of main.py without regenerating it: the new papers are classified
+# into the existing headings and only the sections that changed are regenerated and patched in the draft.
+
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from ..pipeline import MANIFEST_FILENAME, load_json
+from ..update_survey import update_survey
+from ..utils import load_papers
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run_dir", type=Path, required=True, help="Output directory of a previous run")
+    parser.add_argument("--papers_path", type=Path,
+                        help="Papers to add, in any format of main.py --papers_path (JSON list, JSON Lines, "
+                             "FileMaker export or Parquet)")
+    parser.add_argument("--paper_ids", type=str, nargs="+", help="Semantic Scholar IDs of papers to add")
+    parser.add_argument("--title", type=str, help="Title of the survey (default: the title of the run)")
+    return parser.parse_args()
+
+
+def retriever_dir(run_dir: Path) -> Path:
+    """
+    The Semantic Scholar directory the run retrieved into: output_path / "semantic_scholar", with the output_path
+    saved in the run's manifest, since batch runs are not directly under it. A relative output_path was relative
+    to the directory main.py ran from; such runs are directly under it.
+    """
+    output_path = load_json(run_dir / MANIFEST_FILENAME)["settings"].get("output_path")
+    if output_path is None or not Path(output_path).is_absolute():
+        return run_dir.parent / "semantic_scholar"
+    return Path(output_path) / "semantic_scholar"
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+    new_papers = []
+    if args.papers_path is not None:
+        new_papers += load_papers(args.papers_path)
+    if args.paper_ids:
+        from ..retrieve_papers import get_retriever
+        retriever = get_retriever(retriever_dir(args.run_dir))
+        new_papers += list(retriever.retrieve_papers_bulk(args.paper_ids).values())
+    if not new_papers:
+        raise SystemExit("No papers to add; pass --papers_path or --paper_ids.")
+
+    changed_headings = update_survey(args.run_dir, new_papers, title=args.title)
+    if changed_headings:
+        print(f"Regenerated {len(changed_headings)} section(s): {', '.join(changed_headings)}")
+    else:
+        print("All papers are already in the survey; nothing to update.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import asyncio
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import cProfile
+import json
+import os
+from pathlib import Path
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+TRACE_FILENAME = "trace.json"
+METRICS_FILENAME = "metrics.json"
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf")]
+# Span arguments that are summed per span name in the metrics summary
+TOKEN_ARGS = ("input_tokens", "output_tokens")
+PROFILE_TOP_ALLOCATIONS = 30
+
+
+def _current_tid() -> int:
+    # Concurrent asyncio tasks share a thread; give each its own row in the trace viewer
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+class Tracer:
+    """
+    Records spans (pipeline stages and outbound calls) as Chrome trace events, together with per-name latency,
+    token usage, retry and error counts. Safe to use from several threads and asyncio tasks.
+    write() saves the events as trace.json (open it in chrome://tracing or https://ui.perfetto.dev) and the
+    metrics as metrics.json.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._origin = time.perf_counter()
+            self._events: List[Dict[str, Any]] = []
+            self._durations: Dict[str, List[float]] = defaultdict(list)
+            self._categories: Dict[str, str] = {}
+            self._tokens: Dict[str, Counter] = defaultdict(Counter)
+            self._errors: Counter = Counter()
+            self._retries: Counter = Counter()
+            self._counters: Counter = Counter()
+
+    @contextmanager
+    def span(self, name: str, category: str, **args) -> Iterator[Dict[str, Any]]:
+        """
+        Time the block as one span. The yielded dict holds the span arguments; add to it inside the block,
+        e.g. the input_tokens and output_tokens of an API response.
+        """
+        span_args = dict(args)
+        start = time.perf_counter()
+        try:
+            yield span_args
+        except BaseException as e:
+            span_args["error"] = repr(e)
+            raise
+        finally:
+            self._record(name, category, start, time.perf_counter(), span_args)
+
+    def _record(self, name: str, category: str, start: float, end: float, args: Dict[str, Any]) -> None:
+        event = {
+            "name": name, "cat": category, "ph": "X", "pid": os.getpid(), "tid": _current_tid(),
+            "ts": (start - self._origin) * 1e6, "dur": (end - start) * 1e6, "args": args,
+        }
+        with self._lock:
+            self._events.append(event)
+            self._durations[name].append(end - start)
+            self._categories[name] = category
+            for token_arg in TOKEN_ARGS:
+                if args.get(token_arg):
+                    self._tokens[name][token_arg] += args[token_arg]
+            if "error" in args:
+                self._errors[name] += 1
+
+    def record_retry(self, name: str) -> None:
+        with self._lock:
+            self._retries[name] += 1
+
+    def increment(self, counter: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += value
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Summary per span name: call count, latency percentiles and histogram, token usage, retries and errors.
+        """
+        with self._lock:
+            spans = {}
+            for name, durations in self._durations.items():
+                milliseconds = np.array(durations) * 1000
+                counts = np.histogram(milliseconds, bins=[0] + LATENCY_BUCKETS_MS)[0]
+                spans[name] = {
+                    "category": self._categories[name],
+                    "calls": len(durations),
+                    "errors": self._errors[name],
+                    "retries": self._retries[name],
+                    "total_seconds": float(milliseconds.sum() / 1000),
+                    "mean_ms": float(milliseconds.mean()),
+                    "p50_ms": float(np.percentile(milliseconds, 50)),
+                    "p90_ms": float(np.percentile(milliseconds, 90)),
+                    "p99_ms": float(np.percentile(milliseconds, 99)),
+                    "max_ms": float(milliseconds.max()),
+                    "histogram_ms": {f"<={bound:g}": int(count) for bound, count in zip(LATENCY_BUCKETS_MS, counts)},
+                    **{token_arg: self._tokens[name][token_arg] for token_arg in TOKEN_ARGS if self._tokens[name][token_arg]},
+                }
+            return {"spans": spans, "counters": dict(self._counters)}
+
+    def write(self, output_dir: Path) -> None:
+        output_dir = Path(output_dir)
+        with self._lock:
+            events = list(self._events)
+        with open(output_dir / TRACE_FILENAME, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+        with open(output_dir / METRICS_FILENAME, "w") as f:
+            json.dump(self.metrics(), f, indent=4)
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """
+    The process-wide tracer every instrumented call records into.
+    """
+    return _tracer
+
+
+def span(name: str, category: str, **args):
+    return _tracer.span(name, category, **args)
+
+
+@contextmanager
+def profile_stage(profile_dir: Path, stage: str) -> Iterator[None]:
+    """
+    Profile the block with cProfile (saved as <stage>.prof, readable with pstats or snakeviz) and trace its
+    memory allocations (the top allocation sites and the peak are saved as <stage>_memory.txt).
+    cProfile only sees the calling thread, so work done in thread pools shows up as waiting.
+    """
+    profile_dir = Path(profile_dir)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_dir / f"{stage}.prof")
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(profile_dir / f"{stage}_memory.txt", "w") as f:
+            f.write(f"Peak traced memory: {peak / 2 ** 20:.1f} MB\n\n")
+            for statistic in snapshot.statistics("lineno")[:PROFILE_TOP_ALLOCATIONS]:
+                f.write(f"{statistic}\n")
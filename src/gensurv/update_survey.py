@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+from typing import List
+
+from .generate_draft import write_bibliography
+from .generate_headings import classify_papers_with_scores
+from .generate_overview import generate_overview
+from .models import Paper
+from .pipeline import (
+    CHECKPOINT_DIRNAME, MANIFEST_FILENAME, load_json, load_papers_checkpoint, load_structured_papers_checkpoint,
+    save_json, save_papers, save_structured_papers, write_papers_summary, write_structured_papers_summary
+)
+from .render_latex import add_bibtex_entries, render_sections
+
+
+def update_survey(
+        run_dir: Path,
+        new_papers: List[Paper],
+        title: str | None = None,
+        latex_file: str = "template.tex",
+) -> List[str]:
+    """
+    Incrementally add papers to a finished run of main.py.
+    The new papers are classified against the run's existing headings (whose embeddings come from the embedding
+    cache), then only the sections that received papers are regenerated, and only those sections are patched in
+    the LaTeX draft. The run's checkpoints and JSON outputs are updated in place.
+    :param run_dir: Output directory of a previous run.
+    :param new_papers: Papers to add. Papers already in the run are ignored.
+    :param title: Title of the survey. Defaults to the title saved with the run.
+    :param latex_file: Name of the LaTeX draft in run_dir.
+    :return: The headings whose sections were regenerated.
+    """
+    run_dir = Path(run_dir)
+    checkpoint_dir = run_dir / CHECKPOINT_DIRNAME
+    if not (checkpoint_dir / "headings.json").exists():
+        raise FileNotFoundError(f"{checkpoint_dir / 'headings.json'} not found; the run has no headings checkpoint.")
+    if title is None:
+        title = load_json(run_dir / MANIFEST_FILENAME)["settings"]["title"]
+
+    structured_papers = load_structured_papers_checkpoint(checkpoint_dir / "headings.json")
+    overview = load_json(run_dir / "overview.json")
+    papers = load_papers_checkpoint(checkpoint_dir / "papers.json")
+
+    known_ids = {paper.id for paper in papers}
+    new_papers = [paper for paper in {paper.id: paper for paper in new_papers}.values() if paper.id not in known_ids]
+    if not new_papers:
+        return []
+
+    headings = list(structured_papers)
+    classification, _ = classify_papers_with_scores(new_papers, headings)
+    for heading, classified_papers in classification.items():
+        structured_papers[heading].extend(classified_papers)
+    changed_headings = [heading for heading in headings if heading in classification]
+
+    new_paragraphs = generate_overview({heading: structured_papers[heading] for heading in changed_headings}, title)
+    overview = {heading: new_paragraphs.get(heading, overview.get(heading, "")) for heading in headings}
+
+    latex_path = run_dir / latex_file
+    if latex_path.exists():
+        latex = latex_path.read_text(encoding="utf-8")
+        latex, bibliography = add_bibtex_entries(latex, new_papers)
+        latex = render_sections(latex, new_paragraphs, bibliography)
+        latex_path.write_text(latex, encoding="utf-8")
+        write_bibliography(bibliography, overview, run_dir)
+
+    papers += new_papers
+    save_papers(papers, checkpoint_dir / "papers.json")
+    save_structured_papers(structured_papers, checkpoint_dir / "headings.json")
+    save_json(overview, checkpoint_dir / "overview.json")
+    write_papers_summary(papers, run_dir)
+    write_structured_papers_summary(structured_papers, run_dir)
+    with open(run_dir / "overview.json", "w") as f:
+        json.dump(overview, f, indent=4)
+    return changed_headings
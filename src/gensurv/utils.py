@@ -1,14 +1,242 @@
+import csv
+import json
 from pathlib import Path
+import sys
+from typing import Any, Callable, Dict, Iterator, List
 
-from .models import Paper
+from pydantic import ValidationError
+
+from .bibliography import with_bibtex
+from .models import Paper, PaperTable
+
+# Papers per batch yielded by iter_paper_batches
+DEFAULT_BATCH_SIZE = 1000
+# Characters read from a JSON array at a time
+JSON_CHUNK_CHARS = 1 << 20
+# Characters that can follow a prefix of a JSON number within the same number
+NUMBER_CONTINUATION_CHARS = ".eE+-0123456789"
+PAPER_FORMATS = {".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl", ".tsv": "tsv", ".parquet": "parquet"}
+# Column of the FileMaker export (data/filemaker) holding the section a paper was cited in
+FILEMAKER_HEADING_COLUMN = "headlines_section_title"
+
+# Called with the path, the row number (1-based; the line number for TSV and JSONL) and the error message
+RowErrorHandler = Callable[[Path, int, str], None]
+
+
+def print_row_error(path: Path, row: int, message: str) -> None:
+    print(f"Warning: skipping row {row} of {path}: {message}")
+
+
+def paper_format(path: Path) -> str:
+    file_format = PAPER_FORMATS.get(Path(path).suffix.lower())
+    if file_format is None:
+        raise ValueError(f"Unknown papers file format: {path}. Use one of {list(PAPER_FORMATS)}.")
+    return file_format
+
+
+def iter_json_array(path: Path, chunk_chars: int = JSON_CHUNK_CHARS) -> Iterator[Any]:
+    """
+    Yield the elements of the JSON array in path one by one, reading the file in chunks of chunk_chars,
+    so that memory use does not grow with the size of the file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer, position, end_of_file = "", 0, False
+
+        def read_more() -> None:
+            nonlocal buffer, position, end_of_file
+            more = f.read(chunk_chars)
+            end_of_file = not more
+            # Drop what has been consumed, so the buffer holds at most one element and one chunk
+            buffer, position = buffer[position:] + more, 0
+
+        def next_char() -> str:
+            # The next non-whitespace character, or "" at the end of the file
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer) or end_of_file:
+                    return buffer[position:position + 1]
+                read_more()
+
+        if next_char() != "[":
+            raise ValueError(f"{path} does not contain a JSON array.")
+        position += 1
+        if next_char() == "]":
+            return
+        while True:
+            next_char()
+            while True:
+                try:
+                    element, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if end_of_file:
+                        raise
+                    read_more()
+                    continue
+                # A number cut by the end of the chunk ("12" of "125", "12" of "12.5", "1" of "1e5", "1.5" of
+                # "1.5e-3") decodes as a shorter, valid number; wait for the rest of it
+                if (isinstance(element, (int, float)) and not isinstance(element, bool) and not end_of_file
+                        and (end == len(buffer) or buffer[end] in NUMBER_CONTINUATION_CHARS)):
+                    read_more()
+                    continue
+                break
+            yield element
+            position = end
+            separator = next_char()
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"{path}: expected ',' or ']' after an array element, got {separator!r}.")
+            position += 1
+
+
+def iter_jsonl(path: Path, on_error: RowErrorHandler) -> Iterator[tuple[int, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                on_error(path, line_number, f"invalid JSON: {e}")
+
+
+def iter_filemaker_tsv(path: Path) -> Iterator[tuple[int, Dict[str, Any]]]:
+    """
+    Yield one record per paper of a FileMaker export (one row per cited paper and section, as in
+    data/filemaker/paper2.tsv). Rows without a paper_id (sections without papers) are skipped, and papers cited
+    in several sections are only yielded the first time.
+    """
+    # Abstracts can exceed the default field size limit of the csv module
+    csv.field_size_limit(sys.maxsize)
+    seen_ids = set()
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f, delimiter="\t")
+        for row in reader:
+            paper_id = (row.get("paper_id") or "").strip()
+            if not paper_id or paper_id in seen_ids:
+                continue
+            seen_ids.add(paper_id)
+            # The export only has the first author, without an ID, and neither venue nor year
+            author = (row.get("author") or "").strip()
+            yield reader.line_num, {
+                "id": paper_id,
+                "title": row.get("title"),
+                "abstract": row.get("abstract") or None,
+                "venue": None,
+                "year": None,
+                "authors": [{"id": None, "name": author}] if author else None,
+            }
+
+
+def iter_parquet(path: Path, batch_size: int) -> Iterator[tuple[int, Dict[str, Any]]]:
+    import pyarrow.parquet as pq
+    # Memory-mapped, and decoded one record batch at a time
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    row = 0
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        for record in batch.to_pylist():
+            row += 1
+            if isinstance(record.get("citation_styles"), list):
+                record["citation_styles"] = dict(record["citation_styles"])
+            yield row, record
+
+
+def parse_paper(record: Any) -> Paper:
+    """
+    Validate a paper record. Missing optional fields default to None and, as in headings_input_data.json,
+    an empty year means an unknown one.
+    :raises ValueError: If the record is not a valid paper.
+    """
+    if not isinstance(record, dict):
+        raise ValueError(f"expected an object, got {type(record).__name__}")
+    record = {field: record.get(field) for field in Paper.model_fields}
+    if record["year"] == "":
+        record["year"] = None
+    try:
+        return Paper(**record)
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        )) from None
+
+
+def iter_paper_batches(
+        papers_path: Path,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        on_error: RowErrorHandler = print_row_error,
+) -> Iterator[List[Paper]]:
+    """
+    Stream the papers of a file in batches of up to batch_size, reading it incrementally so that memory use
+    stays constant whatever its size, and consumers can start before the whole file is read.
+    Supported formats, by extension: a JSON array (.json, the format of headings_input_data.json), JSON Lines
+    (.jsonl, .ndjson), the FileMaker export (.tsv) and Parquet (.parquet).
+    Rows that are not valid papers are skipped and reported to on_error with their row number.
+    Papers without a BibTeX entry, which the overview prompts cite, get one built from their metadata.
+    """
+    papers_path = Path(papers_path)
+    file_format = paper_format(papers_path)
+    if file_format == "json":
+        records = enumerate(iter_json_array(papers_path), start=1)
+    elif file_format == "jsonl":
+        records = iter_jsonl(papers_path, on_error)
+    elif file_format == "tsv":
+        records = iter_filemaker_tsv(papers_path)
+    else:
+        records = iter_parquet(papers_path, batch_size)
+
+    batch = []
+    for row, record in records:
+        try:
+            batch.append(parse_paper(record))
+        except ValueError as e:
+            on_error(papers_path, row, str(e))
+            continue
+        if len(batch) == batch_size:
+            yield with_bibtex(batch)
+            batch = []
+    if batch:
+        yield with_bibtex(batch)
 
 
 def load_papers(papers_path: Path) -> list[Paper]:
-    ...
+    return [paper for batch in iter_paper_batches(papers_path) for paper in batch]
+
+
+def load_paper_table(papers_path: Path, batch_size: int = DEFAULT_BATCH_SIZE) -> PaperTable:
+    """
+    Load a large corpus into a PaperTable; only one batch of Paper objects exists at a time.
+    """
+    return PaperTable.from_papers(paper for batch in iter_paper_batches(papers_path, batch_size) for paper in batch)
 
 
 def load_headings(headings_path: Path) -> list[str]:
-    ...
+    """
+    Load headings, in order and without duplicates, from a text file with one heading per line, a JSON list of
+    headings, a JSON file in the format of headings_evaluation_data.json ({"headings": [{"heading": ...}]})
+    or the FileMaker export (.tsv).
+    """
+    headings_path = Path(headings_path)
+    suffix = headings_path.suffix.lower()
+    if suffix == ".tsv":
+        csv.field_size_limit(sys.maxsize)
+        with open(headings_path, encoding="utf-8", newline="") as f:
+            headings = [row.get(FILEMAKER_HEADING_COLUMN) for row in csv.DictReader(f, delimiter="\t")]
+    elif suffix == ".json":
+        with open(headings_path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and "headings" in data:
+            data = data["headings"]
+        if not isinstance(data, list):
+            raise ValueError(f"{headings_path} must contain a list of headings or {{\"headings\": [...]}}.")
+        headings = [heading["heading"] if isinstance(heading, dict) else heading for heading in data]
+    else:
+        with open(headings_path, encoding="utf-8") as f:
+            headings = f.read().splitlines()
+    return list(dict.fromkeys(heading.strip() for heading in headings if heading and heading.strip()))
+
 
 def format_bibtex(bibtex: str) -> str:
     # Remove any newline characters and extra spaces
@@ -0,0 +1,264 @@
+import json
+import os
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from .clustering import kmeans, normalize_rows
+from .embeddings import EmbeddingProvider
+from .generate_headings import get_text_embeddings, paper_texts
+from .models import Paper, PaperTable
+
+# Corpora with at least this many live vectors are searched through the IVF index instead of brute force
+DEFAULT_IVF_THRESHOLD = 50_000
+# Number of IVF lists scanned per query
+DEFAULT_N_PROBE = 16
+# Rows scored per matrix product in brute-force search, which bounds memory use on large memory-mapped matrices
+SEARCH_BLOCK_ROWS = 65_536
+# Vectors used to train the IVF centroids
+IVF_TRAINING_SAMPLE = 50_000
+INITIAL_CAPACITY = 1024
+
+SearchResult = List[Tuple[str, float]]
+
+
+class PaperVectorIndex:
+    """
+    A local, persistent index of paper embeddings with top-k cosine search.
+    Vectors are kept unit-normalized in a memory-mapped float32 matrix under index_dir, so opening the index
+    only reads the paper IDs. Small corpora are searched exactly by brute force; once the index holds
+    ivf_threshold vectors, search switches to an IVF index: vectors are clustered into lists (stored as contiguous
+    row ranges) and each query only scans the n_probe lists whose centroids are closest, plus the rows added since
+    the lists were built. Deleted papers are tombstoned and dropped when the IVF lists are rebuilt.
+    Searching never writes to index_dir. Call save() to persist additions and deletions; it first rebuilds the
+    IVF lists (reordering the rows on disk) once a tenth of the rows are outside them or deleted.
+    """
+
+    def __init__(
+            self,
+            index_dir: Path,
+            ivf_threshold: int = DEFAULT_IVF_THRESHOLD,
+            n_probe: int = DEFAULT_N_PROBE,
+    ):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.ivf_threshold = ivf_threshold
+        self.n_probe = n_probe
+        self.meta_path = self.index_dir / "meta.json"
+        self.ids_path = self.index_dir / "ids.txt"
+
+        self.dim = None
+        self.count = 0
+        self.capacity = 0
+        self.ids = []
+        self.rows = {}
+        # IVF state: centroids, list boundaries as row offsets, and the number of rows covered by the lists
+        self.centroids = None
+        self.list_offsets = None
+        self.ivf_rows = 0
+        self._saved_ids = 0
+
+        if self.meta_path.exists():
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            self.dim, self.count, self.capacity = meta["dim"], meta["count"], meta["capacity"]
+            self.ivf_rows = meta["ivf_rows"]
+            self._open_arrays()
+            with open(self.ids_path) as f:
+                self.ids = f.read().split("\n")[:self.count]
+            self._saved_ids = self.count
+            self.rows = {paper_id: row for row, paper_id in enumerate(self.ids) if not self.deleted[row]}
+            if self.ivf_rows:
+                self.centroids = np.load(self.index_dir / "centroids.npy")
+                self.list_offsets = np.load(self.index_dir / "list_offsets.npy")
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, paper_id: str) -> bool:
+        return paper_id in self.rows
+
+    def _open_arrays(self) -> None:
+        self.vectors = np.memmap(self.index_dir / "vectors.f32", dtype=np.float32, mode="r+",
+                                 shape=(self.capacity, self.dim))
+        self.deleted = np.memmap(self.index_dir / "deleted.bin", dtype=np.bool_, mode="r+", shape=(self.capacity,))
+
+    def _resize(self, capacity: int) -> None:
+        for name, row_bytes in (("vectors.f32", self.dim * 4), ("deleted.bin", 1)):
+            with open(self.index_dir / name, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self.capacity = capacity
+        self._open_arrays()
+
+    def add(self, paper_ids: List[str], vectors: np.ndarray) -> None:
+        """
+        Add (or replace) the embeddings of papers; row i of vectors belongs to paper_ids[i].
+        """
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._resize(INITIAL_CAPACITY)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}.")
+
+        self.delete([paper_id for paper_id in paper_ids if paper_id in self.rows])
+        needed = self.count + len(paper_ids)
+        if needed > self.capacity:
+            self._resize(max(needed, self.capacity * 2))
+        self.vectors[self.count:needed] = vectors
+        self.deleted[self.count:needed] = False
+        for row, paper_id in enumerate(paper_ids, start=self.count):
+            self.ids.append(paper_id)
+            self.rows[paper_id] = row
+        self.count = needed
+
+    def add_papers(self, papers: List[Paper], provider: EmbeddingProvider | None = None) -> None:
+        """
+        Embed papers from their title and abstract and add them to the index.
+        Searches must use the same embedding provider (default: the configured one) as the papers were added with.
+        """
+        if isinstance(papers, PaperTable):
+            papers = papers.take([i for i, paper_id in enumerate(papers.ids) if paper_id not in self.rows])
+            paper_ids = papers.ids
+        else:
+            papers = [paper for paper in papers if paper.id not in self.rows]
+            paper_ids = [paper.id for paper in papers]
+        if papers:
+            self.add(paper_ids, get_text_embeddings(paper_texts(papers), provider))
+
+    def delete(self, paper_ids: List[str]) -> int:
+        """
+        :return: The number of papers that were in the index and are now deleted.
+        """
+        rows = [self.rows.pop(paper_id) for paper_id in paper_ids if paper_id in self.rows]
+        if rows:
+            self.deleted[rows] = True
+        return len(rows)
+
+    def save(self) -> None:
+        if self.dim is None:
+            return
+        if self._needs_ivf_build():
+            # Rebuilding saves the index
+            self.build_ivf()
+            return
+        self._write()
+
+    def _write(self) -> None:
+        self.vectors.flush()
+        self.deleted.flush()
+        with open(self.ids_path, "a") as f:
+            for paper_id in self.ids[self._saved_ids:]:
+                f.write(paper_id + "\n")
+        self._saved_ids = self.count
+        if self.centroids is not None:
+            np.save(self.index_dir / "centroids.npy", self.centroids)
+            np.save(self.index_dir / "list_offsets.npy", self.list_offsets)
+        tmp_path = self.meta_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"dim": self.dim, "count": self.count, "capacity": self.capacity, "ivf_rows": self.ivf_rows}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def build_ivf(self, n_lists: int | None = None, seed: int = 0) -> None:
+        """
+        Cluster the live vectors into n_lists lists (default: about 4 * sqrt(n)) and rewrite the matrix so that
+        every list is a contiguous range of rows. Deleted rows are dropped in the process, and the index is saved
+        with any unsaved additions and deletions.
+        """
+        live = np.flatnonzero(~self.deleted[:self.count])
+        if len(live) == 0:
+            return
+        n_lists = n_lists or max(1, int(4 * np.sqrt(len(live))))
+        rng = np.random.default_rng(seed)
+        sample = live if len(live) <= IVF_TRAINING_SAMPLE else np.sort(rng.choice(live, IVF_TRAINING_SAMPLE, replace=False))
+        _, centroids = kmeans(np.asarray(self.vectors[sample]), n_lists, n_init=1, seed=seed)
+
+        assignments = np.empty(len(live), dtype=np.int64)
+        for start in range(0, len(live), SEARCH_BLOCK_ROWS):
+            block = np.asarray(self.vectors[live[start:start + SEARCH_BLOCK_ROWS]])
+            assignments[start:start + SEARCH_BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+        order = live[np.argsort(assignments, kind="stable")]
+
+        # Permute rows in blocks; the permuted matrix is written to a new file that replaces the old one
+        new_path = self.index_dir / "vectors.f32.new"
+        with open(new_path, "wb") as f:
+            f.truncate(self.capacity * self.dim * 4)
+        new_vectors = np.memmap(new_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        for start in range(0, len(order), SEARCH_BLOCK_ROWS):
+            block_rows = order[start:start + SEARCH_BLOCK_ROWS]
+            new_vectors[start:start + len(block_rows)] = self.vectors[block_rows]
+        new_vectors.flush()
+        del new_vectors
+        os.replace(new_path, self.index_dir / "vectors.f32")
+
+        self.ids = [self.ids[row] for row in order]
+        self.rows = {paper_id: row for row, paper_id in enumerate(self.ids)}
+        self.count = len(order)
+        self._open_arrays()
+        self.deleted[:] = False
+        with open(self.ids_path, "w") as f:
+            f.writelines(paper_id + "\n" for paper_id in self.ids)
+        self._saved_ids = self.count
+
+        self.centroids = centroids
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+        self.ivf_rows = self.count
+        self._write()
+
+    def _needs_ivf_build(self) -> bool:
+        if len(self.rows) < self.ivf_threshold:
+            return False
+        # Rebuild once a tenth of the rows are outside the lists or deleted
+        stale_rows = (self.count - self.ivf_rows) + (self.count - len(self.rows))
+        return self.centroids is None or stale_rows > 0.1 * self.count
+
+    def search(self, queries: np.ndarray, k: int = 10) -> List[SearchResult]:
+        """
+        Find the k most similar papers to each query vector by cosine similarity.
+        :param queries: A (n_queries, dim) matrix, or a single (dim,) vector.
+        :return: For each query, a list of (paper ID, similarity) sorted by decreasing similarity.
+        """
+        queries = normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if not self.rows:
+            return [[] for _ in range(len(queries))]
+
+        if self.centroids is None or len(self.rows) < self.ivf_threshold:
+            scores, rows = self._scan(queries, [(0, self.count)], k)
+            return [self._to_results(s, r) for s, r in zip(scores, rows)]
+
+        probe = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :self.n_probe]
+        results = []
+        for query, lists in zip(queries, probe):
+            ranges = [(int(self.list_offsets[i]), int(self.list_offsets[i + 1])) for i in np.sort(lists)]
+            # Rows added after the lists were built are always scanned
+            ranges.append((self.ivf_rows, self.count))
+            scores, rows = self._scan(query[None, :], ranges, k)
+            results.append(self._to_results(scores[0], rows[0]))
+        return results
+
+    def search_text(self, texts: List[str], k: int = 10, provider: EmbeddingProvider | None = None) -> List[SearchResult]:
+        """
+        Embed texts (e.g. questions) and search the index with them.
+        """
+        return self.search(get_text_embeddings(texts, provider), k)
+
+    def _scan(self, queries: np.ndarray, ranges: List[Tuple[int, int]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for range_start, range_end in ranges:
+            for start in range(range_start, range_end, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, range_end)
+                scores = queries @ np.asarray(self.vectors[start:end]).T
+                scores[:, np.asarray(self.deleted[start:end])] = -np.inf
+                best_scores = np.concatenate([best_scores, scores], axis=1)
+                best_rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), scores.shape)], axis=1)
+                if best_scores.shape[1] > k:
+                    top = np.argpartition(-best_scores, k, axis=1)[:, :k]
+                    best_scores = np.take_along_axis(best_scores, top, axis=1)
+                    best_rows = np.take_along_axis(best_rows, top, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
+
+    def _to_results(self, scores: np.ndarray, rows: np.ndarray) -> SearchResult:
+        return [(self.ids[row], float(score)) for score, row in zip(scores, rows) if score > -np.inf]
@@ -9,77 +9,188 @@ from gensurv import (
     generate_query, retrieve_papers, generate_headings, classify_papers, generate_overview,
     generate_draft, load_papers, load_headings
 )
+from gensurv.generate_draft import Config as DraftConfig
+from gensurv.embeddings import configure_embedding_provider, get_embedding_provider
+from gensurv.generate_headings import CATEGORY_MODEL
+from gensurv.generate_overview import MODEL_NAME as OVERVIEW_MODEL, OverviewGenerationError
+from gensurv.pipeline import (
+    STAGES, PipelineRun, file_fingerprint, load_json, load_papers_checkpoint, load_structured_papers_checkpoint, save_json,
+    save_papers, save_structured_papers, write_papers_summary, write_structured_papers_summary
+)
+from gensurv.tracing import get_tracer
 
 load_dotenv()
 
+# Arguments saved with a run and restored by --resume unless given again
+RUN_SETTINGS = [
+    "title", "retrieve_papers", "max_papers", "papers_path", "generate_headings", "headings_path", "output_path",
+    "polish_draft", "embedding_provider"
+]
 
-def parse_args():
+
+def build_parser():
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--title", type=str, help="Title of the paper which you want to generate draft for")
-    parser.add_argument("--retrieve_papers", action="store_true", help="Retrieve papers from Semantic Scholar")
-    parser.add_argument("--max_papers", type=int, default=10, help="Maximum number of papers to retrieve")
-    parser.add_argument("--papers_path", type=str, help="Path to the papers")
-    parser.add_argument("--generate_headings", action="store_true", help="Generate headings")
-    parser.add_argument("--headings_path", type=str, help="Path to the headings")
+    parser.add_argument("--retrieve_papers", action="store_true", default=None,
+                        help="Retrieve papers from Semantic Scholar")
+    parser.add_argument("--max_papers", type=int, help="Maximum number of papers to retrieve (default: 10)")
+    parser.add_argument("--papers_path", type=str,
+                        help="Path to the papers: a JSON list (.json, as headings_input_data.json), "
+                             "JSON Lines (.jsonl), a FileMaker export (.tsv) or Parquet (.parquet)")
+    parser.add_argument("--generate_headings", action="store_true", default=None, help="Generate headings")
+    parser.add_argument("--headings_path", type=str,
+                        help="Path to the headings: a text file with one per line, a JSON list, "
+                             "headings_evaluation_data.json or a FileMaker export (.tsv)")
     parser.add_argument("--output_path", type=Path, help="Output directory path")
-    return parser.parse_args()
+    parser.add_argument("--polish_draft", action="store_true", default=None,
+                        help="Let aider make an editing pass over the rendered draft")
+    parser.add_argument("--embedding_provider", type=str,
+                        help="Embeddings used to order headings and classify papers: 'openai', 'openai:<model>', "
+                             "'local' or 'local:<fitted model .npz>' (default: $GENSURV_EMBEDDING_PROVIDER or openai)")
+    parser.add_argument("--resume", type=Path, help="Directory of a previous run to resume; completed stages "
+                                                    "whose inputs did not change are reused")
+    parser.add_argument("--from-stage", dest="from_stage", choices=STAGES,
+                        help="Rerun this stage and all later ones even if their inputs did not change")
+    parser.add_argument("--profile", action="store_true",
+                        help="Save cProfile and tracemalloc data for every stage that runs into <run>/profile")
+    return parser
 
 
-if __name__ == "__main__":
-    args = parse_args()
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    draft_name = f"{timestamp}_{args.title.replace(' ', '_')}"
-    output_dir = (args.output_path / draft_name).resolve()
+def parse_args():
+    return build_parser().parse_args()
 
+
+def run_pipeline(args, output_dir: Path | None = None, write_trace: bool = True) -> Path:
+    """
+    Run (or resume) the whole pipeline for one survey.
+    :param args: Parsed command line arguments.
+    :param output_dir: Directory of the run. Defaults to a new timestamped directory under args.output_path.
+    :param write_trace: Write the trace and metrics of the run (trace.json, metrics.json) into its directory.
+        Pass False when several runs share the process, since they all record into the same tracer.
+    :return: The directory of the run.
+    """
     project_root = Path(__file__).resolve().parent.parent
     data_dir = project_root / "data"
     latex_dir = data_dir / "latex"
-    shutil.copytree(latex_dir, output_dir)
 
-    query = generate_query(args.title)
+    if args.resume is not None:
+        output_dir = args.resume.resolve()
+        run = PipelineRun(output_dir, from_stage=args.from_stage, profile=args.profile)
+        for name, value in run.settings.items():
+            if getattr(args, name, None) is None:
+                setattr(args, name, Path(value) if name == "output_path" and value is not None else value)
+    else:
+        if output_dir is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            draft_name = f"{timestamp}_{args.title.replace(' ', '_')}"
+            output_dir = args.output_path / draft_name
+        output_dir = Path(output_dir).resolve()
+        shutil.copytree(latex_dir, output_dir)
+        run = PipelineRun(output_dir, from_stage=args.from_stage, profile=args.profile)
+    if args.max_papers is None:
+        args.max_papers = 10
+    run.save_settings({name: getattr(args, name) for name in RUN_SETTINGS})
+    if args.embedding_provider is not None:
+        configure_embedding_provider(args.embedding_provider)
+
+    if write_trace:
+        get_tracer().reset()
+    try:
+        run_stages(args, run, latex_dir)
+    finally:
+        if write_trace:
+            get_tracer().write(output_dir)
+    return output_dir
+
+
+def run_stages(args, run: PipelineRun, latex_dir: Path) -> None:
+    output_dir = run.output_dir
+
+    query = run.run_stage(
+        "query", {"title": args.title},
+        compute=lambda: generate_query(args.title), save=save_json, load=load_json,
+    )
 
     # Retrieve papers from Semantic Scholar
-    if args.retrieve_papers:
-        print("Retrieving papers from Semantic Scholar...")
-        papers = retrieve_papers(
-            query, args.max_papers,
-            args.output_path / "semantic_scholar",
-        )
-    else:
+    def compute_papers():
+        if args.retrieve_papers:
+            print("Retrieving papers from Semantic Scholar...")
+            return retrieve_papers(
+                query, args.max_papers,
+                args.output_path / "semantic_scholar",
+            )
         print("Loading papers...")
-        papers = load_papers(args.papers_path)
-    with open(output_dir / "papers.json", "w") as f:
-        papers_json = [
-            {"title": p.title, "authors": [a.name for a in p.authors], "venue": p.venue, "year": p.year}
-            for p in papers
-        ]
-        json.dump(papers_json, f, indent=4)
+        return load_papers(args.papers_path)
+
+    # Input files are fingerprinted by content, so that editing them invalidates the stages that read them
+    papers_file = None if args.retrieve_papers else file_fingerprint(args.papers_path)
+    papers = run.run_stage(
+        "papers",
+        {"query": query, "retrieve_papers": args.retrieve_papers, "max_papers": args.max_papers,
+         "papers_path": args.papers_path, "papers_file": papers_file},
+        compute=compute_papers, save=save_papers, load=load_papers_checkpoint,
+    )
+    write_papers_summary(papers, output_dir)
 
     # Generate headings
-    if args.generate_headings:
-        print("Generating headings...")
-        # TODO: move classify_papers() from generate_headings.py to classify_papers.py
-        # headings = generate_headings(papers)
-        structured_papers = generate_headings(papers)
-    else:
+    def compute_headings():
+        if args.generate_headings:
+            print("Generating headings...")
+            # TODO: move classify_papers() from generate_headings.py to classify_papers.py
+            # headings = generate_headings(papers)
+            return generate_headings(papers)
         print("Loading headings...")
         headings = load_headings(args.headings_path)
-        structured_papers = classify_papers(headings, papers)
-    with open(output_dir / "structured_papers.json", "w") as f:
-        print(structured_papers)
-        structured_papers_json = {
-            heading: [paper.title for paper in papers]
-            for heading, papers in structured_papers.items()
-        }
-        json.dump(structured_papers_json, f, indent=4)
+        return classify_papers(headings, papers)
+
+    # The paper IDs do not change when abstracts are edited in the papers file, so its fingerprint is an input too
+    headings_file = None if args.generate_headings else file_fingerprint(args.headings_path)
+    structured_papers = run.run_stage(
+        "headings",
+        {"paper_ids": [paper.id for paper in papers], "papers_file": papers_file,
+         "generate_headings": args.generate_headings, "headings_path": args.headings_path, "headings_file": headings_file,
+         "category_model": CATEGORY_MODEL, "embedding_model": get_embedding_provider().name},
+        compute=compute_headings, save=save_structured_papers, load=load_structured_papers_checkpoint,
+    )
+    write_structured_papers_summary(structured_papers, output_dir)
 
     # Generate overview
-    print("Generating overview...")
-    overview = generate_overview(structured_papers, args.title)
+    def compute_overview():
+        print("Generating overview...")
+        try:
+            return generate_overview(structured_papers, args.title)
+        except OverviewGenerationError as e:
+            # Keep the sections that were generated so they are not lost with the failed ones
+            with open(output_dir / "overview.json", "w") as f:
+                json.dump(e.paragraphs, f, indent=4)
+            raise
+
+    overview = run.run_stage(
+        "overview",
+        {"title": args.title, "overview_model": OVERVIEW_MODEL,
+         "headings": {heading: [paper.id for paper in papers] for heading, papers in structured_papers.items()}},
+        compute=compute_overview, save=save_json, load=load_json,
+    )
     with open(output_dir / "overview.json", "w") as f:
         json.dump(overview, f, indent=4)
 
     # Generate draft
-    print("Generating draft...")
-    generate_draft(args.title, overview, papers, output_dir)
+    def compute_draft():
+        print("Generating draft...")
+        # The draft is written into template.tex, so start again from a clean template
+        shutil.copy(latex_dir / "template.tex", output_dir / "template.tex")
+        generate_draft(args.title, overview, papers, output_dir, polish=bool(args.polish_draft))
+        return str(output_dir / "template.tex")
+
+    run.run_stage(
+        "draft",
+        {"title": args.title, "overview": overview, "paper_ids": [paper.id for paper in papers],
+         "polish_draft": bool(args.polish_draft),
+         "draft_model": DraftConfig().model_name if args.polish_draft else None},
+        compute=compute_draft, save=save_json, load=load_json,
+    )
+
+
+if __name__ == "__main__":
+    run_pipeline(parse_args())
@@ -0,0 +1,6 @@
+from pathlib import Path
+import sys
+
+# The package and the entry points (main.py, batch.py, app.py) are imported from src, as when running them
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+sys.path.insert(0, str(SRC_DIR))
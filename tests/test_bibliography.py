@@ -0,0 +1,44 @@
+from gensurv.bibliography import Bibliography, extract_citation_keys
+
+SMITH = "@article{smith2024,\n title={Robotic Liquid Handling},\n doi={10.1000/ABC},\n year={2024}\n}"
+# The same paper under another key, with the title spelt differently
+SMITH_DUPLICATE = "@article{Smith_2024_robotic,\n title={Robotic liquid-handling},\n year={2024}\n}"
+# The same DOI with an unrelated title
+SMITH_BY_DOI = "@inproceedings{smithconf,\n title={Conference version},\n doi={10.1000/abc}\n}"
+DOE = "@article{doe2023,\n title={Closed-loop {Optimisation} of Assays},\n year={2023}\n}"
+
+
+def test_duplicate_entries_become_aliases_of_the_first_key():
+    bibliography = Bibliography.parse(SMITH + "\n\n" + SMITH_DUPLICATE + "\n" + SMITH_BY_DOI + DOE)
+
+    assert list(bibliography.entries) == ["smith2024", "doe2023"]
+    assert bibliography.aliases == {"Smith_2024_robotic": "smith2024", "smithconf": "smith2024"}
+    assert "smithconf" in bibliography
+    assert bibliography.add_entry(SMITH) == "smith2024"
+    assert len(bibliography) == 2
+    assert bibliography.entries["doe2023"] == DOE
+
+
+def test_citations_of_aliases_are_rewritten_without_repeating_keys():
+    bibliography = Bibliography.parse(SMITH + SMITH_DUPLICATE + DOE)
+
+    text = r"As shown \citep[see][p. 3]{Smith_2024_robotic, smith2024, doe2023} and \cite{Smith_2024_robotic}."
+    assert bibliography.canonicalize_citations(text) == (
+        r"As shown \citep[see][p. 3]{smith2024, doe2023} and \cite{smith2024}."
+    )
+
+
+def test_find_missing_citations_reports_unknown_keys_per_section():
+    bibliography = Bibliography.parse(SMITH + SMITH_DUPLICATE)
+    paragraphs = {
+        "Introduction": r"Known \cite{smith2024} and aliased \citet{Smith_2024_robotic}.",
+        "Methods": r"Unknown \cite{doe2023, nobody2020} and again \citep{nobody2020}.",
+        "Outlook": "No citations.",
+    }
+
+    assert bibliography.find_missing_citations(paragraphs) == {"Methods": ["doe2023", "nobody2020"]}
+
+
+def test_extract_citation_keys_handles_every_cite_command():
+    text = r"\cite{a} \citep{b, c} \citet*{d} \citeauthor[e.g.][]{e} \cite{ }"
+    assert extract_citation_keys(text) == ["a", "b", "c", "d", "e"]
@@ -0,0 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+
+import numpy as np
+
+from gensurv.embedding_cache import INITIAL_CAPACITY, EmbeddingCache, text_hash
+
+DIM = 8
+
+
+def vector_of(text: str) -> np.ndarray:
+    return np.random.default_rng(list(text_hash(text))).random(DIM, dtype=np.float32)
+
+
+def put_texts(cache_dir, worker: int, n_texts: int) -> None:
+    cache = EmbeddingCache(cache_dir)
+    for start in range(0, n_texts, 10):
+        texts = [f"worker {worker} text {i}" for i in range(start, start + 10)]
+        cache.put_many("model", texts, np.stack([vector_of(text) for text in texts]))
+
+
+def count_hits(cache_dir, texts: list[str]) -> int:
+    return sum(vector is not None for vector in EmbeddingCache(cache_dir).get_many("model", texts))
+
+
+def test_processes_sharing_a_store_keep_each_others_rows(tmp_path):
+    n_workers, n_texts = 4, 600
+    reader = EmbeddingCache(tmp_path)
+    reader.put_many("model", ["before"], vector_of("before")[None])
+    with ProcessPoolExecutor(n_workers) as executor:
+        for future in [executor.submit(put_texts, tmp_path, worker, n_texts) for worker in range(n_workers)]:
+            future.result()
+
+    texts = ["before"] + [f"worker {worker} text {i}" for worker in range(n_workers) for i in range(n_texts)]
+    for cache in (reader, EmbeddingCache(tmp_path)):
+        vectors = cache.get_many("model", texts)
+        assert all(vector is not None and np.array_equal(vector, vector_of(text)) for text, vector in zip(texts, vectors))
+
+
+def test_eviction_compacts_the_files(tmp_path):
+    entry_bytes = DIM * 4 + 16 + 8
+    cache = EmbeddingCache(tmp_path, max_bytes=3000 * entry_bytes)
+    texts = [f"text {i}" for i in range(5000)]
+    for start in range(0, len(texts), 500):
+        cache.put_many("model", texts[start:start + 500], np.stack([vector_of(text) for text in texts[start:start + 500]]))
+
+    store_dir = tmp_path / "model"
+    capacity = (store_dir / "keys.bin").stat().st_size // 16
+    assert len(cache) <= 3000
+    assert capacity < 4 * INITIAL_CAPACITY
+    vectors = cache.get_many("model", texts)
+    # The most recently written texts survive, with their own vectors
+    assert all(np.array_equal(vector, vector_of(text)) for text, vector in zip(texts[-2000:], vectors[-2000:]))
+    assert vectors[0] is None
+
+
+def test_reads_in_another_process_protect_rows_from_eviction(tmp_path):
+    entry_bytes = DIM * 4 + 16 + 8
+    writer = EmbeddingCache(tmp_path, max_bytes=1100 * entry_bytes)
+    old, new = [f"old {i}" for i in range(500)], [f"new {i}" for i in range(500)]
+    for texts in (old, new):
+        writer.put_many("model", texts, np.stack([vector_of(text) for text in texts]))
+
+    # Reading the older half from another process makes it the most recently used, and is recorded in meta.json
+    tick = json.loads((tmp_path / "model" / "meta.json").read_text())["tick"]
+    with ProcessPoolExecutor(1) as executor:
+        assert executor.submit(count_hits, tmp_path, old).result() == len(old)
+    assert json.loads((tmp_path / "model" / "meta.json").read_text())["tick"] == tick + 1
+    writer.put_many("model", [f"more {i}" for i in range(200)], np.stack([vector_of(f"more {i}") for i in range(200)]))
+
+    vectors = writer.get_many("model", old + new)
+    assert all(vector is not None for vector in vectors[:len(old)])
+    assert any(vector is None for vector in vectors[len(old):])
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from gensurv.embedding_cache import configure_embedding_cache
+from gensurv.embeddings import LocalEmbeddingProvider, OpenAIEmbeddingProvider
+from gensurv.generate_headings import get_text_embedding, get_text_embeddings
+
+TEXTS = [
+    "Robotic liquid handling for high-throughput screening",
+    "Closed-loop optimisation of chemical reactions with machine learning",
+    "Microfluidic platforms for single-cell analysis",
+    "Laboratory information management systems and data standards",
+]
+
+
+def test_saved_local_model_keeps_its_name_and_vectors(tmp_path):
+    pytest.importorskip("sklearn")
+    fitted = LocalEmbeddingProvider.fit(TEXTS, dim=3)
+    fitted.save(tmp_path / "lsa.npz")
+    loaded = LocalEmbeddingProvider.load(tmp_path / "lsa.npz")
+
+    assert loaded.name == fitted.name
+    np.testing.assert_array_equal(loaded.embed(TEXTS), fitted.embed(TEXTS))
+
+
+@pytest.fixture
+def embedded_models(monkeypatch, tmp_path):
+    # Records the model of every OpenAI embedding request instead of sending it
+    models = []
+
+    def embed(self, texts):
+        models.append(self.model)
+        return np.ones((len(texts), 2))
+
+    monkeypatch.setattr(OpenAIEmbeddingProvider, "embed", embed)
+    configure_embedding_cache(tmp_path)
+    yield models
+    configure_embedding_cache(None)
+
+
+def test_model_is_a_deprecated_alias_for_an_openai_provider(embedded_models):
+    with pytest.deprecated_call():
+        get_text_embedding("a", model="text-embedding-3-small")
+    with pytest.deprecated_call():
+        get_text_embedding("b", "text-embedding-ada-002")
+    with pytest.deprecated_call():
+        get_text_embeddings(["c"], model="text-embedding-3-small")
+    assert embedded_models == ["text-embedding-3-small", "text-embedding-ada-002", "text-embedding-3-small"]
+
+    with pytest.raises(ValueError):
+        get_text_embedding("d", provider=OpenAIEmbeddingProvider(), model="text-embedding-3-small")
@@ -0,0 +1,55 @@
+import sys
+
+from gensurv.generate_draft import compile_latex
+
+# Stand-ins for pdflatex and bibtex: "LaTeX" writes the citations of template.tex to the .aux file, noting
+# whether a .bbl was there to read, and a PDF; "bibtex" writes a .bbl from the citations of the .aux file
+STUB_LATEX = [sys.executable, "-c", """
+import re
+from pathlib import Path
+keys = re.findall(r"\\\\cite\\{([^}]*)\\}", Path("template.tex").read_text())
+lines = [f"\\\\citation{{{key}}}" for key in keys] + ["\\\\bibdata{references}"]
+if Path("template.bbl").exists():
+    lines.append("% read template.bbl")
+Path("template.aux").write_text("\\n".join(lines))
+Path("template.pdf").write_text("PDF")
+"""]
+STUB_BIBTEX = [sys.executable, "-c", """
+from pathlib import Path
+citations = [line for line in Path("template.aux").read_text().splitlines() if line.startswith("\\\\citation")]
+Path("template.bbl").write_text("\\n".join(citations))
+"""]
+
+
+def build(build_dir):
+    return compile_latex(
+        str(build_dir), str(build_dir / "paper.pdf"), latex_command=STUB_LATEX, bibtex_command=STUB_BIBTEX,
+        verbose=False,
+    )
+
+
+def commands(report) -> list[str]:
+    return ["bibtex" if latex_pass.command == STUB_BIBTEX else "latex" for latex_pass in report.passes]
+
+
+def test_compile_latex_only_reruns_passes_whose_inputs_changed(tmp_path):
+    (tmp_path / "template.tex").write_text("Intro \\cite{a}.")
+    (tmp_path / "references.bib").write_text("@article{a, title={A}}")
+
+    first = build(tmp_path)
+    assert first.pdf_created
+    assert all(latex_pass.returncode == 0 for latex_pass in first.passes)
+    # LaTeX, bibtex, LaTeX to read the .bbl, then LaTeX again to see the .aux settle
+    assert commands(first) == ["latex", "bibtex", "latex", "latex"]
+
+    unchanged = build(tmp_path)
+    assert unchanged.skipped
+    assert unchanged.passes == []
+
+    # Text edits rerun LaTeX, but not bibtex since the citations did not change
+    (tmp_path / "template.tex").write_text("A longer intro \\cite{a}.")
+    assert commands(build(tmp_path)) == ["latex"]
+
+    # A new citation reruns bibtex, and LaTeX once more to read the new .bbl
+    (tmp_path / "template.tex").write_text("A longer intro \\cite{a} \\cite{b}.")
+    assert commands(build(tmp_path)) == ["latex", "bibtex", "latex"]
@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+import importlib
+
+from anthropic import AsyncAnthropic
+import pytest
+
+from gensurv import llm_cache
+from gensurv.benchmark.corpus import load_corpus
+from gensurv.benchmark.fake_api import FakeAPI
+from gensurv.generate_overview import generate_overview
+
+# gensurv.generate_overview is the stage function; the module holds the client factory
+generate_overview_module = importlib.import_module("gensurv.generate_overview")
+
+
+@pytest.fixture(scope="module")
+def fake_api():
+    with FakeAPI([], {}) as api:
+        yield api
+
+
+def test_concurrent_overviews_each_use_their_own_async_client(fake_api, monkeypatch):
+    monkeypatch.setattr(llm_cache, "_llm_cache", None)
+    monkeypatch.setattr(llm_cache, "_llm_cache_configured", True)
+    clients = []
+
+    def create_async_client():
+        clients.append(AsyncAnthropic(api_key="test", base_url=fake_api.url))
+        return clients[-1]
+
+    monkeypatch.setattr(generate_overview_module, "create_async_client", create_async_client)
+    papers = load_corpus("manual_by_ono")
+    structured_papers = {f"Section {i}": papers[i * 10:(i + 1) * 10] for i in range(4)}
+
+    def generate_overviews(_) -> list:
+        # Each call runs its own event loop; the connections of one loop must not be reused by the next
+        return [generate_overview(structured_papers, "Laboratory automation") for _ in range(3)]
+
+    with ThreadPoolExecutor(3) as executor:
+        overviews = [overview for results in executor.map(generate_overviews, range(3)) for overview in results]
+
+    assert len(overviews) == 9
+    assert all(list(overview) == list(structured_papers) for overview in overviews)
+    assert len(clients) == 9
+    assert all(client.is_closed() for client in clients)
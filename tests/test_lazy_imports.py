@@ -0,0 +1,26 @@
+from pathlib import Path
+import subprocess
+import sys
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+
+HEAVY_MODULES = ["openai", "anthropic", "numpy", "sklearn"]
+
+
+def run_python(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+def test_importing_gensurv_does_not_import_heavy_dependencies():
+    loaded = run_python(f"import gensurv, sys; print([name for name in {HEAVY_MODULES!r} if name in sys.modules])")
+    assert loaded == "[]"
+
+
+def test_stage_functions_resolve_after_their_submodule_is_imported():
+    output = run_python(
+        "import types, gensurv.generate_headings, gensurv; "
+        "print(isinstance(gensurv.generate_headings, types.FunctionType), gensurv.generate_headings.__module__)"
+    )
+    assert output == "True gensurv.generate_headings"
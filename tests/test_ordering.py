@@ -0,0 +1,52 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from gensurv.ordering import nearest_neighbor_order, spanning_tree_order
+
+
+def networkx_order(similarity: np.ndarray) -> list[int]:
+    # The former order_categories: maximum spanning tree over 1 - similarity, then BFS from the highest degree node
+    nx = pytest.importorskip("networkx")
+    graph = nx.Graph()
+    graph.add_weighted_edges_from(
+        (i, j, 1 - similarity[i, j]) for i, j in itertools.combinations(range(similarity.shape[0]), 2)
+    )
+    tree = nx.maximum_spanning_tree(graph)
+    start = max(tree.degree, key=lambda node_degree: node_degree[1])[0]
+    return list(nx.bfs_tree(tree, start))
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_spanning_tree_order_matches_networkx(seed):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(int(rng.integers(2, 15)), 8))
+    similarity = vectors @ vectors.T
+    if seed % 2:
+        # Rounding makes many edges tie
+        similarity = np.round(similarity)
+    assert spanning_tree_order(similarity) == networkx_order(similarity)
+
+
+@pytest.mark.parametrize("similarity, expected", [
+    # Every edge ties: the edges are taken in (i, j) order, which makes a star around item 0
+    (np.ones((5, 5)), [0, 1, 2, 3, 4]),
+    # Two tight pairs; the tree takes the first three of the four equally dissimilar cross-pair edges
+    (np.array([[1, .9, .1, .1], [.9, 1, .1, .1], [.1, .1, 1, .9], [.1, .1, .9, 1]]), [0, 2, 3, 1]),
+    # The outlier is the least similar to the three others, which tie among themselves: a star around the outlier
+    (np.array([[1, .5, .5, .2], [.5, 1, .5, .2], [.5, .5, 1, .2], [.2, .2, .2, 1]]), [3, 0, 1, 2]),
+])
+def test_spanning_tree_order_breaks_ties_like_networkx(similarity, expected):
+    assert spanning_tree_order(similarity) == expected
+
+
+def test_nearest_neighbor_order_visits_the_most_similar_item_next():
+    similarity = np.array([[1, .9, .1, .2], [.9, 1, .3, .8], [.1, .3, 1, .7], [.2, .8, .7, 1]])
+    assert nearest_neighbor_order(similarity, start=0) == [0, 1, 3, 2]
+
+
+@pytest.mark.parametrize("order", [spanning_tree_order, nearest_neighbor_order])
+def test_orders_of_fewer_than_two_items(order):
+    assert order(np.ones((1, 1))) == [0]
+    assert order(np.ones((0, 0))) == []
@@ -0,0 +1,34 @@
+from gensurv.models import Paper
+from gensurv.retrievers.paper_store import PaperStore
+from gensurv.retrievers.semantic_scholar import JSON_IMPORT_META_KEY, PAPER_STORE_FILENAME, SemanticScholarRetriever
+
+
+def make_paper(paper_id: str, title: str) -> Paper:
+    return Paper(id=paper_id, title=title, abstract=None, venue=None, year=None, authors=None, citation_styles=None)
+
+
+def test_json_cache_migration_skips_bad_files_and_is_recorded(tmp_path, capsys):
+    for paper_id in ("a", "b"):
+        (tmp_path / f"{paper_id}.json").write_text(make_paper(paper_id, f"Paper {paper_id}").json())
+    (tmp_path / "corrupt.json").write_text('{"id": "c", "title": ')
+
+    retriever = SemanticScholarRetriever(output_dir=tmp_path, api_key="test")
+
+    assert "corrupt.json" in capsys.readouterr().out
+    assert set(retriever.retrieve_papers_bulk(["a", "b"])) == {"a", "b"}
+    assert retriever._store.get_meta(JSON_IMPORT_META_KEY) == "2"
+
+
+def test_json_cache_migration_runs_for_an_existing_store_without_marker(tmp_path):
+    # A store left behind by an interrupted migration, holding a newer copy of one paper
+    store = PaperStore(tmp_path / PAPER_STORE_FILENAME)
+    store.put(make_paper("a", "Newer title"))
+    store.close()
+    for paper_id in ("a", "b"):
+        (tmp_path / f"{paper_id}.json").write_text(make_paper(paper_id, f"Paper {paper_id}").json())
+
+    retriever = SemanticScholarRetriever(output_dir=tmp_path, api_key="test")
+
+    papers = retriever.retrieve_papers_bulk(["a", "b"])
+    assert papers["a"].title == "Newer title"
+    assert papers["b"].title == "Paper b"
@@ -0,0 +1,27 @@
+from gensurv.pipeline import PipelineRun, file_fingerprint, load_json, save_json
+
+
+def test_editing_an_input_file_reruns_the_stage(tmp_path):
+    headings_path = tmp_path / "headings.txt"
+    headings_path.write_text("Flexibility\nDurability\n")
+    calls = []
+
+    def run_headings_stage():
+        run = PipelineRun(tmp_path / "run")
+        return run.run_stage(
+            "headings", {"headings_path": str(headings_path), "headings_file": file_fingerprint(headings_path)},
+            compute=lambda: calls.append(headings_path.read_text()) or headings_path.read_text().split(),
+            save=save_json, load=load_json,
+        )
+
+    assert run_headings_stage() == ["Flexibility", "Durability"]
+    assert run_headings_stage() == ["Flexibility", "Durability"]
+    assert len(calls) == 1
+
+    headings_path.write_text("Flexibility\nPrecision\n")
+    assert run_headings_stage() == ["Flexibility", "Precision"]
+    assert len(calls) == 2
+
+
+def test_file_fingerprint_of_no_file():
+    assert file_fingerprint(None) is None
@@ -0,0 +1,51 @@
+from gensurv.bibliography import make_bibtex
+from gensurv.models import Author, Paper
+from gensurv.render_latex import escape_latex, escape_latex_paragraph, render_draft
+
+TEMPLATE = r"""\begin{filecontents}{references.bib}
+\end{filecontents}
+\title{TITLE HERE}
+\begin{document}
+\maketitle
+\bibliographystyle{plain}
+\bibliography{references}
+\end{document}
+"""
+
+
+def make_paper(paper_id: str, title: str) -> Paper:
+    paper = Paper(id=paper_id, title=title, abstract=None, venue=None, year=2024,
+                  authors=[Author(id=None, name="Ada Lovelace")], citation_styles=None)
+    paper.citation_styles = {"bibtex": make_bibtex(paper)}
+    return paper
+
+
+def test_escape_latex_escapes_every_special_character():
+    assert escape_latex(r"R&D: 100% of $5 #1 a_b {x} ~y ^z \w") == (
+        r"R\&D: 100\% of \$5 \#1 a\_b \{x\} \textasciitilde{}y \textasciicircum{}z \textbackslash{}w"
+    )
+
+
+def test_escape_latex_paragraph_keeps_commands_and_escapes_text_from_abstracts():
+    # Abstracts quoted in generated paragraphs are full of characters that are special in LaTeX
+    paragraph = r"Yields rose 50% for H_2O & CO_2 at $3 per run \cite{smith2024, doe2023} (see \textit{Fig. 1})."
+    assert escape_latex_paragraph(paragraph) == (
+        r"Yields rose 50\% for H\_2O \& CO\_2 at \$3 per run \cite{smith2024, doe2023} (see \textit{Fig. 1})."
+    )
+
+
+def test_escape_latex_paragraph_keeps_escaped_characters_as_they_are():
+    assert escape_latex_paragraph(r"Already escaped: 10\% and R\&D") == r"Already escaped: 10\% and R\&D"
+
+
+def test_render_draft_escapes_title_and_headings():
+    paper = make_paper("p1", "Laboratory robotics")
+    overview = {"Cost & scale-up (>50%)": "Costs fell 30% \\cite{lovelace2024p1}."}
+
+    latex, bibliography = render_draft(TEMPLATE, "Robots & labs: 100% automated", overview, [paper])
+
+    assert r"\title{Robots \& labs: 100\% automated}" in latex
+    assert r"\section{Cost \& scale-up (>50\%)}" in latex
+    assert "Costs fell 30\\% \\cite{lovelace2024p1}." in latex
+    assert list(bibliography.entries) == ["lovelace2024p1"]
+    assert latex.index(r"\section{") < latex.index(r"\bibliographystyle")
@@ -0,0 +1,86 @@
+import time
+import uuid
+
+import pytest
+
+from gensurv.benchmark.corpus import synthetic_corpus, to_semantic_scholar_record
+from gensurv.benchmark.fake_api import FakeAPI
+from gensurv.retrievers.semantic_scholar import SemanticScholarError, SemanticScholarRetriever
+from gensurv.retrievers.transport import TokenBucket
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return synthetic_corpus(1200)
+
+
+def make_retriever(api: FakeAPI, output_dir, **kwargs) -> SemanticScholarRetriever:
+    # Rate limiters are shared by API key, so every retriever gets its own key to keep the tests independent
+    return SemanticScholarRetriever(
+        output_dir=output_dir, api_key=f"test-{uuid.uuid4()}", base_url=f"{api.url}/graph/v1", **kwargs
+    )
+
+
+def test_bulk_retrieval_is_chunked_and_reads_cached_papers_locally(corpus, tmp_path):
+    paper_ids = [paper.id for paper in corpus]
+    with FakeAPI([to_semantic_scholar_record(paper) for paper in corpus], {}) as api:
+        retriever = make_retriever(api, tmp_path, requests_per_second=100)
+
+        papers = retriever.retrieve_papers_bulk(paper_ids + ["unknown"])
+        # 1200 IDs in chunks of BATCH_MAX_IDS (500)
+        assert api.calls() == {"s2.batch": 3}
+        assert list(papers) == paper_ids
+        assert papers[paper_ids[0]].title == corpus[0].title
+
+        again = retriever.retrieve_papers_bulk(paper_ids[:10])
+        assert list(again) == paper_ids[:10]
+        assert api.calls() == {"s2.batch": 3}
+
+
+def test_token_bucket_spreads_requests_at_its_rate():
+    bucket = TokenBucket(rate=20)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    # The first token is available at once, the other ten arrive 1/20 s apart
+    assert time.monotonic() - start == pytest.approx(0.5, abs=0.1)
+    assert bucket.stats.requests_sent == 11
+
+
+def test_token_bucket_pause_holds_back_requests():
+    bucket = TokenBucket(rate=1000)
+    bucket.pause_for(0.3)
+    assert bucket.acquire() == pytest.approx(0.3, abs=0.05)
+
+
+def test_rate_limited_request_waits_for_retry_after(corpus, tmp_path):
+    records = [to_semantic_scholar_record(paper) for paper in corpus[:5]]
+    with FakeAPI(records, {}, failures={"s2.batch": [(429, "0.3")]}) as api:
+        retriever = make_retriever(api, tmp_path, requests_per_second=100)
+
+        papers = retriever.retrieve_papers_bulk([paper.id for paper in corpus[:5]])
+
+        assert len(papers) == 5
+        assert api.calls() == {"s2.batch": 2}
+        assert retriever.stats["retries"] == 1
+        assert retriever.stats["requests_sent"] == 2
+        assert retriever.stats["throttle_wait_seconds"] >= 0.25
+
+
+def test_server_errors_are_retried_up_to_max_retries(corpus, tmp_path):
+    records = [to_semantic_scholar_record(paper) for paper in corpus[:5]]
+    with FakeAPI(records, {}, failures={"s2.batch": [(503, "0")] * 3}) as api:
+        retriever = make_retriever(api, tmp_path, requests_per_second=100, max_retries=2)
+
+        with pytest.raises(SemanticScholarError, match="503"):
+            retriever.retrieve_papers_bulk([paper.id for paper in corpus[:5]])
+
+        assert api.calls() == {"s2.batch": 3}
+        assert retriever.stats["retries"] == 2
+
+
+def test_requests_per_second_defaults_to_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("SEMANTIC_SCHOLAR_REQUESTS_PER_SECOND", "7.5")
+    retriever = SemanticScholarRetriever(output_dir=tmp_path, api_key=f"test-{uuid.uuid4()}")
+    assert retriever.requests_per_second == 7.5
+    assert retriever._rate_limiter.rate == 7.5
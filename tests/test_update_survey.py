@@ -0,0 +1,12 @@
+from gensurv.pipeline import PipelineRun
+from gensurv.scripts.update_survey import retriever_dir
+
+
+def test_retriever_dir_follows_the_saved_output_path(tmp_path):
+    batch_run_dir = tmp_path / "outputs" / "batch_20240101_000000" / "000_Laboratory_automation"
+    PipelineRun(batch_run_dir).save_settings({"title": "Laboratory automation", "output_path": tmp_path / "outputs"})
+    assert retriever_dir(batch_run_dir) == tmp_path / "outputs" / "semantic_scholar"
+
+    run_dir = tmp_path / "outputs" / "20240101_000000_Laboratory_automation"
+    PipelineRun(run_dir).save_settings({"title": "Laboratory automation", "output_path": "../outputs"})
+    assert retriever_dir(run_dir) == tmp_path / "outputs" / "semantic_scholar"
@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from gensurv.bibliography import Bibliography, bibtex_key
+from gensurv.generate_overview import create_prompt
+from gensurv.utils import iter_json_array, iter_paper_batches, load_papers
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+
+@pytest.mark.parametrize("chunk_chars", [1, 2, 3, 4, 5, 7, 64])
+def test_iter_json_array_keeps_numbers_split_across_chunks(tmp_path, chunk_chars):
+    values = [12.5, 125, -3, 1e5, 1.5e-3, -2.25E+10, 0, 7, {"year": 2021, "score": 0.125}, [1.0, 2e2], True, None]
+    path = tmp_path / "numbers.json"
+    path.write_text(json.dumps(values))
+    assert list(iter_json_array(path, chunk_chars=chunk_chars)) == values
+
+
+@pytest.mark.parametrize("text", ["[12.]", "[1, 2", "[1 2]", "{}"])
+def test_iter_json_array_rejects_invalid_arrays(tmp_path, text):
+    path = tmp_path / "invalid.json"
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        list(iter_json_array(path, chunk_chars=2))
+
+
+def test_iter_paper_batches_reports_invalid_rows(tmp_path):
+    path = tmp_path / "papers.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"id": "a", "title": "A", "year": 2020}),
+        "{bad json",
+        json.dumps({"id": "b", "title": "B", "year": "unknown"}),
+        json.dumps({"id": "c", "title": "C", "year": ""}),
+    ]))
+    errors = []
+    batches = list(iter_paper_batches(path, batch_size=1, on_error=lambda _, row, message: errors.append(row)))
+    assert [[paper.id for paper in batch] for batch in batches] == [["a"], ["c"]]
+    assert errors == [2, 3]
+
+
+@pytest.mark.parametrize("papers_path", [
+    DATA_DIR / "test" / "manual_by_ono" / "headings_input_data.json",
+    DATA_DIR / "filemaker" / "paper2.tsv",
+])
+def test_loaded_papers_can_be_cited_in_the_overview(papers_path):
+    papers = load_papers(papers_path)[:5]
+    prompt = create_prompt("Overview of technologies", papers, "Laboratory automation")
+    bibliography = Bibliography()
+    bibliography.add_papers(papers)
+    for paper in papers:
+        key = bibtex_key(paper.citation_styles["bibtex"])
+        assert key in bibliography.entries
+        assert f"bibtex: @article{{{key}," in prompt
@@ -0,0 +1,41 @@
+import numpy as np
+
+from gensurv.vector_index import PaperVectorIndex
+
+
+def random_vectors(n: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, 16)).astype(np.float32)
+
+
+def directory_state(path):
+    return {file.name: file.read_bytes() for file in sorted(path.iterdir())}
+
+
+def test_search_does_not_write_the_index(tmp_path):
+    index = PaperVectorIndex(tmp_path, ivf_threshold=100)
+    vectors = random_vectors(300, seed=0)
+    index.add([f"paper{i}" for i in range(300)], vectors)
+    index.save()
+    index.add([f"new{i}" for i in range(100)], random_vectors(100, seed=1))
+    index.delete([f"paper{i}" for i in range(50)])
+    before = directory_state(tmp_path)
+
+    results = index.search(vectors[100:110], k=1)
+
+    assert directory_state(tmp_path) == before
+    assert [result[0][0] for result in results] == [f"paper{i}" for i in range(100, 110)]
+    assert "paper0" not in {paper_id for result in index.search(vectors[:5], k=5) for paper_id, _ in result}
+
+
+def test_save_rebuilds_stale_ivf_lists(tmp_path):
+    index = PaperVectorIndex(tmp_path, ivf_threshold=100)
+    vectors = random_vectors(300, seed=0)
+    index.add([f"paper{i}" for i in range(300)], vectors)
+    index.save()
+    assert index.ivf_rows == 300
+    index.delete([f"paper{i}" for i in range(50)])
+    index.save()
+
+    reopened = PaperVectorIndex(tmp_path, ivf_threshold=100)
+    assert reopened.count == reopened.ivf_rows == len(reopened) == 250
+    assert reopened.search(vectors[200], k=1)[0][0][0] == "paper200"